@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Multi-process launcher for the action server
+
+Forks N workers (one per core by default). Each worker imports the actions
+itself, so it has its own DB pool, executor, caches and interaction logger,
+and serves the rasa_sdk app on the same port: with SO_REUSEPORT every
+worker binds its own socket and the kernel balances connections between
+them; otherwise the master binds once and the workers share the listening
+socket.
+
+Before a worker accepts connections it warms up (actions/warmup.py: DB
+pool, interactions table, matchers, templates, caches for the next campaign
+batch) and reports ready only once that is done; GET /ready answers 200
+from a warm worker and 503 otherwise.
+
+The master restarts workers that die, and on SIGHUP (or, with --reload,
+when actions/*.py, keywords.yml or domain.yml change) starts a new
+generation of workers and stops the old one once the new one is serving,
+so requests are not refused during a reload. The master imports nothing
+from actions/ (its logging comes from server_logging.py), so each new
+generation loads the code as it is on disk. With METRICS_PORT set, the
+master serves /metrics with the workers' counters and histograms summed and
+their gauges labelled by worker, and /ready while every current worker is
+warm; ``/profiling`` admin requests are passed
+on to every worker (see actions/profiling.py).
+
+Usage:
+    python action_server.py                     # one worker per core on :5055
+    python action_server.py --workers 4 --reload
+    kill -HUP <master pid>                      # reload after a deploy
+"""
+
+import argparse
+import atexit
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import signal
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WATCHED = ("actions/*.py", "keywords.yml", "domain.yml", "endpoints.yml")
+RESTART_BACKOFF = (0.5, 1.0, 2.0, 5.0, 10.0)
+SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})?\s+(\S+)$")
+
+logger = logging.getLogger("actions.server")
+
+
+def reuse_port_supported() -> bool:
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def bind_socket(host: str, port: int, reuse_port: bool, backlog: int = 1024) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def worker_main(index: int, generation: int, host: str, port: int, shared: Optional[socket.socket],
+                metrics_port: Optional[int], events) -> None:
+    """Entry point of a worker process (runs after fork, before any actions import)"""
+    started = time.monotonic()
+    os.chdir(BASE_DIR)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)  # reloads are the master's job
+
+    imports_started = time.perf_counter()
+    from rasa_sdk.endpoint import create_app_for_serve
+    from rasa_sdk.executor import ActionExecutor
+    from sanic import response
+
+    from actions.instrumentation import configure_logging, start_metrics_server
+
+    configure_logging()
+    if metrics_port:
+        start_metrics_server(metrics_port, "127.0.0.1")
+
+    executor = ActionExecutor()
+    executor.register_package("actions")
+    app = create_app_for_serve(executor, endpoints=os.path.join(BASE_DIR, "endpoints.yml"))
+
+    from actions.warmup import READINESS, warm_up
+
+    READINESS.record("imports", time.perf_counter() - imports_started)
+
+    async def readiness(request):
+        status = READINESS.status()
+        return response.json(status, status=200 if status["ready"] else 503)
+
+    app.add_route(readiness, "/ready", methods=["GET"])
+
+    # Warm before binding: with SO_REUSEPORT the kernel routes connections to a socket as soon as it listens
+    warm = warm_up(started=started)
+    sock = shared if shared is not None else bind_socket(host, port, reuse_port=True)
+
+    def finish_warm_up():
+        warm_up(timeout=float("inf"))
+        events.put(("ready", index, generation, os.getpid()))
+
+    async def ready(app, loop):
+        if warm:
+            events.put(("ready", index, generation, os.getpid()))
+        else:
+            # Serve with the DB fallbacks, but keep the previous generation until this one is warm
+            threading.Thread(target=finish_warm_up, name="warm-up", daemon=True).start()
+
+    app.register_listener(ready, "after_server_start")
+    try:
+        app.run(sock=sock, single_process=True, access_log=False, motd=False)
+    finally:
+        # multiprocessing exits with os._exit: flush the interaction log etc. here
+        atexit._run_exitfuncs()
+
+
+class Worker:
+    def __init__(self, index: int, generation: int, process: multiprocessing.Process,
+                 metrics_port: Optional[int]):
+        self.index = index
+        self.generation = generation
+        self.process = process
+        self.metrics_port = metrics_port
+        self.ready = False
+        self.started = time.monotonic()
+
+
+class Master:
+    """Keeps one generation of workers running and swaps generations on reload"""
+
+    def __init__(self, workers: int, host: str, port: int, reuse_port: bool,
+                 metrics_port: Optional[int], reload: bool, graceful_timeout: float):
+        self.size = workers
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self.metrics_port = metrics_port
+        self.watch = reload
+        self.graceful_timeout = graceful_timeout
+        self.ctx = multiprocessing.get_context("fork")
+        self.events = self.ctx.Queue()
+        self.shared: Optional[socket.socket] = None
+        self.generation = 0
+        self.workers: Dict[int, Worker] = {}
+        self.retiring: List[Worker] = []  # previous generation, until the new one is ready
+        self.draining: List[Worker] = []  # told to stop, not exited yet
+        self.restarts = 0
+        self.reloads = 0
+        self._failures: Dict[int, int] = {}
+        self._stopping = False
+        self._reload_requested = False
+
+    # -- workers -------------------------------------------------------------
+    def _worker_metrics_port(self, index: int, generation: int) -> Optional[int]:
+        if not self.metrics_port:
+            return None
+        # two blocks of ports so a new generation never collides with the one it replaces
+        return self.metrics_port + 1 + (generation % 2) * self.size + index
+
+    def spawn(self, index: int, generation: int) -> Worker:
+        metrics_port = self._worker_metrics_port(index, generation)
+        process = self.ctx.Process(
+            target=worker_main,
+            name=f"action-worker-{index}",
+            args=(index, generation, self.host, self.port, self.shared, metrics_port, self.events),
+            daemon=False,
+        )
+        process.start()
+        logger.info("worker started", extra={"worker": index, "generation": generation, "pid": process.pid})
+        return Worker(index, generation, process, metrics_port)
+
+    def start(self) -> None:
+        if not self.reuse_port:
+            self.shared = bind_socket(self.host, self.port, reuse_port=False)
+        else:
+            # fail fast in the master if the port is taken by something else
+            bind_socket(self.host, self.port, reuse_port=True).close()
+        for index in range(self.size):
+            self.workers[index] = self.spawn(index, self.generation)
+
+    def reload(self) -> None:
+        """Start a new generation; the old one is stopped once every new worker is ready"""
+        if self.retiring:
+            logger.warning("reload already in progress")
+            return
+        self.reloads += 1
+        self.generation += 1
+        logger.info("reloading workers", extra={"generation": self.generation})
+        self.retiring = list(self.workers.values())
+        self.workers = {index: self.spawn(index, self.generation) for index in range(self.size)}
+
+    def _handle_events(self) -> None:
+        while True:
+            try:
+                kind, index, generation, pid = self.events.get_nowait()
+            except queue.Empty:
+                break
+            worker = self.workers.get(index)
+            if kind == "ready" and worker is not None and worker.process.pid == pid:
+                worker.ready = True
+                self._failures.pop(index, None)
+                logger.info("worker ready", extra={"worker": index, "generation": generation, "pid": pid,
+                                                   "startup_s": round(time.monotonic() - worker.started, 3)})
+        if self.retiring and all(w.ready for w in self.workers.values()):
+            for worker in self.retiring:
+                self._terminate(worker)
+            logger.info("reload finished", extra={"generation": self.generation})
+            self.retiring = []
+
+    def _terminate(self, worker: Worker) -> None:
+        if worker.process.is_alive():
+            os.kill(worker.process.pid, signal.SIGTERM)  # Sanic drains open requests
+        self.draining.append(worker)
+
+    def _reap(self) -> None:
+        for worker in self.draining:
+            if not worker.process.is_alive():
+                worker.process.join()
+        self.draining = [w for w in self.draining if w.process.exitcode is None]
+        for index, worker in list(self.workers.items()):
+            if worker.process.is_alive():
+                continue
+            worker.process.join()
+            failures = self._failures.get(index, 0)
+            delay = RESTART_BACKOFF[min(failures, len(RESTART_BACKOFF) - 1)]
+            if time.monotonic() - worker.started < delay:
+                continue  # crash loop: wait before restarting
+            logger.error("worker died, restarting",
+                         extra={"worker": index, "pid": worker.process.pid, "exitcode": worker.process.exitcode})
+            self._failures[index] = failures + 1
+            self.restarts += 1
+            self.workers[index] = self.spawn(index, self.generation)
+
+    def stop(self) -> None:
+        self._stopping = True
+        for worker in list(self.workers.values()) + self.retiring:
+            self._terminate(worker)
+        workers = self.draining
+        deadline = time.monotonic() + self.graceful_timeout
+        for worker in workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+        if self.shared is not None:
+            self.shared.close()
+
+    # -- main loop -----------------------------------------------------------
+    def request_reload(self, *_) -> None:
+        self._reload_requested = True
+
+    def request_stop(self, *_) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGHUP, self.request_reload)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        self.start()
+        snapshot = watched_mtimes() if self.watch else None
+        last_check = time.monotonic()
+        try:
+            while not self._stopping:
+                time.sleep(0.2)
+                self._handle_events()
+                self._reap()
+                if snapshot is not None and time.monotonic() - last_check >= 1.0:
+                    last_check = time.monotonic()
+                    current = watched_mtimes()
+                    if current != snapshot:
+                        snapshot = current
+                        logger.info("code change detected")
+                        self._reload_requested = True
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+        finally:
+            self.stop()
+
+    def ready(self) -> bool:
+        """Every worker of the current generation is up and warm"""
+        return bool(self.workers) and all(w.ready for w in self.workers.values())
+
+    # -- metrics -------------------------------------------------------------
+    def metrics(self) -> str:
+        workers = [w for w in self.workers.values() if w.ready and w.metrics_port]
+        with ThreadPoolExecutor(max_workers=max(1, len(workers))) as pool:
+            scraped = list(pool.map(lambda w: (w.index, scrape(w.metrics_port)), workers))
+        lines = [
+            "# TYPE action_server_workers gauge",
+            f"action_server_workers {float(sum(1 for w in self.workers.values() if w.process.is_alive()))}",
+            "# TYPE action_server_workers_ready gauge",
+            f"action_server_workers_ready {float(len(workers))}",
+            "# TYPE action_server_restarts_total counter",
+            f"action_server_restarts_total {float(self.restarts)}",
+            "# TYPE action_server_reloads_total counter",
+            f"action_server_reloads_total {float(self.reloads)}",
+        ]
+        return "\n".join(lines) + "\n" + aggregate([(index, text) for index, text in scraped if text is not None])
+
+    def profiling(self, method: str, query: str, token: Optional[str]) -> Dict[str, object]:
+        """Send a /profiling request to every ready worker; their answers by worker index"""
+        workers = [w for w in self.workers.values() if w.ready and w.metrics_port]
+        with ThreadPoolExecutor(max_workers=max(1, len(workers))) as pool:
+            answers = list(pool.map(lambda w: (w.index, forward_profiling(w.metrics_port, method, query, token)),
+                                    workers))
+        return {str(index): answer for index, answer in answers}
+
+
+def watched_mtimes() -> Dict[str, float]:
+    mtimes: Dict[str, float] = {}
+    for pattern in WATCHED:
+        for path in glob.glob(os.path.join(BASE_DIR, pattern)):
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                pass
+    return mtimes
+
+
+def scrape(port: int, timeout: float = 2.0) -> Optional[str]:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=timeout) as response:
+            return response.read().decode("utf-8")
+    except OSError:
+        return None
+
+
+def forward_profiling(port: int, method: str, query: str, token: Optional[str],
+                      timeout: float = 2.0) -> object:
+    url = f"http://127.0.0.1:{port}/profiling" + (f"?{query}" if query else "")
+    request = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None,
+                                     headers={"X-Admin-Token": token} if token else {})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        return {"error": f"HTTP {e.code}"}
+    except OSError as e:
+        return {"error": str(e)}
+
+
+def _with_worker_label(labels: Optional[str], index: int) -> str:
+    if not labels or labels == "{}":
+        return f'{{worker="{index}"}}'
+    return labels[:-1] + f',worker="{index}"}}'
+
+
+def aggregate(scrapes: List[Tuple[int, str]]) -> str:
+    """Sum counters and histograms across workers; keep gauges per worker"""
+    types: Dict[str, str] = {}
+    helps: Dict[str, str] = {}
+    families: Dict[str, Dict[str, float]] = {}  # family -> sample -> value
+    order: List[str] = []
+
+    def family_of(name: str) -> str:
+        for suffix in ("_bucket", "_sum", "_count"):
+            if name.endswith(suffix) and types.get(name[:-len(suffix)]) == "histogram":
+                return name[:-len(suffix)]
+        return name
+
+    for index, text in scrapes:
+        for line in text.splitlines():
+            if line.startswith("# TYPE "):
+                _, _, name, kind = line.split(" ", 3)
+                types.setdefault(name, kind)
+                continue
+            if line.startswith("# HELP "):
+                _, _, name, doc = line.split(" ", 3)
+                helps.setdefault(name, doc)
+                continue
+            match = SAMPLE.match(line)
+            if not match:
+                continue
+            name, labels, value = match.groups()
+            family = family_of(name)
+            if types.get(family) == "gauge":
+                sample = name + _with_worker_label(labels, index)
+            else:
+                sample = name + (labels or "")
+            if family not in families:
+                families[family] = {}
+                order.append(family)
+            samples = families[family]
+            samples[sample] = samples.get(sample, 0.0) + float(value)
+
+    lines: List[str] = []
+    for family in order:
+        if family in helps:
+            lines.append(f"# HELP {family} {helps[family]}")
+        lines.append(f"# TYPE {family} {types.get(family, 'untyped')}")
+        lines.extend(f"{sample} {value}" for sample, value in families[family].items())
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def serve_metrics(master: Master, port: int, host: str) -> ThreadingHTTPServer:
+    from server_logging import admin_authorized
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            path, _, query = self.path.partition("?")
+            if path == "/profiling":
+                self._send(json.dumps(master.profiling("GET", query, None)), "application/json")
+                return
+            if path == "/ready":
+                workers = {str(w.index): w.ready for w in master.workers.values()}
+                self._send(json.dumps({"ready": master.ready(), "workers": workers}), "application/json",
+                           200 if master.ready() else 503)
+                return
+            if path != "/metrics":
+                self.send_error(404)
+                return
+            self._send(master.metrics(), "text/plain; version=0.0.4; charset=utf-8")
+
+        def do_POST(self) -> None:
+            path, _, query = self.path.partition("?")
+            if path != "/profiling":
+                self.send_error(404)
+                return
+            if not admin_authorized(self.headers):
+                self.send_error(403)
+                return
+            answers = master.profiling("POST", query, self.headers.get("X-Admin-Token"))
+            self._send(json.dumps(answers), "application/json")
+
+        def _send(self, text: str, content_type: str, code: int = 200) -> None:
+            body = text.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the action server with one worker process per core")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ACTION_SERVER_WORKERS", "0")),
+                        help="Worker processes (default: ACTION_SERVER_WORKERS or the number of cores)")
+    parser.add_argument("--host", default=os.getenv("SANIC_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ACTION_SERVER_PORT", "5055")))
+    parser.add_argument("--no-reuse-port", action="store_true",
+                        help="Share one listening socket instead of SO_REUSEPORT")
+    parser.add_argument("--reload", action="store_true",
+                        help="Reload workers when actions/*.py, keywords.yml or domain.yml change")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0,
+                        help="Seconds to wait for workers to finish on shutdown")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BASE_DIR)
+    from server_logging import configure_logging
+
+    configure_logging()
+    workers = args.workers or os.cpu_count() or 1
+    metrics_port = int(os.environ["METRICS_PORT"]) if os.getenv("METRICS_PORT") else None
+    # workers get their own internal metrics ports; they must not start the public one
+    os.environ.pop("METRICS_PORT", None)
+
+    master = Master(workers, args.host, args.port, reuse_port=reuse_port_supported() and not args.no_reuse_port,
+                    metrics_port=metrics_port, reload=args.reload, graceful_timeout=args.graceful_timeout)
+    if metrics_port:
+        try:
+            serve_metrics(master, metrics_port, os.getenv("METRICS_HOST", "0.0.0.0"))
+        except OSError as e:
+            logger.error("could not start metrics server", extra={"port": metrics_port, "error": str(e)})
+    logger.info("starting action server",
+                extra={"workers": workers, "port": args.port, "reuse_port": master.reuse_port})
+    try:
+        master.run()
+    except OSError as e:
+        logger.error("could not start action server", extra={"port": args.port, "error": str(e)})
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,36 @@
-from typing import Any, Dict, List, Text
-import os
-import mysql.connector
-from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Text
+import asyncio
+import logging
+from datetime import date
 import re
-import calendar
 
 from rasa_sdk import Action, Tracker
-from rasa_sdk.events import SlotSet, FollowupAction
+from rasa_sdk.events import SlotSet
 from rasa_sdk.executor import CollectingDispatcher
 
+from actions import invoice_state
+from actions.cache import customer_id_cache, invoice_summary_cache, invoice_summary_fallback
+from actions.date_parser import parse_date
+from actions.instrumentation import configure_logging, instrumented
+from actions.interaction_logger import get_interaction_logger
+from actions.keyword_matcher import get_keyword_matcher
+from actions.prefetch import invoice_summary_prefetch, prefetch_invoice_summary, take_invoice_summary
+from actions.rendering import format_currency, format_date, utter
+from actions.replay import recorded
+from actions.resilience import DatabaseUnavailable, call_db, call_db_write, within_budget
+from actions.storage import get_storage
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
 
 class ActionExtractClientName(Action):
     def name(self) -> Text:
         return "action_extract_client_name"
 
-    def run(
+    @instrumented
+    @recorded
+    async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -27,6 +43,7 @@ class ActionExtractClientName(Action):
         for entity in entities:
             if entity['entity'] == 'client_name':
                 client_name = entity['value'].strip().title()
+                prefetch_invoice_summary(tracker.sender_id, client_name, fetch_pending_invoices_summary)
                 self.log_interaction(tracker, "client_name_extracted_from_entity", client_name)
                 return [SlotSet("client_name", client_name)]
         
@@ -40,6 +57,9 @@ class ActionExtractClientName(Action):
             # Default to Dennis Kangme if no name found
             client_name = "Dennis Kangme"
         
+        # Start loading the invoice summary now; action_get_pending_invoices_info picks it up
+        prefetch_invoice_summary(tracker.sender_id, client_name, fetch_pending_invoices_summary)
+        
         # Log the interaction
         self.log_interaction(tracker, "client_name_extracted_from_text", client_name)
         
@@ -50,7 +70,9 @@ class ActionCheckIdentity(Action):
     def name(self) -> Text:
         return "action_check_identity"
 
-    def run(
+    @instrumented
+    @recorded
+    async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -59,23 +81,34 @@ class ActionCheckIdentity(Action):
         # Get the latest message from the user
         latest_message = tracker.latest_message.get('text', '').lower()
         
-        # Check if the user confirms being Dennis
-        confirm_keywords = ['si', 'sí', 'yes', 'correcto', 'correct', 'soy dennis', 'soy dennis kangme']
-        deny_keywords = ['no', 'no soy', 'no es', 'incorrecto', 'incorrect']
+        is_dennis = self.confirms_identity(latest_message)
         
-        is_dennis = any(keyword in latest_message for keyword in confirm_keywords)
+        # client_name may have been set by the campaign trigger instead of extracted
+        if is_dennis:
+            prefetch_invoice_summary(tracker.sender_id, tracker.get_slot("client_name") or "Dennis Kangme",
+                                     fetch_pending_invoices_summary)
         
         # Log the interaction to database
         self.log_interaction(tracker, "identity_check", f"is_dennis={is_dennis}")
         
         return [SlotSet("is_dennis", is_dennis)]
 
+    def confirms_identity(self, latest_message: str) -> bool:
+        """Check if the user confirms being Dennis (keywords.yml: identity)"""
+        return self.identity_from_categories(get_keyword_matcher().scan(latest_message).categories("identity"))
+
+    @staticmethod
+    def identity_from_categories(categories) -> bool:
+        return "confirm" in categories
+
 
 class ActionHandleIdentityResponse(Action):
     def name(self) -> Text:
         return "action_handle_identity_response"
 
-    def run(
+    @instrumented
+    @recorded
+    async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -85,9 +118,9 @@ class ActionHandleIdentityResponse(Action):
         client_name = tracker.get_slot("client_name") or "Dennis"
         
         if is_dennis:
-            dispatcher.utter_message(response="utter_invoice_pending_info", client_name=client_name)
+            utter(dispatcher, tracker, "utter_invoice_pending_info", client_name=client_name)
         else:
-            dispatcher.utter_message(response="utter_wrong_person")
+            utter(dispatcher, tracker, "utter_wrong_person")
         
         return []
 
@@ -96,7 +129,9 @@ class ActionHandlePaymentResponse(Action):
     def name(self) -> Text:
         return "action_handle_payment_response"
 
-    def run(
+    @instrumented
+    @recorded
+    async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -105,164 +140,66 @@ class ActionHandlePaymentResponse(Action):
         latest_message = tracker.latest_message.get('text', '').lower()
         client_name = tracker.get_slot("client_name") or "Dennis"
         
-        # Check if user can pay
-        can_pay_keywords = ['si', 'sí', 'yes', 'puedo', 'claro', 'puedo pagar']
-        cannot_pay_keywords = ['no', 'no puedo', 'no tengo', 'no puedo pagar']
-        ask_date_keywords = ['fecha', 'cuándo', 'cuando', 'qué fecha', 'que fecha']
-        
-        can_pay = any(keyword in latest_message for keyword in can_pay_keywords)
-        cannot_pay = any(keyword in latest_message for keyword in cannot_pay_keywords)
-        ask_date = any(keyword in latest_message for keyword in ask_date_keywords)
+        can_pay, cannot_pay, ask_date = self.classify_payment_response(latest_message)
+        events = []
         
         if can_pay:
-            dispatcher.utter_message(response="utter_ask_payment_date")
+            utter(dispatcher, tracker, "utter_ask_payment_date")
         elif cannot_pay:
-            dispatcher.utter_message(response="utter_ask_reason")
+            utter(dispatcher, tracker, "utter_ask_reason")
         elif ask_date:
-            dispatcher.utter_message(response="utter_invoice_date_info")
-            dispatcher.utter_message(response="utter_ask_reason")
+            try:
+                dates = await call_db(self.fetch_pending_invoice_dates, client_name)
+            except Exception as e:
+                logger.warning("could not get invoice dates", extra={"client_name": client_name, "error": str(e)})
+                utter(dispatcher, tracker, "utter_invoice_date_unavailable")
+            else:
+                if dates:
+                    issue_date, due_date = dates
+                    utter(dispatcher, tracker, "utter_invoice_date_info", invoice_issue_date=issue_date,
+                          invoice_due_date=due_date)
+                    events.append(SlotSet("invoice_date", issue_date.isoformat()))
+                else:
+                    utter(dispatcher, tracker, "utter_invoice_date_unknown")
+            utter(dispatcher, tracker, "utter_ask_reason")
         else:
             # Default to asking for payment date
-            dispatcher.utter_message(response="utter_ask_payment_date")
+            utter(dispatcher, tracker, "utter_ask_payment_date")
         
         # Log the interaction to database
         self.log_interaction(tracker, "payment_response", f"can_pay={can_pay}, cannot_pay={cannot_pay}, ask_date={ask_date}")
         
-        return []
+        return events
+
+    def fetch_pending_invoice_dates(self, client_name: str):
+        """(issue_date, due_date) of the customer's next pending invoice, or None"""
+        customer_id = get_customer_id(client_name)
+        if customer_id is None:
+            return None
+        return get_storage().pending_invoice_dates(customer_id)
+
+    def classify_payment_response(self, latest_message: str):
+        """Return (can_pay, cannot_pay, ask_date) keyword flags (keywords.yml: payment_response)"""
+        return self.payment_response_from_categories(
+            get_keyword_matcher().scan(latest_message).categories("payment_response"))
+
+    @staticmethod
+    def payment_response_from_categories(categories):
+        return "can_pay" in categories, "cannot_pay" in categories, "ask_date" in categories
 
 
 class ActionHandleDateQuestion(Action):
     def name(self) -> Text:
         return "action_handle_date_question"
 
-    def convert_relative_date(self, date_text: str) -> str:
-        """Convert relative date expressions to specific dates"""
-        today = datetime.now()
-        date_text = date_text.strip().lower()
-        
-        # Tomorrow
-        if any(word in date_text for word in ['mañana', 'tomorrow', 'mañ']):
-            target_date = today + timedelta(days=1)
-            return target_date.strftime('%Y-%m-%d')
-        
-        # Next week patterns
-        if 'próximo' in date_text or 'proximo' in date_text or 'que viene' in date_text:
-            # Find the day of the week
-            days = {
-                'lunes': 0, 'monday': 0,
-                'martes': 1, 'tuesday': 1,
-                'miércoles': 2, 'miercoles': 2, 'wednesday': 2,
-                'jueves': 3, 'thursday': 3,
-                'viernes': 4, 'friday': 4,
-                'sábado': 5, 'sabado': 5, 'saturday': 5,
-                'domingo': 6, 'sunday': 6
-            }
-            
-            for day_name, day_num in days.items():
-                if day_name in date_text:
-                    # Calculate next occurrence of this day
-                    days_ahead = day_num - today.weekday()
-                    if days_ahead <= 0:  # Target day already happened this week
-                        days_ahead += 7
-                    target_date = today + timedelta(days=days_ahead)
-                    return target_date.strftime('%Y-%m-%d')
-        
-        # Specific day of the week
-        days = {
-            'lunes': 0, 'monday': 0,
-            'martes': 1, 'tuesday': 1,
-            'miércoles': 2, 'miercoles': 2, 'wednesday': 2,
-            'jueves': 3, 'thursday': 3,
-            'viernes': 4, 'friday': 4,
-            'sábado': 5, 'sabado': 5, 'saturday': 5,
-            'domingo': 6, 'sunday': 6
-        }
-        
-        for day_name, day_num in days.items():
-            if day_name in date_text:
-                # Calculate next occurrence of this day
-                days_ahead = day_num - today.weekday()
-                if days_ahead <= 0:  # Target day already happened this week
-                    days_ahead += 7
-                target_date = today + timedelta(days=days_ahead)
-                return target_date.strftime('%Y-%m-%d')
-        
-        # End of month
-        if any(word in date_text for word in ['fin de mes', 'final de mes', 'end of month']):
-            # Get the last day of current month
-            last_day = calendar.monthrange(today.year, today.month)[1]
-            target_date = today.replace(day=last_day)
-            return target_date.strftime('%Y-%m-%d')
-        
-        # Next month
-        if any(word in date_text for word in ['próximo mes', 'proximo mes', 'next month']):
-            if today.month == 12:
-                target_date = today.replace(year=today.year + 1, month=1)
-            else:
-                target_date = today.replace(month=today.month + 1)
-            return target_date.strftime('%Y-%m-%d')
-        
-        # Try to parse as a specific date (DD/MM or DD-MM)
-        date_patterns = [
-            r'(\d{1,2})/(\d{1,2})',  # DD/MM
-            r'(\d{1,2})-(\d{1,2})',  # DD-MM
-        ]
-        
-        for pattern in date_patterns:
-            match = re.search(pattern, date_text)
-            if match:
-                day, month = int(match.group(1)), int(match.group(2))
-                try:
-                    target_date = today.replace(day=day, month=month)
-                    return target_date.strftime('%Y-%m-%d')
-                except ValueError:
-                    continue
-        
-        return None
-
-    def format_date_spanish(self, date_str: str) -> str:
-        """Format date in Spanish format like 'viernes 8 de agosto'"""
-        try:
-            date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-            
-            # Spanish day names
-            days = {
-                0: 'lunes',
-                1: 'martes', 
-                2: 'miércoles',
-                3: 'jueves',
-                4: 'viernes',
-                5: 'sábado',
-                6: 'domingo'
-            }
-            
-            # Spanish month names
-            months = {
-                1: 'enero',
-                2: 'febrero',
-                3: 'marzo',
-                4: 'abril',
-                5: 'mayo',
-                6: 'junio',
-                7: 'julio',
-                8: 'agosto',
-                9: 'septiembre',
-                10: 'octubre',
-                11: 'noviembre',
-                12: 'diciembre'
-            }
-            
-            day_name = days[date_obj.weekday()]
-            day_number = date_obj.day
-            month_name = months[date_obj.month]
-            
-            return f"{day_name} {day_number} de {month_name}"
-            
-        except Exception as e:
-            print(f"Error formatting date: {e}")
-            return date_str
+    def convert_relative_date(self, date_text: str, today: date = None) -> str:
+        """Convert relative date expressions to specific dates (YYYY-MM-DD)"""
+        result = parse_date(date_text, today)
+        return result.isoformat() if result else None
 
-    def run(
+    @instrumented
+    @recorded
+    async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -272,60 +209,54 @@ class ActionHandleDateQuestion(Action):
         client_name = tracker.get_slot("client_name") or "Dennis"
         
         # Convert relative date to specific date
-        specific_date = self.convert_relative_date(latest_message)
+        parsed = parse_date(latest_message)
         
-        if specific_date:
-            # Format date in Spanish
-            formatted_date = self.format_date_spanish(specific_date)
+        if parsed:
+            payment_day = parsed.date
+            specific_date = payment_day.isoformat()
             
             # Log the interaction to database with specific date
             self.log_interaction(tracker, "payment_date_confirmed", specific_date)
             
             # Update the invoice in the database with the payment date
-            self.update_invoice_payment_date(tracker, specific_date)
+            await update_invoices(self.update_invoice_payment_date, tracker, specific_date)
+            invoice_summary_prefetch.discard(tracker.sender_id)
             
-            dispatcher.utter_message(response="utter_payment_confirmed", payment_date=formatted_date, client_name=client_name)
+            utter(dispatcher, tracker, "utter_payment_confirmed", payment_date=format_date(payment_day, weekday=True),
+                  client_name=client_name)
             return [SlotSet("payment_date", specific_date)]
         else:
             # If we can't parse the date, store the original response
             self.log_interaction(tracker, "payment_date_confirmed", latest_message)
-            dispatcher.utter_message(response="utter_payment_confirmed", payment_date=latest_message, client_name=client_name)
+            utter(dispatcher, tracker, "utter_payment_confirmed", payment_date=latest_message, client_name=client_name)
             return [SlotSet("payment_date", latest_message)]
 
     def update_invoice_payment_date(self, tracker: Tracker, payment_date: str):
         """Update ALL pending invoices in the database with the payment date"""
-        try:
-            connection = get_database_connection()
-            if connection:
-                cursor = connection.cursor()
-                
-                # Update ALL pending invoices with the payment date
-                update_query = """
-                UPDATE invoices 
-                SET payment_date = %s, status = 'payment_scheduled'
-                WHERE customer_id = (SELECT id FROM customers WHERE name = %s)
-                AND status = 'pending'
-                AND payment_date IS NULL
-                """
-                
-                client_name = tracker.get_slot("client_name") or "Dennis Kangme"
-                cursor.execute(update_query, (payment_date, client_name))
-                rows_updated = cursor.rowcount
-                connection.commit()
-                cursor.close()
-                connection.close()
-                
-                print(f"Updated {rows_updated} invoices with payment date {payment_date} for {client_name}")
-                
-        except Exception as e:
-            print(f"Error updating invoice payment date: {e}")
+        client_name = tracker.get_slot("client_name") or "Dennis Kangme"
+        customer_id = get_customer_id(client_name)
+        if customer_id is None:
+            logger.warning("no customer found", extra={"client_name": client_name})
+            return
+        
+        # Move ALL pending invoices to payment_scheduled, once per turn
+        result = invoice_state.schedule_payment(
+            customer_id, payment_date, invoice_state.turn_idempotency_key(tracker, "schedule_payment"),
+            session_id=tracker.sender_id,
+        )
+        
+        logger.info("invoices scheduled for payment", extra={"client_name": client_name, "customer_id": customer_id,
+                                                             "payment_date": payment_date, "rows": result.count,
+                                                             "applied": result.applied})
 
 
 class ActionClassifyReason(Action):
     def name(self) -> Text:
         return "action_classify_reason"
 
-    def run(
+    @instrumented
+    @recorded
+    async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -334,64 +265,59 @@ class ActionClassifyReason(Action):
         latest_message = tracker.latest_message.get('text', '').lower()
         client_name = tracker.get_slot("client_name") or "Dennis Kangme"
         
-        # Classify the reason type
-        financial_difficulty = any(word in latest_message for word in 
-                                 ['sin dinero', 'cesante', 'enfermo', 'desempleado', 'sin trabajo'])
-        
-        payment_dispute = any(word in latest_message for word in 
-                            ['ya pagué', 'ya la pagué', 'no es mi deuda', 'no debo', 'ya pague'])
+        reason_type = self.classify_reason(latest_message)
         
-        if financial_difficulty:
-            reason_type = "financial_difficulty"
-            dispatcher.utter_message(response="utter_financial_difficulty", client_name=client_name)
-        elif payment_dispute:
-            reason_type = "payment_dispute"
+        if reason_type == "financial_difficulty":
+            utter(dispatcher, tracker, "utter_financial_difficulty", client_name=client_name)
+        elif reason_type == "payment_dispute":
             # Update invoice status to disputed
-            self.update_invoice_dispute_status(tracker)
-            dispatcher.utter_message(response="utter_payment_dispute", client_name=client_name)
+            await update_invoices(self.update_invoice_dispute_status, tracker)
+            invoice_summary_prefetch.discard(tracker.sender_id)
+            utter(dispatcher, tracker, "utter_payment_dispute", client_name=client_name)
         else:
-            reason_type = "other"
-            dispatcher.utter_message(response="utter_financial_difficulty", client_name=client_name)
+            utter(dispatcher, tracker, "utter_financial_difficulty", client_name=client_name)
         
         # Log the interaction to database
         self.log_interaction(tracker, "reason_classified", reason_type)
         
         return [SlotSet("reason_type", reason_type)]
 
+    def classify_reason(self, latest_message: str) -> str:
+        """Classify the reason type: financial_difficulty, payment_dispute or other (keywords.yml: reason)"""
+        return self.reason_from_categories(get_keyword_matcher().scan(latest_message).categories("reason"))
+
+    @staticmethod
+    def reason_from_categories(categories) -> str:
+        if "financial_difficulty" in categories:
+            return "financial_difficulty"
+        if "payment_dispute" in categories:
+            return "payment_dispute"
+        return "other"
+
     def update_invoice_dispute_status(self, tracker: Tracker):
         """Update ALL pending invoices to disputed status"""
-        try:
-            connection = get_database_connection()
-            if connection:
-                cursor = connection.cursor()
-                
-                # Update ALL pending invoices to disputed status
-                update_query = """
-                UPDATE invoices 
-                SET status = 'disputed'
-                WHERE customer_id = (SELECT id FROM customers WHERE name = %s)
-                AND status = 'pending'
-                AND payment_date IS NULL
-                """
-                
-                client_name = tracker.get_slot("client_name") or "Dennis Kangme"
-                cursor.execute(update_query, (client_name,))
-                rows_updated = cursor.rowcount
-                connection.commit()
-                cursor.close()
-                connection.close()
-                
-                print(f"Updated {rows_updated} invoices to disputed status for {client_name}")
-                
-        except Exception as e:
-            print(f"Error updating invoice dispute status: {e}")
+        client_name = tracker.get_slot("client_name") or "Dennis Kangme"
+        customer_id = get_customer_id(client_name)
+        if customer_id is None:
+            logger.warning("no customer found", extra={"client_name": client_name})
+            return
+        
+        # Move ALL pending invoices to disputed, once per turn
+        result = invoice_state.dispute(
+            customer_id, invoice_state.turn_idempotency_key(tracker, "dispute"), session_id=tracker.sender_id,
+        )
+        
+        logger.info("invoices marked disputed", extra={"client_name": client_name, "customer_id": customer_id,
+                                                      "rows": result.count, "applied": result.applied})
 
 
 class ActionCheckSufficientFunds(Action):
     def name(self) -> Text:
         return "action_check_sufficient_funds"
 
-    def run(
+    @instrumented
+    @recorded
+    async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -408,117 +334,125 @@ class ActionGetPendingInvoicesInfo(Action):
     def name(self) -> Text:
         return "action_get_pending_invoices_info"
 
-    def run(
+    @instrumented
+    @recorded
+    async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
         domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
         client_name = tracker.get_slot("client_name") or "Dennis Kangme"
-        print(f"DEBUG: ActionGetPendingInvoicesInfo called for client: {client_name}")
+        logger.debug("fetching pending invoices", extra={"client_name": client_name})
         
         try:
-            connection = get_database_connection()
-            if connection:
-                cursor = connection.cursor()
-                
-                # Get pending invoices for the customer
-                query = """
-                SELECT COUNT(*) as invoice_count, SUM(amount) as total_amount
-                FROM invoices i
-                JOIN customers c ON i.customer_id = c.id
-                WHERE c.name = %s AND i.status = 'pending' AND i.payment_date IS NULL
-                """
+            try:
+                result = await within_budget(take_invoice_summary(tracker.sender_id, client_name))
+                if result is None:
+                    result = await call_db(self.fetch_pending_invoices_summary, client_name)
+            except DatabaseUnavailable as e:
+                # Serve the last summary read for this client, if any, without waiting on the DB
+                fallback = invoice_summary_fallback.get(client_name)
+                result = fallback[1] if fallback is not None else None
+                logger.warning("invoice summary unavailable", extra={"client_name": client_name, "error": str(e),
+                                                                     "fallback": result is not None})
+                if result is None:
+                    raise
+            
+            if result and result[0] > 0:
+                invoice_count = result[0]
+                total_amount = float(result[1]) if result[1] else 0.0
+                formatted_total = format_currency(result[1])
                 
-                print(f"DEBUG: Executing query with client_name: {client_name}")
-                cursor.execute(query, (client_name,))
-                result = cursor.fetchone()
-                print(f"DEBUG: Query result: {result}")
+                logger.debug("pending invoices found", extra={"client_name": client_name, "count": invoice_count,
+                                                             "total": formatted_total})
                 
-                cursor.close()
-                connection.close()
+                # Log the interaction
+                self.log_interaction(tracker, "pending_invoices_info", f"count={invoice_count}, total={total_amount}")
                 
-                if result and result[0] > 0:
-                    invoice_count = result[0]
-                    total_amount = float(result[1]) if result[1] else 0.0
-                    
-                    # Format the total amount as a string with proper formatting
-                    formatted_total = f"${total_amount:,.0f}"
-                    
-                    print(f"DEBUG: Found {invoice_count} invoices, total: {formatted_total}")
-                    
-                    # Log the interaction
-                    self.log_interaction(tracker, "pending_invoices_info", f"count={invoice_count}, total={total_amount}")
-                    
-                    # Set slots with the information
-                    return [
-                        SlotSet("pending_invoice_count", str(invoice_count)),
-                        SlotSet("pending_invoice_total", formatted_total)
-                    ]
-                else:
-                    # No pending invoices found
-                    print(f"DEBUG: No pending invoices found for {client_name}")
-                    self.log_interaction(tracker, "pending_invoices_info", "no_pending_invoices")
-                    return [
-                        SlotSet("pending_invoice_count", "0"),
-                        SlotSet("pending_invoice_total", "$0")
-                    ]
+                # Set slots with the information
+                return [
+                    SlotSet("pending_invoice_count", str(invoice_count)),
+                    SlotSet("pending_invoice_total", formatted_total)
+                ]
+            else:
+                # No pending invoices found
+                logger.debug("no pending invoices", extra={"client_name": client_name})
+                self.log_interaction(tracker, "pending_invoices_info", "no_pending_invoices")
+                return [
+                    SlotSet("pending_invoice_count", "0"),
+                    SlotSet("pending_invoice_total", "$0")
+                ]
                     
         except Exception as e:
-            print(f"DEBUG: Error getting pending invoices info: {e}")
+            logger.error("could not get pending invoices info", extra={"client_name": client_name, "error": str(e)})
             # Fallback to default values
             return [
                 SlotSet("pending_invoice_count", "1"),
-                SlotSet("pending_invoice_total", "$55,000")
+                SlotSet("pending_invoice_total", format_currency(55000))
             ]
 
+    def fetch_pending_invoices_summary(self, client_name: str):
+        """Return (invoice_count, total_amount) of pending invoices for a customer"""
+        return fetch_pending_invoices_summary(client_name)
 
-def get_database_connection():
-    """Get database connection using environment variables"""
-    try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            database=os.getenv('DB_NAME', 'verisure_demo')
-        )
-        return connection
-    except mysql.connector.Error as err:
-        print(f"Error connecting to database: {err}")
+
+def get_customer_id(client_name: str):
+    """Resolve a customer name to its id, cached per process"""
+    customer_id = customer_id_cache.get(client_name)
+    if customer_id is not None:
+        return customer_id
+    
+    customer_id = get_storage().find_customer_id(client_name)
+    if customer_id is None:
         return None
+    customer_id_cache.set(client_name, customer_id)
+    return customer_id
 
 
-def log_interaction(tracker: Tracker, interaction_type: str, data: str = None):
-    """Log interaction to database"""
+def get_pending_invoice_summary(customer_id: int):
+    """Return (invoice_count, total_amount) of pending invoices, cached per process"""
+    summary = invoice_summary_cache.get(customer_id)
+    if summary is not None:
+        return summary
+    
+    summary = get_storage().pending_invoice_summary(customer_id)
+    invoice_summary_cache.set(customer_id, summary)
+    return summary
+
+
+def fetch_pending_invoices_summary(client_name: str):
+    """Return (invoice_count, total_amount) of pending invoices for a customer"""
+    customer_id = get_customer_id(client_name)
+    if customer_id is None:
+        return (0, None)
+    summary = get_pending_invoice_summary(customer_id)
+    invoice_summary_fallback.set(client_name, (customer_id, summary))
+    return summary
+
+
+async def update_invoices(update: Callable[..., None], tracker: Tracker, *args: Any) -> None:
+    """Run an invoice update within the action's budget; a failed update is logged, not raised"""
     try:
-        connection = get_database_connection()
-        if connection:
-            cursor = connection.cursor()
-            
-            # Create interactions table if it doesn't exist
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS interactions (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                session_id VARCHAR(255),
-                interaction_type VARCHAR(100),
-                data TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-            cursor.execute(create_table_query)
-            
-            # Insert interaction
-            insert_query = """
-            INSERT INTO interactions (session_id, interaction_type, data)
-            VALUES (%s, %s, %s)
-            """
-            cursor.execute(insert_query, (tracker.sender_id, interaction_type, data))
-            connection.commit()
-            cursor.close()
-            connection.close()
-            
-    except Exception as e:
-        print(f"Error logging interaction: {e}")
+        await call_db_write(update, tracker, *args)
+    except DatabaseUnavailable as e:
+        # Not started, or aborted and rolled back by the database
+        logger.warning("invoice update skipped", extra={"sender_id": tracker.sender_id, "update": update.__name__,
+                                                        "error": str(e)})
+    except asyncio.CancelledError:
+        # The DB thread carries on; it commits or rolls back on its own
+        logger.warning("invoice update outcome unknown", extra={"sender_id": tracker.sender_id,
+                                                                "update": update.__name__})
+        raise
+    except Exception:
+        # Safe to retry: the idempotency key keeps a retried turn from applying twice
+        logger.exception("could not update invoices", extra={"sender_id": tracker.sender_id,
+                                                             "update": update.__name__})
+
+
+def log_interaction(tracker: Tracker, interaction_type: str, data: str = None):
+    """Queue an interaction for the write-behind logger (never blocks the turn)"""
+    get_interaction_logger().log(tracker.sender_id, interaction_type, data)
 
 
 # Add the log_interaction method to the Action classes
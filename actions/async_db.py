@@ -0,0 +1,55 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from actions.profiling import PROFILER
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _default_workers() -> int:
+    # One worker per connection the pool can hand out; more threads would
+    # only queue up waiting for a connection.
+    size = int(os.getenv('DB_POOL_SIZE', '5'))
+    overflow = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))
+    return size + overflow
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor used to run blocking DB calls"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(os.getenv('DB_EXECUTOR_WORKERS', str(_default_workers())))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+    return _executor
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking DB call off the event loop and await its result.
+
+    The caller's context variables are carried into the worker thread, like
+    ``asyncio.to_thread`` does, but on a dedicated executor sized to the
+    connection pool so DB work cannot starve other default-executor users.
+    """
+    loop = asyncio.get_running_loop()
+    if PROFILER.enabled:
+        func = PROFILER.wrap_blocking(func)
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), call)
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """Stop the DB executor (used on server shutdown and in tools)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
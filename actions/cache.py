@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Text, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds"""
+
+    def __init__(self, name: Text, maxsize: int = 10000, ttl: float = 300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value or ``default`` (counted as a miss)"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self._stats["misses"] += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self._stats["invalidations"] += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry for which ``predicate(key, value)`` holds; return how many"""
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[Text, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                **self._stats,
+            }
+
+
+_max_entries = int(os.getenv('CACHE_MAX_ENTRIES', '10000'))
+
+# customers.name -> customers.id
+customer_id_cache = TTLCache(
+    "customer_id", maxsize=_max_entries, ttl=float(os.getenv('CUSTOMER_CACHE_TTL', '3600'))
+)
+
+# customers.id -> (pending invoice count, pending total amount)
+invoice_summary_cache = TTLCache(
+    "invoice_summary", maxsize=_max_entries, ttl=float(os.getenv('INVOICE_SUMMARY_CACHE_TTL', '60'))
+)
+
+# customers.name -> (customers.id, last (pending invoice count, pending total amount) read);
+# served while the DB is unavailable
+invoice_summary_fallback = TTLCache(
+    "invoice_summary_fallback", maxsize=_max_entries, ttl=float(os.getenv('INVOICE_SUMMARY_FALLBACK_TTL', '86400'))
+)
+
+
+def invalidate_customer_invoices(customer_id: int) -> None:
+    """Drop cached invoice data after a write to the customer's invoices.
+
+    Only this process's caches are cleared: other action server workers keep
+    serving their entries until the TTL expires (INVOICE_SUMMARY_CACHE_TTL,
+    or INVOICE_SUMMARY_FALLBACK_TTL for the fallback during a DB outage).
+    """
+    invoice_summary_cache.invalidate(customer_id)
+    invoice_summary_fallback.invalidate_where(lambda name, entry: entry[0] == customer_id)
+
+
+def get_cache_stats() -> Dict[Text, Dict[Text, Any]]:
+    return {cache.name: cache.stats() for cache in (customer_id_cache, invoice_summary_cache, invoice_summary_fallback)}
@@ -0,0 +1,276 @@
+"""Table-driven parser for Spanish/English payment-date expressions.
+
+Everything is compiled once at import time: each rule's regular expression
+plus a trigger table mapping the first word of every expression to the rules
+that can start with it. Parsing an utterance is one accent-folding pass,
+one regex scan that stops only at trigger words, and an anchored ``match``
+at each of those, instead of substring scans over every keyword. When an
+utterance contains several expressions the one with the highest priority
+wins (the same precedence the original ``convert_relative_date`` used), and
+the confidence is lowered to flag the ambiguity. Negated expressions
+("hoy no, mañana", "no el lunes") are skipped. Resolved dates are never in
+the past relative to ``today``: a date with an explicit year that has
+already passed ("15/10/2024") is not a date the customer can pay on, and
+parses as no date.
+"""
+
+import calendar
+import contextlib
+import contextvars
+import re
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Text, Tuple
+
+from actions.text import normalize
+
+WEEKDAYS: Dict[Text, int] = {
+    'lunes': 0, 'monday': 0,
+    'martes': 1, 'tuesday': 1,
+    'miercoles': 2, 'wednesday': 2,
+    'jueves': 3, 'thursday': 3,
+    'viernes': 4, 'friday': 4,
+    'sabado': 5, 'saturday': 5,
+    'domingo': 6, 'sunday': 6,
+}
+
+MONTHS: Dict[Text, int] = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6,
+    'julio': 7, 'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10,
+    'noviembre': 11, 'diciembre': 12,
+}
+
+NUMBER_WORDS: Dict[Text, int] = {
+    'un': 1, 'una': 1, 'uno': 1, 'dos': 2, 'tres': 3, 'cuatro': 4, 'cinco': 5,
+    'seis': 6, 'siete': 7, 'ocho': 8, 'nueve': 9, 'diez': 10, 'quince': 15,
+    'veinte': 20, 'treinta': 30,
+}
+
+
+def _alternation(words: Iterable[Text]) -> Text:
+    # Longest first so "miercoles" never loses to a shorter prefix
+    return "|".join(sorted(words, key=len, reverse=True))
+
+
+def _trie_pattern(words: Iterable[Text]) -> Text:
+    """Regex alternation factored by common prefix (d(?:entro|omingo)|...)"""
+    trie: Dict[Text, Dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[Text, Dict]) -> Text:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+_WEEKDAY = _alternation(WEEKDAYS)
+_MONTH = _alternation(MONTHS)
+_NUMBER = r"\d{1,3}|" + _alternation(NUMBER_WORDS)
+
+# (kind, priority, confidence, trigger words, pattern). Lower priority wins.
+# Patterns are matched anchored at a trigger word; "#" triggers on numbers.
+_RULES: List[Tuple[Text, int, float, Tuple[Text, ...], Text]] = [
+    ("day_after_tomorrow", 0, 0.95, ("pasado",), r"pasado\s+manana\b"),
+    ("tomorrow", 0, 0.95, ("manana", "tomorrow"), r"manana\w*|tomorrow\b"),
+    ("today", 0, 0.9, ("hoy", "today"), r"hoy\b|today\b"),
+    ("weekday", 1, 0.9, ("proximo", "siguiente", "next") + tuple(WEEKDAYS),
+     rf"(?:(?:proximo|siguiente|next)\s+)?(?P<wd>{_WEEKDAY})\b(?:\s+(?:que\s+viene|proximo)\b)?"),
+    ("end_of_month", 2, 0.85, ("fin", "final", "finales", "end"),
+     r"(?:fin|final|finales)\s+de(?:l)?\s+mes\b|end\s+of\s+(?:the\s+)?month\b"),
+    ("next_month", 3, 0.6, ("proximo", "siguiente", "mes", "next"),
+     r"(?:(?:proximo|siguiente)\s+mes|mes\s+que\s+viene|next\s+month)\b"),
+    ("numeric_date", 4, 0.9, ("#",),
+     r"(?P<nd_day>\d{1,2})[/-](?P<nd_month>\d{1,2})(?:[/-](?P<nd_year>\d{4}|\d{2}))?\b"),
+    ("day_month_name", 4, 0.9, ("#",), rf"(?P<dm_day>\d{{1,2}})\s+de\s+(?P<dm_month>{_MONTH})\b"),
+    ("in_days", 5, 0.9, ("en", "dentro", "in"),
+     rf"(?:en|dentro\s+de|in)\s+(?P<in_n>{_NUMBER})\s+(?P<in_unit>dias?|days?|semanas?|weeks?)\b"),
+    ("day_of_month", 6, 0.75, ("el",),
+     rf"el\s+(?:dia\s+)?(?P<dom>\d{{1,2}})\b(?!\s*[/-]\d|\s+de\s+(?:{_MONTH}))"),
+]
+
+_RULE_INFO = {kind: (priority, confidence) for kind, priority, confidence, _, _ in _RULES}
+_COMPILED = {kind: re.compile(pattern) for kind, _, _, _, pattern in _RULES}
+_TRIGGERS: Dict[Text, Tuple[Tuple[Text, "re.Pattern"], ...]] = {}
+for _kind, _, _, _words, _ in _RULES:
+    for _word in _words:
+        _TRIGGERS[_word] = _TRIGGERS.get(_word, ()) + ((_kind, _COMPILED[_kind]),)
+_NUMBER_RULES = _TRIGGERS.pop("#")
+_TOMORROW_RULES = _TRIGGERS["manana"]
+
+# "no hoy", "ni mañana", "no el lunes" before an expression, "hoy no" after it
+_NEGATION_BEFORE = re.compile(r"\b(?:no|not|ni)\s+(?:para\s+)?(?:el\s+)?$")
+_NEGATION_AFTER = re.compile(r"\s+no\b")
+
+# Finds only trigger words, so the scan over the rest of the utterance stays in
+# C; the first-character lookahead rejects most word starts immediately.
+_TRIGGER_FIRST = "".join(sorted({word[0] for word in _TRIGGERS}))
+_TRIGGER_SCAN = re.compile(
+    rf"\b(?=[{_TRIGGER_FIRST}0-9])"
+    rf"(?:(?P<number>\d+)|(?P<tomorrow>manana\w*)|{_trie_pattern(_TRIGGERS)}\b)"
+)
+
+
+class DateParseResult(NamedTuple):
+    date: date
+    kind: Text
+    confidence: float
+    matched: Text
+    span: Tuple[int, int]
+
+    def isoformat(self) -> Text:
+        return self.date.isoformat()
+
+
+def _last_day(year: int, month: int) -> int:
+    return calendar.monthrange(year, month)[1]
+
+
+def _add_months(day: date, months: int, day_of_month: Optional[int] = None) -> date:
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    wanted = day_of_month if day_of_month is not None else day.day
+    return date(year, month, min(wanted, _last_day(year, month)))
+
+
+def _next_weekday(today: date, weekday: int) -> date:
+    days_ahead = weekday - today.weekday()
+    if days_ahead <= 0:  # Target day already happened this week
+        days_ahead += 7
+    return today + timedelta(days=days_ahead)
+
+
+def _day_month(today: date, day: int, month: int, year: Optional[int]) -> Optional[date]:
+    if year is not None:
+        try:
+            candidate = date(year, month, day)
+        except ValueError:
+            return None
+        return candidate if candidate >= today else None
+    for candidate_year in (today.year, today.year + 1):
+        try:
+            candidate = date(candidate_year, month, day)
+        except ValueError:
+            continue  # e.g. 29/02 outside a leap year
+        if candidate >= today:
+            return candidate
+    return None
+
+
+def _resolve(kind: Text, match: "re.Match", today: date) -> Optional[date]:
+    group = match.group
+    if kind == "tomorrow":
+        return today + timedelta(days=1)
+    if kind == "day_after_tomorrow":
+        return today + timedelta(days=2)
+    if kind == "today":
+        return today
+    if kind == "weekday":
+        return _next_weekday(today, WEEKDAYS[group("wd")])
+    if kind == "end_of_month":
+        return today.replace(day=_last_day(today.year, today.month))
+    if kind == "next_month":
+        return _add_months(today, 1)
+    if kind == "numeric_date":
+        year = group("nd_year")
+        if year is not None:
+            year = int(year) + (2000 if len(year) == 2 else 0)
+        month = int(group("nd_month"))
+        if not 1 <= month <= 12:
+            return None
+        return _day_month(today, int(group("nd_day")), month, year)
+    if kind == "day_month_name":
+        return _day_month(today, int(group("dm_day")), MONTHS[group("dm_month")], None)
+    if kind == "in_days":
+        raw = group("in_n")
+        amount = int(raw) if raw.isdigit() else NUMBER_WORDS[raw]
+        unit = group("in_unit")
+        days = amount * 7 if unit.startswith(("semana", "week")) else amount
+        return today + timedelta(days=days)
+    if kind == "day_of_month":
+        day = int(group("dom"))
+        if not 1 <= day <= 31:
+            return None
+        if day >= today.day and day <= _last_day(today.year, today.month):
+            return today.replace(day=day)
+        return _add_months(today, 1, day_of_month=day)
+    return None
+
+
+# Overrides date.today() as the default reference, e.g. when replaying recorded turns
+_reference_date: "contextvars.ContextVar[Optional[date]]" = contextvars.ContextVar("reference_date", default=None)
+
+
+@contextlib.contextmanager
+def reference_date(day: date) -> Iterator[None]:
+    """Parse relative expressions as if today were ``day`` within this block"""
+    token = _reference_date.set(day)
+    try:
+        yield
+    finally:
+        _reference_date.reset(token)
+
+
+def parse_date(text: Text, today: Optional[date] = None) -> Optional[DateParseResult]:
+    """Parse the best date expression in ``text`` relative to ``today``"""
+    if today is None:
+        today = _reference_date.get() or date.today()
+    folded = normalize(text)
+
+    best = None
+    best_rank = None
+    candidates = set()
+    consumed = 0
+    for trigger in _TRIGGER_SCAN.finditer(folded):
+        start = trigger.start()
+        if start < consumed:
+            continue
+        if trigger.lastgroup == "number":
+            rules = _NUMBER_RULES
+        elif trigger.lastgroup == "tomorrow":
+            rules = _TOMORROW_RULES
+        else:
+            rules = _TRIGGERS[trigger.group()]
+        for kind, pattern in rules:
+            match = pattern.match(folded, start)
+            if match is None:
+                continue
+            if _NEGATION_BEFORE.search(folded, max(0, start - 16), start) or _NEGATION_AFTER.match(folded, match.end()):
+                consumed = match.end()  # skipped, and not re-read by a shorter rule
+                break
+            resolved = _resolve(kind, match, today)
+            if resolved is None:
+                continue
+            consumed = match.end()
+            candidates.add(resolved)
+            rank = (_RULE_INFO[kind][0], start)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = (kind, match, resolved), rank
+            break
+
+    if best is None:
+        return None
+    kind, match, resolved = best
+    confidence = _RULE_INFO[kind][1]
+    if len(candidates) > 1:
+        confidence = round(confidence * 0.7, 2)
+    return DateParseResult(resolved, kind, confidence, text[match.start():match.end()], match.span())
+
+
+def parse_many(texts: Iterable[Text], today: Optional[date] = None) -> List[Optional[DateParseResult]]:
+    """Parse many utterances against one reference date (offline analytics)"""
+    if today is None:
+        today = _reference_date.get() or date.today()
+    seen: Dict[Text, Optional[DateParseResult]] = {}
+    results = []
+    for text in texts:
+        if text not in seen:
+            seen[text] = parse_date(text, today)
+        results.append(seen[text])
+    return results
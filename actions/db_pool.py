@@ -0,0 +1,305 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Text
+
+from actions.instrumentation import record_query
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout"""
+
+
+class TimedCursor:
+    """Cursor proxy that reports each execute() to the instrumentation"""
+
+    def __init__(self, raw: Any):
+        self._raw = raw
+
+    def __getattr__(self, name: Text) -> Any:
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self) -> "TimedCursor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._raw.close()
+
+    def execute(self, *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return self._raw.execute(*args, **kwargs)
+        finally:
+            record_query(time.perf_counter() - started)
+
+    def executemany(self, *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return self._raw.executemany(*args, **kwargs)
+        finally:
+            record_query(time.perf_counter() - started)
+
+
+class PooledConnection:
+    """Proxy around a raw DB connection; close() returns it to the pool"""
+
+    def __init__(self, pool: "ConnectionPool", raw: Any, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._returned = False
+
+    def __getattr__(self, name: Text) -> Any:
+        return getattr(self._raw, name)
+
+    def cursor(self, *args: Any, **kwargs: Any) -> TimedCursor:
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    def __enter__(self) -> "PooledConnection":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Give the connection back to the pool instead of closing it"""
+        if self._returned:
+            return
+        self._returned = True
+        self._pool._release(self._raw, self._created_at)
+
+    def invalidate(self) -> None:
+        """Discard the connection (e.g. after a broken-pipe error)"""
+        if self._returned:
+            return
+        self._returned = True
+        self._pool._discard(self._raw)
+
+
+class ConnectionPool:
+    """Thread-safe connection pool with overflow, idle recycle and pre-ping.
+
+    Up to ``size`` connections are kept idle for reuse; ``max_overflow``
+    extra connections may be opened under burst load and are closed again
+    when returned. Idle connections older than ``recycle`` seconds are
+    closed on borrow, and ``pre_ping`` checks liveness before handing a
+    reused connection out.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        size: int = 5,
+        max_overflow: int = 10,
+        recycle: float = 300.0,
+        pre_ping: bool = True,
+        timeout: float = 5.0,
+        ping: Optional[Callable[[Any], bool]] = None,
+    ):
+        self._factory = factory
+        self._ping = ping
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+
+        self._idle = deque()  # (raw, created_at, returned_at)
+        self._checked_out = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "created": 0,
+            "borrowed": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "discarded": 0,
+            "peak_checked_out": 0,
+        }
+
+    @property
+    def capacity(self) -> int:
+        return self.size + self.max_overflow
+
+    def connect(self) -> PooledConnection:
+        """Borrow a connection, opening a new one if the pool has room"""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at, returned_at = self._idle.pop()
+                    self._checked_out += 1
+                    break
+                if self._checked_out + len(self._idle) < self.capacity:
+                    raw = None
+                    self._checked_out += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No connection available after {self.timeout}s "
+                        f"(size={self.size}, max_overflow={self.max_overflow})"
+                    )
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+            self._stats["borrowed"] += 1
+            self._stats["peak_checked_out"] = max(self._stats["peak_checked_out"], self._checked_out)
+
+        # Network work happens outside the lock
+        try:
+            if raw is not None:
+                if self.recycle and time.monotonic() - returned_at > self.recycle:
+                    self._close_quietly(raw)
+                    self._bump("recycled")
+                    raw = None
+                elif self.pre_ping and self._ping and not self._ping(raw):
+                    self._close_quietly(raw)
+                    self._bump("ping_failures")
+                    raw = None
+            if raw is None:
+                raw = self._factory()
+                created_at = time.monotonic()
+                self._bump("created")
+        except Exception:
+            with self._cond:
+                self._checked_out -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw: Any, created_at: float) -> None:
+        # End any transaction left open so the next borrower sees fresh data
+        try:
+            if getattr(raw, "in_transaction", True):
+                raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+
+        with self._cond:
+            self._checked_out -= 1
+            if len(self._idle) < self.size:
+                self._idle.append((raw, created_at, time.monotonic()))
+                raw = None
+            self._cond.notify()
+        if raw is not None:
+            # Overflow connection: close it rather than keep it idle
+            self._close_quietly(raw)
+
+    def _discard(self, raw: Any) -> None:
+        self._close_quietly(raw)
+        with self._cond:
+            self._checked_out -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+
+    def _bump(self, key: Text) -> None:
+        with self._cond:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _close_quietly(raw: Any) -> None:
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def dispose(self) -> None:
+        """Close every idle connection (checked-out ones close on return)"""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for raw, _, _ in idle:
+            self._close_quietly(raw)
+
+    def stats(self) -> Dict[Text, Any]:
+        """Snapshot of pool occupancy and lifetime counters"""
+        with self._cond:
+            checked_out = self._checked_out
+            idle = len(self._idle)
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "checked_out": checked_out,
+                "idle": idle,
+                "overflow": max(0, checked_out + idle - self.size),
+                **self._stats,
+            }
+
+
+def _env_bool(name: Text, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _connect_mysql(host: Optional[Text] = None):
+    import mysql.connector
+
+    # Bounded connect and socket reads/writes, so a hung server cannot hold a DB thread forever
+    query_timeout = int(os.getenv('DB_QUERY_TIMEOUT', '10'))
+    return mysql.connector.connect(
+        host=host or os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', ''),
+        database=os.getenv('DB_NAME', 'verisure_demo'),
+        connection_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', '3')),
+        read_timeout=query_timeout,
+        write_timeout=query_timeout,
+    )
+
+
+def _ping_mysql(raw: Any) -> bool:
+    try:
+        raw.ping(reconnect=False)
+        return True
+    except Exception:
+        return False
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def create_mysql_pool(host: Optional[Text] = None) -> ConnectionPool:
+    """MySQL pool sized from env; ``host`` overrides DB_HOST (e.g. a read replica)"""
+    return ConnectionPool(
+        lambda: _connect_mysql(host),
+        size=int(os.getenv('DB_POOL_SIZE', '5')),
+        max_overflow=int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+        recycle=float(os.getenv('DB_POOL_RECYCLE', '300')),
+        pre_ping=_env_bool('DB_POOL_PRE_PING', True),
+        timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+        ping=_ping_mysql,
+    )
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide MySQL pool, creating it from env on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = create_mysql_pool()
+    return _pool
+
+
+def set_pool(pool: ConnectionPool) -> None:
+    """Install a custom MySQL pool (e.g. with different limits)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool is not pool:
+            _pool.dispose()
+        _pool = pool
+
+
+def get_pool_stats() -> Dict[Text, Any]:
+    """Pool statistics for sizing DB_POOL_SIZE / DB_POOL_MAX_OVERFLOW"""
+    return get_pool().stats()
@@ -0,0 +1,226 @@
+"""Routing of read-only queries to replicas.
+
+Writes and reads that must see them stay on the primary pool. Queries that
+tolerate slightly stale data (customer lookups, invoice summaries,
+analytics over ``interactions``) ask the :class:`ReadRouter` for a replica:
+
+- ``round_robin`` spreads them evenly, ``least_latency`` picks the replica
+  with the lowest moving-average query time;
+- a background check measures each replica's lag every
+  DB_REPLICA_CHECK_INTERVAL seconds, and replicas behind by more than
+  DB_REPLICA_MAX_LAG (or that fail the check or a connect) are skipped
+  until the next successful check;
+- after a conversation writes (e.g. schedules a payment date) its reads go
+  to the primary for DB_READ_YOUR_WRITES_WINDOW seconds, so the bot never
+  answers from data older than its own update.
+
+With no eligible replica every read goes to the primary.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Text
+
+from actions.db_pool import ConnectionPool
+from actions.instrumentation import REGISTRY, current_action
+
+logger = logging.getLogger(__name__)
+
+DB_READS = REGISTRY.counter("db_reads_total", "Read-only queries by target (primary or replica name) and reason")
+
+ROUND_ROBIN, LEAST_LATENCY = "round_robin", "least_latency"
+_LATENCY_WEIGHT = 0.2  # weight of the newest sample in the moving average
+
+
+class Replica:
+    def __init__(self, name: Text, pool: ConnectionPool):
+        self.name = name
+        self.pool = pool
+        self.latency = 0.0  # seconds, moving average
+        self.lag: Optional[float] = None  # seconds behind the primary; None until checked
+        self.healthy = False
+        self.checked_at = 0.0
+
+    def observe(self, elapsed: float) -> None:
+        self.latency = elapsed if not self.latency else (
+            (1 - _LATENCY_WEIGHT) * self.latency + _LATENCY_WEIGHT * elapsed)
+
+    def stats(self) -> Dict[Text, Any]:
+        return {"latency_ms": round(self.latency * 1000, 3), "lag": self.lag, "healthy": self.healthy,
+                **self.pool.stats()}
+
+
+def mysql_replica_lag(cursor: Any) -> Optional[float]:
+    """Seconds_Behind_Source of a MySQL/MariaDB replica; 0 for a server that does not replicate"""
+    for statement in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+        try:
+            cursor.execute(statement)
+        except Exception:
+            continue
+        row = cursor.fetchone()
+        if row is None:
+            return 0.0
+        columns = [column[0] for column in cursor.description]
+        status = dict(zip(columns, row))
+        lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+        return None if lag is None else float(lag)  # None: replication stopped
+    return None
+
+
+def no_replica_lag(cursor: Any) -> Optional[float]:
+    """Lag check for stand-in replicas without replication (e.g. SQLite copies)"""
+    cursor.execute("SELECT 1")
+    cursor.fetchone()
+    return 0.0
+
+
+class ReadRouter:
+    def __init__(
+        self,
+        replicas: Sequence[Replica],
+        strategy: Text = ROUND_ROBIN,
+        max_lag: float = 5.0,
+        read_your_writes: Optional[float] = None,
+        check_interval: float = 5.0,
+        lag_check: Callable[[Any], Optional[float]] = no_replica_lag,
+        max_sessions: int = 100000,
+    ):
+        if strategy not in (ROUND_ROBIN, LEAST_LATENCY):
+            raise ValueError(f"DB_READ_STRATEGY must be {ROUND_ROBIN!r} or {LEAST_LATENCY!r}, got {strategy!r}")
+        self.replicas = list(replicas)
+        self.strategy = strategy
+        self.max_lag = max_lag
+        # A write is on every eligible replica at most max_lag later
+        self.read_your_writes = max_lag if read_your_writes is None else read_your_writes
+        self.check_interval = check_interval
+        self.lag_check = lag_check
+        self.max_sessions = max_sessions
+        self._counter = itertools.count()
+        self._writers: "OrderedDict[Text, float]" = OrderedDict()  # session_id -> primary-only until
+        self._lock = threading.Lock()
+        self._monitor: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    # routing
+
+    def choose(self, session_id: Optional[Text] = None) -> Optional[Replica]:
+        """Replica for a read, or None to use the primary"""
+        self._ensure_monitor()
+        if session_id is not None and self._pinned(session_id):
+            DB_READS.inc(target="primary", reason="read_your_writes")
+            return None
+        eligible = [r for r in self.replicas if r.healthy and r.lag is not None and r.lag <= self.max_lag]
+        if not eligible:
+            DB_READS.inc(target="primary", reason="no_replica")
+            return None
+        if self.strategy == LEAST_LATENCY:
+            replica = min(eligible, key=lambda r: r.latency)
+        else:
+            replica = eligible[next(self._counter) % len(eligible)]
+        DB_READS.inc(target=replica.name, reason=self.strategy)
+        return replica
+
+    def note_write(self, session_id: Optional[Text]) -> None:
+        """Keep ``session_id``'s reads on the primary for the read-your-writes window"""
+        if not session_id or not self.read_your_writes:
+            return
+        with self._lock:
+            self._writers[session_id] = time.monotonic() + self.read_your_writes
+            self._writers.move_to_end(session_id)
+            while len(self._writers) > self.max_sessions:
+                self._writers.popitem(last=False)
+
+    def _pinned(self, session_id: Text) -> bool:
+        with self._lock:
+            until = self._writers.get(session_id)
+            if until is None:
+                return False
+            if until < time.monotonic():
+                del self._writers[session_id]
+                return False
+            return True
+
+    def mark_down(self, replica: Replica, error: Exception) -> None:
+        """Skip a replica that failed until the next successful check"""
+        if replica.healthy:
+            logger.warning("replica unavailable", extra={"replica": replica.name, "error": str(error)})
+        replica.healthy = False
+
+    # health and lag
+
+    def check(self, replica: Replica) -> None:
+        started = time.perf_counter()
+        try:
+            with replica.pool.connect() as connection:
+                cursor = connection.cursor()
+                try:
+                    lag = self.lag_check(cursor)
+                finally:
+                    cursor.close()
+        except Exception as e:
+            self.mark_down(replica, e)
+            replica.lag = None
+        else:
+            replica.observe(time.perf_counter() - started)
+            if lag is None or lag > self.max_lag:
+                logger.warning("replica lagging", extra={"replica": replica.name, "lag": lag})
+            elif not replica.healthy:
+                logger.info("replica available", extra={"replica": replica.name, "lag": lag})
+            replica.lag = lag
+            replica.healthy = True
+        replica.checked_at = time.monotonic()
+
+    def check_all(self) -> None:
+        for replica in self.replicas:
+            self.check(replica)
+
+    def start(self) -> None:
+        """Check every replica now and start the background checks (otherwise done on the first read)"""
+        self._ensure_monitor()
+
+    def _ensure_monitor(self) -> None:
+        if self._monitor is not None or not self.replicas:
+            return
+        with self._lock:
+            if self._monitor is not None:
+                return
+            monitor = self._monitor = threading.Thread(target=self._run_monitor, name="db-replica-monitor",
+                                                       daemon=True)
+        # First check inline (outside the lock, which every read takes), so this read already knows
+        # which replicas are usable; reads arriving meanwhile go to the primary
+        self.check_all()
+        monitor.start()
+
+    def _run_monitor(self) -> None:
+        while not self._stopped.wait(self.check_interval):
+            try:
+                self.check_all()
+            except Exception:
+                logger.exception("replica check failed")
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def dispose(self) -> None:
+        self.stop()
+        for replica in self.replicas:
+            replica.pool.dispose()
+
+    def stats(self) -> Dict[Text, Any]:
+        with self._lock:
+            pinned = len(self._writers)
+        return {"strategy": self.strategy, "max_lag": self.max_lag, "pinned_sessions": pinned,
+                "replicas": {replica.name: replica.stats() for replica in self.replicas}}
+
+
+def current_session() -> Optional[Text]:
+    """Conversation of the running action, for read-your-writes"""
+    stats = current_action()
+    return stats.sender_id if stats is not None else None
+
+
+def parse_replicas(value: Text) -> List[Text]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
@@ -0,0 +1,334 @@
+"""Per-action latency/DB metrics, Prometheus export and JSON logging.
+
+Every action's ``run`` is wrapped with :func:`instrumented`, which records
+wall time, DB time, query count and errors under the action's name. DB time
+is collected by the pooled connections' cursors (see ``actions.db_pool``)
+into a context variable, so queries run on the DB executor are attributed
+to the action that awaited them. Metrics are served in the Prometheus text
+format on ``METRICS_PORT`` (disabled when unset), which also takes
+``/profiling`` admin requests (see ``actions.profiling``).
+"""
+
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Text, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from actions.profiling import PROFILER, configure_from_query
+from server_logging import JsonFormatter, admin_authorized, configure_logging  # noqa: F401 (re-exported)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[Text, Text], ...]
+
+
+def _format_labels(labels: Labels, extra: Iterable[Tuple[Text, Text]] = ()) -> Text:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name: Text, documentation: Text):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Text) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Text) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def expose(self) -> List[Text]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: Text, documentation: Text, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., +Inf count], sum
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Text) -> None:
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, **labels: Text) -> int:
+        entry = self._values.get(tuple(sorted(labels.items())))
+        return sum(entry[0]) if entry else 0
+
+    def expose(self) -> List[Text]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, [('le', repr(bound))])} {cumulative}")
+                cumulative += counts[-1]
+                lines.append(f"{self.name}_bucket{_format_labels(labels, [('le', '+Inf')])} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total[0]}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds metrics plus collectors that report gauges at scrape time"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Dict[Text, float]]] = []
+
+    def counter(self, name: Text, documentation: Text) -> Counter:
+        metric = Counter(name, documentation)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: Text, documentation: Text, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Dict[Text, float]]) -> None:
+        """``collector()`` returns {gauge_name: value}; errors are skipped"""
+        self._collectors.append(collector)
+
+    def expose(self) -> Text:
+        lines: List[Text] = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        for collector in self._collectors:
+            try:
+                gauges = collector()
+            except Exception:
+                continue
+            for name, value in sorted(gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+ACTION_DURATION = REGISTRY.histogram("action_duration_seconds", "Wall time of Action.run by action")
+ACTION_DB_DURATION = REGISTRY.histogram("action_db_duration_seconds", "Time spent in DB queries per action run")
+ACTION_DB_QUERIES = REGISTRY.counter("action_db_queries_total", "DB queries executed by action")
+ACTION_RUNS = REGISTRY.counter("action_runs_total", "Action.run invocations by action")
+ACTION_ERRORS = REGISTRY.counter("action_errors_total", "Action.run invocations that raised, by action")
+DB_QUERY_DURATION = REGISTRY.histogram("db_query_duration_seconds", "Duration of every DB query, all callers")
+
+
+def _runtime_gauges() -> Dict[Text, float]:
+    """Pool, cache and interaction-logger counters, read at scrape time"""
+    from actions.cache import get_cache_stats
+    from actions.interaction_logger import get_interaction_logger_stats
+    from actions.storage import get_storage
+
+    gauges: Dict[Text, float] = {}
+    for key, value in get_storage().pool.stats().items():
+        gauges[f"db_pool_{key}"] = value
+    for cache_name, stats in get_cache_stats().items():
+        for key, value in stats.items():
+            gauges[f"cache_{cache_name}_{key}"] = value
+    for key, value in get_interaction_logger_stats().items():
+        gauges[f"interaction_log_{key}"] = value
+    gauges["profiling_enabled"] = float(PROFILER.enabled)
+    gauges["profiling_runs"] = PROFILER.profiled
+    return gauges
+
+
+REGISTRY.add_collector(_runtime_gauges)
+
+
+class ActionStats:
+    __slots__ = ("action", "db_time", "queries", "started", "sender_id")
+
+    def __init__(self, action: Text, sender_id: Optional[Text] = None):
+        self.action = action
+        self.db_time = 0.0
+        self.queries = 0
+        self.started = time.perf_counter()
+        self.sender_id = sender_id
+
+
+_current_action: "contextvars.ContextVar[Optional[ActionStats]]" = contextvars.ContextVar(
+    "current_action", default=None
+)
+
+
+def current_action() -> Optional[ActionStats]:
+    return _current_action.get()
+
+
+def record_query(elapsed: float) -> None:
+    """Called by the pooled cursors after every execute()"""
+    DB_QUERY_DURATION.observe(elapsed)
+    stats = _current_action.get()
+    if stats is not None:
+        stats.db_time += elapsed
+        stats.queries += 1
+
+
+def _finish(stats: ActionStats, started: float, failed: bool) -> None:
+    elapsed = time.perf_counter() - started
+    ACTION_DURATION.observe(elapsed, action=stats.action)
+    ACTION_DB_DURATION.observe(stats.db_time, action=stats.action)
+    ACTION_RUNS.inc(action=stats.action)
+    if stats.queries:
+        ACTION_DB_QUERIES.inc(stats.queries, action=stats.action)
+    if failed:
+        ACTION_ERRORS.inc(action=stats.action)
+    logger.debug(
+        "action finished",
+        extra={"action": stats.action, "duration_ms": round(elapsed * 1000, 3),
+               "db_ms": round(stats.db_time * 1000, 3), "queries": stats.queries, "failed": failed},
+    )
+
+
+def _sender_id(args: Sequence[Any]) -> Optional[Text]:
+    # run(dispatcher, tracker, domain)
+    return getattr(args[1], "sender_id", None) if len(args) > 1 else None
+
+
+def instrumented(run: Callable) -> Callable:
+    """Decorator for Action.run recording latency, DB time, queries and errors"""
+    if inspect.iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def async_wrapper(self, *args, **kwargs):
+            ensure_metrics_server()
+            stats = ActionStats(self.name(), _sender_id(args))
+            token = _current_action.set(stats)
+            capture = PROFILER.begin(stats.action) if PROFILER.enabled else None
+            started = time.perf_counter()
+            failed = False
+            try:
+                return await run(self, *args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                if capture is not None:
+                    PROFILER.finish(capture)
+                _current_action.reset(token)
+                _finish(stats, started, failed)
+        return async_wrapper
+
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        ensure_metrics_server()
+        stats = ActionStats(self.name(), _sender_id(args))
+        token = _current_action.set(stats)
+        capture = PROFILER.begin(stats.action) if PROFILER.enabled else None
+        started = time.perf_counter()
+        failed = False
+        try:
+            return run(self, *args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            if capture is not None:
+                PROFILER.finish(capture)
+            _current_action.reset(token)
+            _finish(stats, started, failed)
+    return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        path = self.path.split("?")[0]
+        if path == "/profiling":
+            self._send(200, json.dumps(PROFILER.status()), "application/json")
+            return
+        if path != "/metrics":
+            self.send_error(404)
+            return
+        self._send(200, REGISTRY.expose(), "text/plain; version=0.0.4; charset=utf-8")
+
+    def do_POST(self) -> None:
+        """POST /profiling?actions=a,b&rate=0.1&mode=sample&duration=300 (actions= disables)"""
+        url = urlsplit(self.path)
+        if url.path != "/profiling":
+            self.send_error(404)
+            return
+        if not admin_authorized(self.headers):
+            self.send_error(403)
+            return
+        try:
+            status = configure_from_query(parse_qs(url.query, keep_blank_values=True))
+        except ValueError as e:
+            self._send(400, json.dumps({"error": str(e)}), "application/json")
+            return
+        self._send(200, json.dumps(status), "application/json")
+
+    def _send(self, code: int, text: Text, content_type: Text) -> None:
+        body = text.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: Text, *args: Any) -> None:
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+_server_checked = False
+
+
+def start_metrics_server(port: int, host: Text = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve REGISTRY on http://host:port/metrics from a daemon thread"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info("metrics server started", extra={"port": port})
+    return _server
+
+
+def ensure_metrics_server() -> None:
+    """Start the metrics server once if METRICS_PORT is configured"""
+    global _server_checked
+    if _server_checked:
+        return
+    _server_checked = True
+    port = os.getenv("METRICS_PORT")
+    if port:
+        try:
+            start_metrics_server(int(port), os.getenv("METRICS_HOST", "0.0.0.0"))
+        except OSError as e:
+            logger.error("could not start metrics server", extra={"port": port, "error": str(e)})
+
+
+logger = logging.getLogger(__name__)
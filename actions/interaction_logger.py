@@ -0,0 +1,202 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Text, Tuple
+
+from actions.storage import Storage, get_storage
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+Event = Tuple[Text, Text, Optional[Text], datetime]
+
+
+class InteractionLogger:
+    """Write-behind logger for the interactions table.
+
+    ``log()`` only appends to a bounded in-memory queue; a background thread
+    flushes the queue as multi-row INSERTs whenever ``batch_size`` events are
+    waiting or ``flush_interval`` seconds have passed. When the queue is full
+    the ``overflow_policy`` decides what happens:
+
+    - ``drop_newest``: discard the incoming event (default, never blocks)
+    - ``drop_oldest``: discard the oldest queued event to make room
+    - ``block``: wait up to ``block_timeout`` seconds, then drop the event
+    """
+
+    def __init__(
+        self,
+        storage: Callable[[], Storage],
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        overflow_policy: Text = "drop_newest",
+        block_timeout: float = 0.05,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}, got {overflow_policy!r}")
+        self._storage = storage
+        self._queue: "queue.Queue[Event]" = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+
+        self._stop = threading.Event()
+        self._schema_checked = False
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._counters = {
+            "enqueued": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+        }
+
+    def start(self) -> None:
+        """Start the flusher thread; the schema check runs there, once"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="interaction-logger", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def log(self, session_id: Text, interaction_type: Text, data: Optional[Text] = None) -> bool:
+        """Queue an interaction; returns False if it was dropped"""
+        if self._thread is None:
+            self.start()
+        event = (session_id, interaction_type, data, datetime.now())
+        try:
+            if self.overflow_policy == "block":
+                self._queue.put(event, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            if self.overflow_policy != "drop_oldest":
+                self._count("dropped")
+                return False
+            try:
+                self._queue.get_nowait()
+                self._count("dropped")
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        self._count("enqueued")
+        return True
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the background loop after draining what is queued"""
+        thread = self._thread
+        if thread is None or self._stop.is_set():
+            return
+        self._stop.set()
+        thread.join(timeout)
+
+    def stats(self) -> Dict[Text, Any]:
+        """Counters for queued/flushed/dropped events"""
+        with self._counter_lock:
+            return {"queued": self._queue.qsize(), **self._counters}
+
+    def _count(self, key: Text, amount: int = 1) -> None:
+        with self._counter_lock:
+            self._counters[key] += amount
+
+    def _run(self) -> None:
+        if not self._schema_checked:
+            self.check_schema()
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+        # Shutdown: drain everything still queued
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            self._flush(batch)
+
+    def _collect(self) -> List[Event]:
+        batch: List[Event] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                continue
+            batch.extend(self._drain(self.batch_size - len(batch)))
+        return batch
+
+    def _drain(self, limit: int) -> List[Event]:
+        items: List[Event] = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def check_schema(self) -> bool:
+        """Verify the interactions table is migrated (once; the start-up warm-up calls it early)"""
+        try:
+            self._storage().check_schema()
+        except Exception as e:
+            logger.error("interactions table not ready", extra={"error": str(e)})
+            return False
+        self._schema_checked = True
+        return True
+
+    def _flush(self, batch: List[Event]) -> None:
+        try:
+            self._storage().insert_interactions(batch)
+            self._count("flushed", len(batch))
+            self._count("flushes")
+        except Exception as e:
+            logger.error("interaction flush failed", extra={"events": len(batch), "error": str(e)})
+            self._count("flush_errors")
+            self._count("dropped", len(batch))
+
+
+_logger: Optional[InteractionLogger] = None
+_logger_lock = threading.Lock()
+
+
+def get_interaction_logger() -> InteractionLogger:
+    """Return the process-wide interaction logger, configured from env"""
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                _logger = InteractionLogger(
+                    get_storage,
+                    max_queue=int(os.getenv('INTERACTION_LOG_QUEUE_SIZE', '10000')),
+                    batch_size=int(os.getenv('INTERACTION_LOG_BATCH_SIZE', '200')),
+                    flush_interval=float(os.getenv('INTERACTION_LOG_FLUSH_INTERVAL', '1.0')),
+                    overflow_policy=os.getenv('INTERACTION_LOG_OVERFLOW_POLICY', 'drop_newest'),
+                )
+    return _logger
+
+
+def set_interaction_logger(interaction_logger: InteractionLogger) -> None:
+    """Install a custom logger (e.g. one that discards events during a replay)"""
+    global _logger
+    with _logger_lock:
+        _logger = interaction_logger
+
+
+def get_interaction_logger_stats() -> Dict[Text, Any]:
+    return get_interaction_logger().stats()
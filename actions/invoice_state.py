@@ -0,0 +1,95 @@
+"""Invoice state machine used by the actions that change invoices.
+
+    pending ──► payment_scheduled ──► paid
+       │               │
+       └──► disputed ◄─┘
+
+Transitions run by customer id through :meth:`Storage.transition_invoices`:
+one transaction with the affected rows locked, an audit row per invoice and
+an idempotency key per conversation turn, so a retried action request
+never applies the same transition twice.
+"""
+
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Text
+
+from actions.cache import invalidate_customer_invoices
+from actions.storage import get_storage
+
+PENDING = "pending"
+PAYMENT_SCHEDULED = "payment_scheduled"
+DISPUTED = "disputed"
+PAID = "paid"
+
+# to_status -> statuses it can be reached from
+TRANSITIONS: Dict[Text, FrozenSet[Text]] = {
+    PAYMENT_SCHEDULED: frozenset({PENDING}),
+    DISPUTED: frozenset({PENDING, PAYMENT_SCHEDULED}),
+    PAID: frozenset({PENDING, PAYMENT_SCHEDULED}),
+}
+
+
+class InvalidTransition(ValueError):
+    """Raised for a target status the state machine does not allow"""
+
+
+class TransitionResult(NamedTuple):
+    to_status: Text
+    invoice_ids: List[int]
+    applied: bool  # False when the idempotency key had already been used
+
+    @property
+    def count(self) -> int:
+        return len(self.invoice_ids)
+
+
+def turn_idempotency_key(tracker: Any, operation: Text) -> Text:
+    """Key identifying ``operation`` within the tracker's current user turn.
+
+    Rasa retries send the same tracker, so the key is stable across retries
+    of one turn and different for the next message of the conversation.
+    """
+    message_id = tracker.latest_message.get("message_id")
+    if not message_id:
+        # Fall back to the position of the latest user message in the history
+        message_id = f"e{sum(1 for event in tracker.events if event.get('event') == 'user')}"
+    key = f"{operation}:{tracker.sender_id}:{message_id}"
+    return key[:191]
+
+
+def transition(
+    customer_id: int,
+    to_status: Text,
+    idempotency_key: Text,
+    payment_date: Optional[Text] = None,
+    session_id: Optional[Text] = None,
+    from_statuses: Optional[FrozenSet[Text]] = None,
+) -> TransitionResult:
+    """Move the customer's invoices to ``to_status`` (from every allowed status by default)"""
+    allowed = TRANSITIONS.get(to_status)
+    if allowed is None:
+        raise InvalidTransition(f"No transition into {to_status!r}")
+    if from_statuses is None:
+        from_statuses = allowed
+    elif not from_statuses <= allowed:
+        raise InvalidTransition(f"{to_status!r} cannot be reached from {sorted(from_statuses - allowed)}")
+
+    applied, invoice_ids = get_storage().transition_invoices(
+        customer_id, sorted(from_statuses), to_status, idempotency_key,
+        payment_date=payment_date, session_id=session_id,
+    )
+    if applied:
+        invalidate_customer_invoices(customer_id)
+    return TransitionResult(to_status, invoice_ids, applied)
+
+
+def schedule_payment(customer_id: int, payment_date: Text, idempotency_key: Text,
+                     session_id: Optional[Text] = None) -> TransitionResult:
+    """pending -> payment_scheduled with the promised payment date"""
+    return transition(customer_id, PAYMENT_SCHEDULED, idempotency_key, payment_date=payment_date,
+                      session_id=session_id)
+
+
+def dispute(customer_id: int, idempotency_key: Text, session_id: Optional[Text] = None) -> TransitionResult:
+    """pending -> disputed (scheduled invoices keep their promise)"""
+    return transition(customer_id, DISPUTED, idempotency_key, session_id=session_id,
+                      from_statuses=frozenset({PENDING}))
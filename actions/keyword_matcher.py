@@ -0,0 +1,201 @@
+"""Single-pass multi-keyword matcher shared by the keyword-based actions.
+
+Keywords are phrases of one or more words. All phrases from every group in
+``keywords.yml`` are compiled once into a word-level Aho-Corasick automaton,
+so a message is tokenized once and scanned once no matter how many
+categories exist. Working on word tokens gives whole-word matching for free,
+and tokens are accent-folded so "sí" and "si" are the same keyword.
+"""
+
+import os
+import re
+import threading
+from typing import AbstractSet, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Set, Text, Tuple
+
+import yaml
+
+from actions.text import normalize
+
+DEFAULT_KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "keywords.yml")
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: Text) -> List[Text]:
+    """Accent-folded, lower-case word tokens"""
+    return _WORD.findall(normalize(text))
+
+
+class KeywordHit(NamedTuple):
+    group: Text
+    category: Text
+    keyword: Text
+    start: int  # token index
+    end: int  # token index, exclusive
+
+
+# Internal hit layout; sorts naturally by group, start, longest first
+_RawHit = Tuple[Text, int, int, Text, Text]  # (group, start, -end, category, keyword)
+
+
+class ScanResult:
+    """Hits of one scan, resolved per group to leftmost-longest matches"""
+
+    __slots__ = ("_raw", "_by_group")
+
+    def __init__(self, raw: List[_RawHit], by_group: Dict[Text, Set[Text]]):
+        self._raw = raw
+        self._by_group = by_group
+
+    @property
+    def hits(self) -> List[KeywordHit]:
+        return [KeywordHit(group, category, keyword, start, -neg_end)
+                for group, start, neg_end, category, keyword in self._raw]
+
+    def categories(self, group: Text) -> AbstractSet[Text]:
+        """Categories hit in ``group`` (treat the returned set as read-only)"""
+        return self._by_group.get(group, _EMPTY)
+
+    def has(self, group: Text, category: Text) -> bool:
+        return category in self._by_group.get(group, _EMPTY)
+
+
+_EMPTY: FrozenSet[Text] = frozenset()
+
+
+class KeywordMatcher:
+    """Word-level Aho-Corasick automaton over ``{group: {category: [phrase]}}``"""
+
+    def __init__(self, groups: Dict[Text, Dict[Text, Iterable[Text]]]):
+        self.groups = {group: {category: list(phrases) for category, phrases in categories.items()}
+                       for group, categories in groups.items()}
+        # Node 0 is the root; goto[node] maps a token to the next node
+        self._goto: List[Dict[Text, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Phrases ending at each node: (group, category, keyword, length in tokens)
+        self._out: List[Tuple[Tuple[Text, Text, Text, int], ...]] = [()]
+
+        for group, categories in self.groups.items():
+            for category, phrases in categories.items():
+                for phrase in phrases:
+                    self._add(group, category, phrase)
+        self._build_failure_links()
+
+    def _add(self, group: Text, category: Text, phrase: Text) -> None:
+        tokens = tokenize(phrase)
+        if not tokens:
+            return
+        node = 0
+        for token in tokens:
+            next_node = self._goto[node].get(token)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][token] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = next_node
+        # Spellings that fold to the same tokens ("si"/"sí") share one entry
+        if not any(g == group and c == category for g, c, _, _ in self._out[node]):
+            self._out[node] += ((group, category, phrase, len(tokens)),)
+
+    def _build_failure_links(self) -> None:
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def _scan_raw(self, tokens: Sequence[Text]) -> List[_RawHit]:
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = []
+        node = 0
+        for index, token in enumerate(tokens):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            if out[node]:
+                end = index + 1
+                for group, category, keyword, length in out[node]:
+                    hits.append((group, end - length, -end, category, keyword))
+        return hits
+
+    def scan_tokens(self, tokens: List[Text]) -> List[KeywordHit]:
+        """Every phrase occurrence in ``tokens``, including overlapping ones"""
+        return ScanResult(self._scan_raw(tokens), {}).hits
+
+    def scan(self, text: Text) -> ScanResult:
+        """Scan ``text`` once; within each group keep leftmost-longest hits"""
+        return self._resolve(self._scan_raw(tokenize(text)))
+
+    @staticmethod
+    def _resolve(raw: List[_RawHit]) -> ScanResult:
+        if not raw:
+            return _EMPTY_RESULT
+        if len(raw) == 1:
+            return ScanResult(raw, {raw[0][0]: {raw[0][3]}})
+        # Longest phrase first at each start; shorter phrases it covers are
+        # dropped, but equal spans in different categories are all kept.
+        raw.sort()
+        resolved = []
+        by_group: Dict[Text, Set[Text]] = {}
+        group = None
+        covered_until = 0
+        kept_span = None
+        for hit in raw:
+            if hit[0] != group:
+                group, covered_until, kept_span = hit[0], 0, None
+            span = (hit[1], hit[2])
+            if span == kept_span or hit[1] >= covered_until:
+                resolved.append(hit)
+                by_group.setdefault(group, set()).add(hit[3])
+                covered_until = -hit[2]
+                kept_span = span
+        return ScanResult(resolved, by_group)
+
+    def scan_many(self, texts: Iterable[Text]) -> List[ScanResult]:
+        """``scan`` over a batch; texts with the same tokens are scanned once"""
+        memo: Dict[Tuple[Text, ...], ScanResult] = {}
+        results = []
+        for text in texts:
+            key = tuple(tokenize(text))
+            result = memo.get(key)
+            if result is None:
+                result = memo[key] = self._resolve(self._scan_raw(key))
+            results.append(result)
+        return results
+
+
+_EMPTY_RESULT = ScanResult([], {})
+
+
+def load_keyword_groups(path: Text) -> Dict[Text, Dict[Text, List[Text]]]:
+    with open(path, encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    for group, categories in data.items():
+        if not isinstance(categories, dict):
+            raise ValueError(f"{path}: group {group!r} must map categories to keyword lists")
+        for category, phrases in categories.items():
+            if not isinstance(phrases, list) or not all(isinstance(p, str) for p in phrases):
+                raise ValueError(f"{path}: {group}.{category} must be a list of quoted-if-needed strings")
+    return data
+
+
+_matcher: Optional[KeywordMatcher] = None
+_matcher_lock = threading.Lock()
+
+
+def get_keyword_matcher() -> KeywordMatcher:
+    """Return the process-wide matcher built from KEYWORDS_PATH / keywords.yml"""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                path = os.getenv('KEYWORDS_PATH', DEFAULT_KEYWORDS_PATH)
+                _matcher = KeywordMatcher(load_keyword_groups(path))
+    return _matcher
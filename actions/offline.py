@@ -0,0 +1,56 @@
+"""Helpers for running actions outside the action server (benchmarks, tools)
+
+The embedded SQLite database these tools use lives in ``actions.storage``.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from rasa_sdk import Action, Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+
+def make_tracker(
+    text: Text = "",
+    slots: Optional[Dict[Text, Any]] = None,
+    sender_id: Text = "offline",
+    intent: Optional[Text] = None,
+    entities: Optional[List[Dict[Text, Any]]] = None,
+    message_id: Optional[Text] = None,
+) -> Tracker:
+    """Build a Tracker whose latest user message is ``text``"""
+    latest_message = {
+        "text": text,
+        "intent": {"name": intent, "confidence": 1.0} if intent else {},
+        "entities": entities or [],
+    }
+    if message_id:
+        latest_message["message_id"] = message_id
+    return Tracker(
+        sender_id=sender_id,
+        slots=dict(slots or {}),
+        latest_message=latest_message,
+        events=[],
+        paused=False,
+        followup_action=None,
+        active_loop={},
+        latest_action_name=None,
+    )
+
+
+async def run_action_async(
+    action: Action, tracker: Tracker, domain: Optional[Dict[Text, Any]] = None
+) -> Tuple[List[Dict[Text, Any]], List[Dict[Text, Any]]]:
+    """Run an action; returns (events, dispatched messages)"""
+    dispatcher = CollectingDispatcher()
+    result = action.run(dispatcher, tracker, domain or {})
+    if asyncio.iscoroutine(result):
+        result = await result
+    return result or [], dispatcher.messages
+
+
+def run_action(
+    action: Action, tracker: Tracker, domain: Optional[Dict[Text, Any]] = None
+) -> Tuple[List[Dict[Text, Any]], List[Dict[Text, Any]]]:
+    """Synchronous wrapper around :func:`run_action_async`"""
+    return asyncio.run(run_action_async(action, tracker, domain))
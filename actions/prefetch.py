@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Text, Tuple
+
+from actions.async_db import get_executor
+from actions.instrumentation import REGISTRY
+from actions.resilience import CLOSED, db_breaker
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_RESULTS = REGISTRY.counter(
+    "prefetch_lookups_total", "Prefetched results looked up, by outcome (hit, pending, miss, error, stale)"
+)
+
+
+class Prefetcher:
+    """Starts a lookup in the background and keeps its future per conversation.
+
+    ``start(sender_id, key, func)`` submits ``func()`` to the DB executor as
+    soon as the input is known; a later turn calls ``take(sender_id, key)``,
+    which returns the result (awaiting it if still running) and removes the
+    entry. Results are single-use, expire after ``ttl`` seconds and only
+    match when ``key`` (e.g. the client name) is the same one they were
+    started for.
+    """
+
+    def __init__(self, name: Text, ttl: float = 300.0, maxsize: int = 10000):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Text, Tuple[Any, float, Future]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, sender_id: Text, key: Any, func: Callable[[], Any]) -> bool:
+        """Begin fetching unless the same key is already in flight for this sender"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(sender_id)
+            if entry is not None and entry[0] == key and entry[1] > now:
+                return False
+            # Copied context: the fetch sees the action's contextvars (current action, session, profiling)
+            future = get_executor().submit(contextvars.copy_context().run, func)
+            self._entries[sender_id] = (key, now + self.ttl, future)
+            self._entries.move_to_end(sender_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return True
+
+    async def take(self, sender_id: Text, key: Any) -> Any:
+        """Return the prefetched result, or ``None`` if there is none to use"""
+        with self._lock:
+            entry = self._entries.pop(sender_id, None)
+        if entry is None:
+            self._count("miss")
+            return None
+        entry_key, expires_at, future = entry
+        if entry_key != key or expires_at < time.monotonic():
+            self._count("stale")
+            return None
+        self._count("hit" if future.done() else "pending")
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception as e:
+            self._count("error")
+            logger.warning("prefetch failed", extra={"prefetch": self.name, "error": str(e)})
+            return None
+
+    def discard(self, sender_id: Text) -> None:
+        """Forget a prefetched result (e.g. after the data it read changed)"""
+        with self._lock:
+            self._entries.pop(sender_id, None)
+
+    def _count(self, outcome: Text) -> None:
+        PREFETCH_RESULTS.inc(prefetch=self.name, outcome=outcome)
+
+    def stats(self) -> Dict[Text, Any]:
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl}
+
+
+def _enabled() -> bool:
+    return os.getenv('PREFETCH_ENABLED', 'true').strip().lower() in ("1", "true", "yes", "on")
+
+
+# sender_id -> (invoice_count, total_amount) for the client named in the conversation
+invoice_summary_prefetch = Prefetcher(
+    "invoice_summary",
+    ttl=float(os.getenv('PREFETCH_TTL', '300')),
+    maxsize=int(os.getenv('PREFETCH_MAX_ENTRIES', '10000')),
+)
+
+
+def prefetch_invoice_summary(sender_id: Text, client_name: Text, fetch: Callable[[Text], Any]) -> None:
+    """Start ``fetch(client_name)`` in the background for this conversation"""
+    if not _enabled() or not client_name:
+        return
+    if db_breaker.state != CLOSED:
+        return  # the DB is failing; do not queue work the turn will not wait for
+    try:
+        invoice_summary_prefetch.start(sender_id, client_name, lambda: fetch(client_name))
+    except RuntimeError as e:  # executor shut down
+        logger.warning("could not start prefetch", extra={"error": str(e)})
+
+
+async def take_invoice_summary(sender_id: Text, client_name: Text) -> Optional[Any]:
+    return await invoice_summary_prefetch.take(sender_id, client_name)
@@ -0,0 +1,305 @@
+"""On-demand profiling of action runs.
+
+Off by default. When enabled for some actions (PROFILE_ACTIONS, or at
+runtime through ``/profiling`` on the metrics server) a fraction
+(PROFILE_RATE) of their runs is profiled and written under PROFILE_DIR:
+
+- ``sample`` mode (default): a background thread samples the stacks of the
+  threads working for the run every PROFILE_INTERVAL seconds: the event
+  loop thread while the action's coroutine is on it, and the DB executor
+  threads while they run its blocking calls (so time waiting on MariaDB
+  shows up as socket reads). Samples where neither is running are counted
+  as ``[awaiting]``. Each run is written as a folded-stack file
+  (``flamegraph.pl``, speedscope, ...) and added to ``<action>.<pid>.folded``,
+  the aggregate of every profiled run of the action.
+- ``cprofile`` mode: deterministic cProfile of the run on the loop thread
+  plus one profile per blocking DB call, merged into a ``.prof`` file per
+  run and an aggregate ``<action>.<pid>.prof`` (pstats, snakeviz). Other
+  coroutines that run on the loop while the action awaits are included, and
+  only one run per loop is profiled at a time.
+
+With profiling disabled the only cost per action run is reading
+``PROFILER.enabled``.
+"""
+
+import cProfile
+import contextvars
+import functools
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Text
+
+logger = logging.getLogger(__name__)
+
+SAMPLE, CPROFILE = "sample", "cprofile"
+AWAITING = "[awaiting]"
+DB_THREAD = "[db thread]"
+
+
+def _frame_name(frame: Any) -> Text:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack_below(leaf: Any, root: Any) -> Optional[List[Text]]:
+    """Frame names from just under ``root`` down to ``leaf``; None if ``root`` is not on the stack"""
+    names = []
+    frame = leaf
+    while frame is not None:
+        if frame is root:
+            names.reverse()
+            return names
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return None
+
+
+class Capture:
+    """One profiled action run"""
+
+    __slots__ = ("action", "mode", "root", "thread", "workers", "samples", "profiles", "lock", "started", "token")
+
+    def __init__(self, action: Text, mode: Text, root: Any):
+        self.action = action
+        self.mode = mode
+        self.root = root  # the instrumented wrapper's frame
+        self.thread = threading.get_ident()
+        self.workers: Dict[int, Any] = {}  # thread id -> frame of the blocking call
+        self.samples: Counter = Counter()
+        self.profiles: List[cProfile.Profile] = []
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.token: Optional[contextvars.Token] = None
+
+    def sample(self, frames: Dict[int, Any]) -> None:
+        found = False
+        stack = _stack_below(frames[self.thread], self.root) if self.thread in frames else None
+        if stack:
+            self.samples[";".join([self.action] + stack)] += 1
+            found = True
+        with self.lock:
+            workers = list(self.workers.items())
+        for thread, root in workers:
+            stack = _stack_below(frames[thread], root) if thread in frames else None
+            if stack is not None:
+                self.samples[";".join([self.action, DB_THREAD] + stack)] += 1
+                found = True
+        if not found:
+            self.samples[f"{self.action};{AWAITING}"] += 1
+
+
+_current_capture: "contextvars.ContextVar[Optional[Capture]]" = contextvars.ContextVar(
+    "current_profile_capture", default=None
+)
+
+
+def _parse_actions(value: Text) -> Optional[FrozenSet[Text]]:
+    """'*' -> None (every action), 'a,b' -> {'a', 'b'}"""
+    names = frozenset(item.strip() for item in (value or "").split(",") if item.strip())
+    return None if "*" in names else names
+
+
+class Profiler:
+    def __init__(self, output_dir: Text = "profiles", interval: float = 0.005, max_files: int = 1000):
+        self.enabled = False  # read on every action run; everything else only when True
+        self.actions: Optional[FrozenSet[Text]] = frozenset()
+        self.rate = 1.0
+        self.mode = SAMPLE
+        self.until: Optional[float] = None
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_files = max_files
+        self.files = 0
+        self.profiled = 0
+        self._active: List[Capture] = []
+        self._cprofiled: set = set()  # threads with a cProfile enabled; one per thread at a time
+        self._folded: Dict[Text, Counter] = {}
+        self._stats: Dict[Text, pstats.Stats] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._sampler: Optional[threading.Thread] = None
+
+    # switch
+
+    def configure(self, actions: Text, rate: float = 1.0, mode: Text = SAMPLE,
+                  duration: Optional[float] = None, output_dir: Optional[Text] = None) -> None:
+        """Profile ``rate`` of the runs of ``actions`` ('*' for all, '' to disable) for ``duration`` seconds"""
+        if mode not in (SAMPLE, CPROFILE):
+            raise ValueError(f"profiling mode must be {SAMPLE!r} or {CPROFILE!r}, got {mode!r}")
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(f"profiling rate must be between 0 and 1, got {rate}")
+        with self._lock:
+            self.actions = _parse_actions(actions)
+            self.rate = rate
+            self.mode = mode
+            self.until = time.monotonic() + duration if duration else None
+            if output_dir:
+                self.output_dir = output_dir
+            self.enabled = self.actions is None or bool(self.actions)
+        logger.info("profiling configured", extra=self.status())
+
+    def disable(self) -> None:
+        self.configure("")
+
+    def status(self) -> Dict[Text, Any]:
+        remaining = max(0.0, self.until - time.monotonic()) if self.until is not None else None
+        return {"enabled": self.enabled, "actions": "*" if self.actions is None else sorted(self.actions),
+                "rate": self.rate, "mode": self.mode, "remaining_s": remaining, "output_dir": self.output_dir,
+                "profiled_runs": self.profiled, "active": len(self._active)}
+
+    # action runs
+
+    def begin(self, action: Text) -> Optional[Capture]:
+        """Start profiling this run if it is selected; call from the instrumented wrapper"""
+        if self.until is not None and time.monotonic() > self.until:
+            self.disable()
+            return None
+        if self.actions is not None and action not in self.actions:
+            return None
+        if self.rate < 1.0 and random.random() >= self.rate:
+            return None
+        capture = Capture(action, self.mode, sys._getframe(1))
+        if capture.mode == CPROFILE:
+            with self._lock:
+                if capture.thread in self._cprofiled:
+                    return None  # another run on this loop is being profiled
+                self._cprofiled.add(capture.thread)
+            profile = cProfile.Profile()
+            capture.profiles.append(profile)
+            profile.enable()
+        else:
+            with self._wake:
+                self._active.append(capture)
+                self._ensure_sampler()
+                self._wake.notify()
+        capture.token = _current_capture.set(capture)
+        return capture
+
+    def finish(self, capture: Capture) -> None:
+        _current_capture.reset(capture.token)
+        if capture.mode == CPROFILE:
+            capture.profiles[0].disable()
+            with self._lock:
+                self._cprofiled.discard(capture.thread)
+        else:
+            with self._lock:
+                self._active.remove(capture)
+        try:
+            self._write(capture)
+        except Exception as e:
+            logger.error("could not write profile", extra={"action": capture.action, "error": str(e)})
+
+    def wrap_blocking(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Attribute a blocking call run on the DB executor to the profiled run that awaits it"""
+        capture = _current_capture.get()
+        if capture is None:
+            return func
+
+        @functools.wraps(func)
+        def call(*args: Any, **kwargs: Any) -> Any:
+            if capture.mode == CPROFILE:
+                profile = cProfile.Profile()
+                try:
+                    return profile.runcall(func, *args, **kwargs)
+                finally:
+                    with capture.lock:
+                        capture.profiles.append(profile)
+            thread = threading.get_ident()
+            with capture.lock:
+                capture.workers[thread] = sys._getframe()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with capture.lock:
+                    capture.workers.pop(thread, None)
+        return call
+
+    # sampling
+
+    def _ensure_sampler(self) -> None:
+        # Called with the lock held
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._run_sampler, name="profiler", daemon=True)
+            self._sampler.start()
+
+    def _run_sampler(self) -> None:
+        while True:
+            with self._wake:
+                while not self._active:
+                    self._wake.wait()
+                active = list(self._active)
+            frames = sys._current_frames()
+            for capture in active:
+                try:
+                    capture.sample(frames)
+                except Exception:
+                    logger.exception("profile sample failed")
+            del frames
+            time.sleep(self.interval)
+
+    # output
+
+    def _write(self, capture: Capture) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        pid = os.getpid()
+        with self._lock:
+            self.profiled += 1
+            write_run = self.files < self.max_files
+            if write_run:
+                self.files += 1
+            run_name = f"{capture.action}-{time.strftime('%Y%m%dT%H%M%S', time.localtime(capture.started))}" \
+                       f"-{pid}-{self.profiled}"
+        if capture.mode == CPROFILE:
+            stats = pstats.Stats(*capture.profiles)
+            if write_run:
+                stats.dump_stats(os.path.join(self.output_dir, run_name + ".prof"))
+            with self._lock:
+                total = self._stats.get(capture.action)
+                if total is None:
+                    total = self._stats[capture.action] = pstats.Stats(*capture.profiles)
+                else:
+                    total.add(*capture.profiles)
+                total.dump_stats(os.path.join(self.output_dir, f"{capture.action}.{pid}.prof"))
+            return
+        if write_run:
+            _write_folded(os.path.join(self.output_dir, run_name + ".folded"), capture.samples)
+        with self._lock:
+            total = self._folded.setdefault(capture.action, Counter())
+            total.update(capture.samples)
+            _write_folded(os.path.join(self.output_dir, f"{capture.action}.{pid}.folded"), total)
+
+
+def _write_folded(path: Text, samples: Counter) -> None:
+    """'frame;frame;frame count' lines, written atomically"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for stack, count in sorted(samples.items()):
+            f.write(f"{stack} {count}\n")
+    os.replace(tmp, path)
+
+
+PROFILER = Profiler(
+    output_dir=os.getenv('PROFILE_DIR', 'profiles'),
+    interval=float(os.getenv('PROFILE_INTERVAL', '0.005')),
+    max_files=int(os.getenv('PROFILE_MAX_FILES', '1000')),
+)
+if os.getenv('PROFILE_ACTIONS'):
+    PROFILER.configure(os.getenv('PROFILE_ACTIONS'), rate=float(os.getenv('PROFILE_RATE', '1')),
+                       mode=os.getenv('PROFILE_MODE', SAMPLE))
+
+
+def configure_from_query(query: Dict[Text, List[Text]]) -> Dict[Text, Any]:
+    """Apply ``actions``, ``rate``, ``mode`` and ``duration`` from an admin request's query string"""
+    def first(name: Text, default: Text = "") -> Text:
+        return (query.get(name) or [default])[0]
+
+    duration = first("duration")
+    PROFILER.configure(first("actions"), rate=float(first("rate", "1")), mode=first("mode", SAMPLE),
+                       duration=float(duration) if duration else None)
+    return PROFILER.status()
@@ -0,0 +1,133 @@
+"""Bot responses rendered in the action server, with es-CL formatting.
+
+Response texts are read from ``domain.yml`` once per process and split into
+literal and placeholder parts, so rendering a turn is a single join. Values
+are formatted by type: ``date`` as "viernes 8 de agosto" style Spanish text
+and ``Decimal`` amounts as Chilean pesos ("$1.234.567"); anything else is
+inserted with ``str``. Slots fill placeholders the action does not pass,
+as Rasa does, and an unknown placeholder is left as is.
+
+Responses with buttons, images, conditions or channel variants are not
+rendered here; :func:`utter` hands those to Rasa by name.
+"""
+
+import os
+import re
+import threading
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, Optional, Text, Tuple
+
+import yaml
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+DEFAULT_DOMAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "domain.yml")
+
+WEEKDAYS = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+MONTHS = ("enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+          "septiembre", "octubre", "noviembre", "diciembre")
+
+_PLACEHOLDER = re.compile(r"\{([^\n{}]+?)\}")
+_PESO = Decimal(1)
+
+
+def format_date(value: date, weekday: bool = False, year: bool = False) -> Text:
+    """'8 de agosto', 'viernes 8 de agosto', '8 de agosto de 2025'"""
+    text = f"{value.day} de {MONTHS[value.month - 1]}"
+    if weekday:
+        text = f"{WEEKDAYS[value.weekday()]} {text}"
+    if year:
+        text = f"{text} de {value.year}"
+    return text
+
+
+def format_currency(amount: Any) -> Text:
+    """Chilean pesos: no decimals, '.' for thousands ('$1.234.567', '-$500')"""
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount or 0))
+    pesos = int(amount.quantize(_PESO, rounding=ROUND_HALF_UP))
+    sign = "-" if pesos < 0 else ""
+    return f"{sign}${abs(pesos):,}".replace(",", ".")
+
+
+def _format_full_date(value: date) -> Text:
+    return format_date(value, year=True)
+
+
+# Exact type -> formatter; datetime is listed on its own since it subclasses date
+FORMATTERS = {date: _format_full_date, datetime: _format_full_date, Decimal: format_currency}
+
+
+def format_value(value: Any) -> Text:
+    formatter = FORMATTERS.get(type(value))
+    return formatter(value) if formatter is not None else str(value)
+
+
+class Template:
+    """A response text split at its placeholders: literals at even, names at odd indices"""
+
+    __slots__ = ("text", "parts")
+
+    def __init__(self, text: Text):
+        self.text = text
+        self.parts: Tuple[Text, ...] = tuple(_PLACEHOLDER.split(text))
+
+    def render(self, values: Dict[Text, Any], slots: Optional[Dict[Text, Any]] = None) -> Text:
+        if len(self.parts) == 1:
+            return self.text
+        parts = list(self.parts)
+        for index in range(1, len(parts), 2):
+            name = parts[index]
+            if name in values:
+                parts[index] = format_value(values[name])
+            elif slots is not None and name in slots:
+                parts[index] = format_value(slots[name])
+            else:
+                parts[index] = "{" + name + "}"
+        return "".join(parts)
+
+
+def load_templates(path: Text) -> Dict[Text, Template]:
+    """Text-only responses of a domain file; the first variation of each"""
+    with open(path, encoding="utf-8") as f:
+        responses = (yaml.safe_load(f) or {}).get("responses") or {}
+    templates = {}
+    for name, variations in responses.items():
+        if not isinstance(variations, list) or not variations or not isinstance(variations[0], dict):
+            continue
+        first = variations[0]
+        if set(first) == {"text"} and isinstance(first["text"], str):
+            templates[name] = Template(first["text"])
+    return templates
+
+
+_templates: Optional[Dict[Text, Template]] = None
+_templates_lock = threading.Lock()
+
+
+def get_templates() -> Dict[Text, Template]:
+    """Process-wide templates from DOMAIN_PATH / domain.yml"""
+    global _templates
+    if _templates is None:
+        with _templates_lock:
+            if _templates is None:
+                _templates = load_templates(os.getenv('DOMAIN_PATH', DEFAULT_DOMAIN_PATH))
+    return _templates
+
+
+def render(response: Text, tracker: Optional[Tracker] = None, **values: Any) -> Optional[Text]:
+    """Text of ``response`` filled from ``values`` and the tracker's slots; None if not renderable here"""
+    template = get_templates().get(response)
+    if template is None:
+        return None
+    return template.render(values, tracker.slots if tracker is not None else None)
+
+
+def utter(dispatcher: CollectingDispatcher, tracker: Tracker, response: Text, **values: Any) -> None:
+    """Send ``response`` as rendered text, or by name when Rasa has to render it"""
+    text = render(response, tracker, **values)
+    if text is None:
+        dispatcher.utter_message(response=response, **{name: format_value(value) for name, value in values.items()})
+    else:
+        dispatcher.utter_message(text=text)
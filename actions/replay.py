@@ -0,0 +1,251 @@
+"""Recording of action turns in ``interactions`` and their offline replay.
+
+Actions whose ``run`` is wrapped with :func:`recorded` log one ``action_run``
+interaction per run holding, as JSON, what the action saw (message text,
+intent, entities, slots), the day it ran, what it returned (events and
+responses) and how long it took. :func:`replay_turn` runs the current code
+of the same action on a tracker rebuilt from that input, with relative
+dates resolved against the recorded day, and :func:`diff_turn` lists how
+the new output differs from the recorded one.
+
+Recording is opt-in (INTERACTION_LOG_TURNS=true) and sampled by
+conversation (INTERACTION_LOG_TURNS_SAMPLE), since it adds a row per action
+run to ``interactions``. Slots listed in INTERACTION_LOG_TURNS_REDACT
+(default ``client_name``) are left out of the stored JSON: their entities'
+values are dropped, their spans in the message text and their values in
+responses are replaced by ``[<slot>]``, and their SlotSet values by None.
+Replayed output is redacted the same way before it is compared.
+"""
+
+import functools
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import date
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Text, Tuple
+
+from rasa_sdk import Action, Tracker
+
+from actions.date_parser import reference_date
+from actions.interaction_logger import get_interaction_logger
+from actions.offline import make_tracker, run_action_async
+
+logger = logging.getLogger(__name__)
+
+TURN_TYPE = "action_run"
+FORMAT_VERSION = 1
+MAX_TURN_BYTES = 60000  # stays within a MySQL TEXT column
+
+# Message fields that identify a response; other keys (buttons, custom...) are compared when present
+_MESSAGE_KEYS = ("response", "text", "template", "buttons", "image", "attachment", "custom")
+
+
+def _enabled() -> bool:
+    return os.getenv('INTERACTION_LOG_TURNS', 'false').strip().lower() in ("1", "true", "yes", "on")
+
+
+def _sampled(sender_id: Text) -> bool:
+    """Whether this conversation's turns are recorded; the same answer for every turn of it"""
+    rate = float(os.getenv('INTERACTION_LOG_TURNS_SAMPLE', '1'))
+    if rate >= 1:
+        return True
+    return zlib.crc32((sender_id or "").encode("utf-8")) % 10000 < rate * 10000
+
+
+def redacted_slots() -> frozenset:
+    value = os.getenv('INTERACTION_LOG_TURNS_REDACT', 'client_name')
+    return frozenset(name.strip() for name in value.split(",") if name.strip())
+
+
+def _mask(text: Text, values: Dict[Text, Text]) -> Text:
+    for value, name in values.items():
+        text = text.replace(value, f"[{name}]")
+    return text
+
+
+def redact(payload: Dict[Text, Any], slots: frozenset) -> Dict[Text, Any]:
+    """The turn payload without the values of ``slots`` (see the module docstring)"""
+    if not slots:
+        return payload
+    values: Dict[Text, Text] = {}  # PII value -> slot name, for masking free text
+    for name in slots:
+        value = (payload.get("slots") or {}).get(name)
+        if isinstance(value, str) and value:
+            values[value] = name
+    text = payload.get("text") or ""
+    entities = []
+    for entity in sorted(payload.get("entities") or [], key=lambda e: e.get("start") or 0, reverse=True):
+        if entity.get("entity") not in slots:
+            entities.append(entity)
+            continue
+        if isinstance(entity.get("value"), str) and entity["value"]:
+            values[entity["value"]] = entity["entity"]
+        start, end = entity.get("start"), entity.get("end")
+        if isinstance(start, int) and isinstance(end, int):
+            text = text[:start] + f"[{entity['entity']}]" + text[end:]
+        entities.append({k: v for k, v in entity.items() if k not in ("value", "start", "end")})
+    events = []
+    for event in payload.get("events") or []:
+        if event.get("event") == "slot" and event.get("name") in slots:
+            event = {**event, "value": None}
+        events.append(event)
+    messages = [{k: _mask(v, values) if isinstance(v, str) else v for k, v in message.items()}
+                for message in payload.get("messages") or []]
+    return {
+        **payload,
+        "text": _mask(text, values),
+        "entities": list(reversed(entities)),
+        "slots": {k: v for k, v in (payload.get("slots") or {}).items() if k not in slots},
+        "events": events,
+        "messages": messages,
+    }
+
+
+def _clean_events(events: Sequence[Dict[Text, Any]]) -> List[Dict[Text, Any]]:
+    return [{k: v for k, v in event.items() if k != "timestamp"} for event in events or []]
+
+
+def _clean_messages(messages: Sequence[Dict[Text, Any]]) -> List[Dict[Text, Any]]:
+    cleaned = []
+    for message in messages or []:
+        item = {k: v for k, v in message.items() if v not in (None, [], {}, "")}
+        cleaned.append(item)
+    return cleaned
+
+
+def turn_payload(action: Text, tracker: Tracker, events: Sequence[Dict[Text, Any]],
+                 messages: Sequence[Dict[Text, Any]], elapsed: float, day: Optional[date] = None) -> Dict[Text, Any]:
+    latest = tracker.latest_message or {}
+    payload = {
+        "v": FORMAT_VERSION,
+        "action": action,
+        "day": (day or date.today()).isoformat(),
+        "message_id": latest.get("message_id"),
+        "text": latest.get("text") or "",
+        "intent": (latest.get("intent") or {}).get("name"),
+        "entities": [{k: e.get(k) for k in ("entity", "value", "start", "end") if k in e}
+                     for e in latest.get("entities") or []],
+        "slots": tracker.current_slot_values(),
+        "events": _clean_events(events),
+        "messages": _clean_messages(messages),
+        "ms": round(elapsed * 1000, 3),
+    }
+    return redact(payload, redacted_slots())
+
+
+def record_turn(action: Text, tracker: Tracker, events: Sequence[Dict[Text, Any]],
+                messages: Sequence[Dict[Text, Any]], elapsed: float) -> None:
+    """Queue one ``action_run`` interaction (skipped when too large for the column)"""
+    data = json.dumps(turn_payload(action, tracker, events, messages, elapsed), ensure_ascii=False, default=str)
+    if len(data.encode("utf-8")) > MAX_TURN_BYTES:
+        logger.warning("turn too large to record", extra={"action": action, "bytes": len(data)})
+        return
+    get_interaction_logger().log(tracker.sender_id, TURN_TYPE, data)
+
+
+def recorded(run: Callable) -> Callable:
+    """Decorator for async Action.run logging the turn for later replay (INTERACTION_LOG_TURNS)"""
+    @functools.wraps(run)
+    async def wrapper(self, dispatcher, tracker, domain, *args, **kwargs):
+        if not _enabled() or not _sampled(tracker.sender_id):
+            return await run(self, dispatcher, tracker, domain, *args, **kwargs)
+        already_sent = len(dispatcher.messages)
+        started = time.perf_counter()
+        events = await run(self, dispatcher, tracker, domain, *args, **kwargs)
+        elapsed = time.perf_counter() - started
+        try:
+            record_turn(self.name(), tracker, events, dispatcher.messages[already_sent:], elapsed)
+        except Exception as e:
+            logger.warning("could not record turn", extra={"action": self.name(), "error": str(e)})
+        return events
+    return wrapper
+
+
+class Turn(NamedTuple):
+    id: int
+    session_id: Text
+    action: Text
+    day: date
+    message_id: Optional[Text]
+    text: Text
+    intent: Optional[Text]
+    entities: List[Dict[Text, Any]]
+    slots: Dict[Text, Any]
+    events: List[Dict[Text, Any]]
+    messages: List[Dict[Text, Any]]
+    ms: float
+
+
+def parse_turn(row_id: int, session_id: Text, data: Optional[Text]) -> Optional[Turn]:
+    """The recorded turn in an ``action_run`` row, or ``None`` if it cannot be read"""
+    try:
+        payload = json.loads(data or "")
+        if payload.get("v") != FORMAT_VERSION:
+            return None
+        return Turn(
+            row_id, session_id, payload["action"], date.fromisoformat(payload["day"]),
+            payload.get("message_id"), payload.get("text") or "", payload.get("intent"),
+            payload.get("entities") or [], payload.get("slots") or {},
+            payload.get("events") or [], payload.get("messages") or [], float(payload.get("ms") or 0.0),
+        )
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+async def replay_turn(action: Action, turn: Turn,
+                      domain: Optional[Dict[Text, Any]] = None) -> Tuple[List[Dict[Text, Any]], List[Dict[Text, Any]], float]:
+    """Run ``action`` on the recorded input; returns (events, messages, seconds)"""
+    tracker = make_tracker(turn.text, turn.slots, sender_id=turn.session_id, intent=turn.intent,
+                           entities=turn.entities, message_id=turn.message_id)
+    with reference_date(turn.day):
+        started = time.perf_counter()
+        events, messages = await run_action_async(action, tracker, domain)
+        elapsed = time.perf_counter() - started
+    output = redact({"events": _clean_events(events), "messages": _clean_messages(messages),
+                     "slots": turn.slots}, redacted_slots())
+    return output["events"], output["messages"], elapsed
+
+
+def _comparable(value: Any) -> Any:
+    # Round-trip through JSON so replayed values compare like the recorded ones
+    return json.loads(json.dumps(value, default=str))
+
+
+def diff_turn(turn: Turn, events: Sequence[Dict[Text, Any]], messages: Sequence[Dict[Text, Any]],
+              ignore_slots: Sequence[Text] = ()) -> List[Text]:
+    """Human-readable differences between the recorded and the replayed output"""
+    diffs: List[Text] = []
+
+    def slot_sets(items: Sequence[Dict[Text, Any]]) -> Dict[Text, Any]:
+        return {e.get("name"): e.get("value") for e in items
+                if e.get("event") == "slot" and e.get("name") not in ignore_slots}
+
+    before, after = slot_sets(turn.events), slot_sets(_comparable(list(events)))
+    for name in sorted(set(before) | set(after)):
+        if name not in after:
+            diffs.append(f"slot {name} no longer set (was {before[name]!r})")
+        elif name not in before:
+            diffs.append(f"slot {name} newly set to {after[name]!r}")
+        elif before[name] != after[name]:
+            diffs.append(f"slot {name}: {before[name]!r} -> {after[name]!r}")
+
+    other_before = [e.get("event") for e in turn.events if e.get("event") != "slot"]
+    other_after = [e.get("event") for e in _comparable(list(events)) if e.get("event") != "slot"]
+    if other_before != other_after:
+        diffs.append(f"events: {other_before} -> {other_after}")
+
+    recorded_messages, replayed_messages = turn.messages, _comparable(list(messages))
+    if len(recorded_messages) != len(replayed_messages):
+        diffs.append(f"responses: {len(recorded_messages)} -> {len(replayed_messages)}")
+    for index, (old, new) in enumerate(zip(recorded_messages, replayed_messages)):
+        for key in _MESSAGE_KEYS:
+            if old.get(key) != new.get(key):
+                diffs.append(f"response {index} {key}: {old.get(key)!r} -> {new.get(key)!r}")
+        old_args = {k: v for k, v in old.items() if k not in _MESSAGE_KEYS}
+        new_args = {k: v for k, v in new.items() if k not in _MESSAGE_KEYS}
+        if old_args != new_args:
+            changed = sorted(k for k in set(old_args) | set(new_args) if old_args.get(k) != new_args.get(k))
+            diffs.append(f"response {index} arguments changed: {', '.join(changed)}")
+    return diffs
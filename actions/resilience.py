@@ -0,0 +1,227 @@
+"""Latency budgets and a circuit breaker for the actions' DB calls.
+
+Each action has a budget (ACTION_DB_BUDGET seconds, per-action overrides in
+ACTION_DB_BUDGETS, e.g. "action_get_pending_invoices_info=0.8") measured
+from the start of its run; :func:`call_db` gives a blocking DB call whatever
+is left of it and raises :class:`DatabaseUnavailable` when it runs out, so
+the action answers with a fallback instead of waiting on a slow database.
+
+Writes (:func:`call_db_write`) are not abandoned when the budget runs out,
+since the thread would go on and might commit after the action reported
+the update as skipped; the budget is passed to the database instead (see
+``storage.write_deadline``), which aborts and rolls them back.
+
+Failures, timeouts and calls slower than DB_BREAKER_SLOW_CALL count
+against the shared breaker; after DB_BREAKER_FAILURES of them in a row it
+opens and calls fail immediately for DB_BREAKER_RESET seconds. Then one
+probe call is let through (half-open): success closes the breaker, failure
+opens it again.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Text
+
+from actions.async_db import run_blocking
+from actions.instrumentation import REGISTRY, current_action
+from actions.storage import WriteTimeout, write_deadline
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_TRANSITIONS = REGISTRY.counter("db_breaker_transitions_total", "Circuit breaker state changes, by state")
+BREAKER_REJECTIONS = REGISTRY.counter("db_breaker_rejections_total", "DB calls refused while the breaker was open")
+DB_CALL_FAILURES = REGISTRY.counter("db_call_failures_total", "Budgeted DB calls that failed, by action and reason")
+
+
+class DatabaseUnavailable(Exception):
+    """The DB call was not made or did not finish within the action's budget"""
+
+
+class CircuitOpenError(DatabaseUnavailable):
+    pass
+
+
+class DeadlineExceeded(DatabaseUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    def __init__(self, name: Text, failure_threshold: int = 5, slow_call: float = 1.0, reset_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> Text:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; in half-open only one probe at a time"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._transition(HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self, elapsed: float) -> None:
+        if self.slow_call and elapsed > self.slow_call:
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def release(self) -> None:
+        """Give back a probe slot whose call was cancelled without a result"""
+        with self._lock:
+            self._probing = False
+
+    def _transition(self, state: Text) -> None:
+        # Called with the lock held
+        self._state = state
+        BREAKER_TRANSITIONS.inc(breaker=self.name, state=state)
+        log = logger.warning if state == OPEN else logger.info
+        log("circuit breaker state changed", extra={"breaker": self.name, "state": state,
+                                                     "failures": self._failures})
+
+    def stats(self) -> Dict[Text, Any]:
+        with self._lock:
+            return {"state": self._state, "consecutive_failures": self._failures}
+
+
+def parse_budgets(value: Text) -> Dict[Text, float]:
+    """'action_a=0.8,action_b=2' -> {'action_a': 0.8, 'action_b': 2.0}"""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, _, seconds = item.partition("=")
+        if not re.fullmatch(r"\d+(\.\d*)?", seconds.strip()):
+            raise ValueError(f"Invalid ACTION_DB_BUDGETS entry {item!r}; expected action=seconds")
+        budgets[name.strip()] = float(seconds)
+    return budgets
+
+
+DEFAULT_BUDGET = float(os.getenv('ACTION_DB_BUDGET', '1.5'))
+ACTION_BUDGETS = parse_budgets(os.getenv('ACTION_DB_BUDGETS', ''))
+
+db_breaker = CircuitBreaker(
+    "db",
+    failure_threshold=int(os.getenv('DB_BREAKER_FAILURES', '5')),
+    slow_call=float(os.getenv('DB_BREAKER_SLOW_CALL', '1.0')),
+    reset_timeout=float(os.getenv('DB_BREAKER_RESET', '10')),
+)
+
+REGISTRY.add_collector(lambda: {"db_breaker_state": _STATE_VALUES[db_breaker.state]})
+
+
+def remaining_budget() -> float:
+    """Seconds left of the running action's budget (the default budget outside actions)"""
+    stats = current_action()
+    if stats is None:
+        return DEFAULT_BUDGET
+    budget = ACTION_BUDGETS.get(stats.action, DEFAULT_BUDGET)
+    return budget - (time.perf_counter() - stats.started)
+
+
+async def guarded(call: Callable[[], Awaitable[Any]], breaker: Optional[CircuitBreaker] = None,
+                  wait: bool = True) -> Any:
+    """Await ``call()`` through the breaker and within the remaining budget.
+
+    With ``wait=False`` the call is awaited to the end; it must enforce the
+    budget itself and raise :class:`WriteTimeout` when it runs out.
+    """
+    breaker = breaker or db_breaker
+    stats = current_action()
+    action = stats.action if stats is not None else "-"
+    if not breaker.allow():
+        BREAKER_REJECTIONS.inc(breaker=breaker.name, action=action)
+        raise CircuitOpenError(f"{breaker.name} circuit open")
+    budget = remaining_budget()
+    if budget <= 0:
+        breaker.release()
+        DB_CALL_FAILURES.inc(action=action, reason="no_budget")
+        raise DeadlineExceeded("action budget already spent")
+
+    started = time.monotonic()
+    try:
+        result = await (asyncio.wait_for(call(), budget) if wait else call())
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        DB_CALL_FAILURES.inc(action=action, reason="timeout")
+        raise DeadlineExceeded(f"DB call exceeded the {budget:.3f}s left of the budget") from None
+    except WriteTimeout as e:
+        breaker.record_failure()
+        DB_CALL_FAILURES.inc(action=action, reason="timeout")
+        raise DeadlineExceeded(f"write exceeded the {budget:.3f}s left of the budget, rolled back ({e})") from None
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record_failure()
+        DB_CALL_FAILURES.inc(action=action, reason="error")
+        raise
+    breaker.record_success(time.monotonic() - started)
+    return result
+
+
+async def within_budget(awaitable: Awaitable[Any]) -> Any:
+    """Await something already running (e.g. a prefetch) for at most the remaining budget"""
+    try:
+        return await asyncio.wait_for(awaitable, max(remaining_budget(), 0.0))
+    except asyncio.TimeoutError:
+        stats = current_action()
+        DB_CALL_FAILURES.inc(action=stats.action if stats is not None else "-", reason="timeout")
+        raise DeadlineExceeded("waited the whole budget") from None
+
+
+async def call_db(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """``run_blocking(func, ...)`` guarded by the breaker and the action's budget"""
+    return await guarded(lambda: run_blocking(func, *args, **kwargs))
+
+
+async def call_db_write(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Like :func:`call_db` for writes: the database aborts them when the budget runs out.
+
+    So when it raises :class:`DatabaseUnavailable` nothing was written, and
+    when it returns the write was committed.
+    """
+    deadline = time.monotonic() + remaining_budget()
+
+    def write() -> Any:
+        with write_deadline(deadline):
+            return func(*args, **kwargs)
+
+    return await guarded(lambda: run_blocking(write), wait=False)
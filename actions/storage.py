@@ -0,0 +1,830 @@
+"""Storage layer for customers, invoices and interactions.
+
+Actions never build SQL themselves; they call a :class:`Storage` backend.
+``DB_BACKEND`` selects the implementation:
+
+- ``mysql`` (default): MariaDB/MySQL through the shared pool in ``actions.db_pool``
+- ``sqlite``: an embedded database file at ``SQLITE_PATH``, created and seeded
+  with the demo customer on first use, so the action server, benchmarks and
+  load tests can run on a single node without external services.
+
+Both backends share the same queries (the SQLite cursor accepts ``%s``
+placeholders); only DDL and dialect-specific statements differ.
+
+Read-only queries that tolerate slightly stale data use
+``cursor(read_only=True)`` and go to a replica when DB_REPLICAS (MySQL
+hosts) or SQLITE_REPLICAS (stand-in files) are configured; see
+``actions.db_router``.
+"""
+
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Text, Tuple
+
+from actions.db_pool import ConnectionPool, create_mysql_pool, get_pool
+from actions.db_router import (DB_READS, ReadRouter, Replica, current_session, mysql_replica_lag, no_replica_lag,
+                               parse_replicas)
+
+InvoiceSummary = Tuple[int, Optional[float]]
+InteractionRow = Tuple[Text, Text, Optional[Text], Any]  # session_id, type, data, timestamp
+InteractionGroup = Tuple[date, Text, int, int]  # day, interaction_type, events, distinct sessions
+
+CUSTOMER_COLUMNS = ("id", "name", "email", "phone")
+INVOICE_COLUMNS = ("invoice_number", "customer_id", "amount", "issue_date", "due_date", "status")
+# On re-import billing owns these; payment_date belongs to the bot, and so does status
+# once the bot moved it, unless billing reports the invoice paid (see upsert_invoices)
+CUSTOMER_UPDATE_COLUMNS = ("name", "email", "phone")
+INVOICE_UPDATE_COLUMNS = ("customer_id", "amount", "issue_date", "due_date")
+
+
+def is_integrity_error(error: Exception) -> bool:
+    """Duplicate key / constraint violations, for both mysql.connector and sqlite3"""
+    return any(cls.__name__ == "IntegrityError" for cls in type(error).__mro__)
+
+
+class SchemaError(Exception):
+    """The database schema is missing or older than the code expects"""
+
+
+class WriteTimeout(Exception):
+    """A write ran past its deadline and was rolled back"""
+
+
+# MariaDB max_statement_time exceeded, InnoDB lock wait timeout
+_TIMEOUT_ERRNOS = (1969, 1205)
+
+_write_deadline: "contextvars.ContextVar[Optional[float]]" = contextvars.ContextVar("db_write_deadline",
+                                                                                   default=None)
+
+
+@contextmanager
+def write_deadline(deadline: Optional[float]) -> Iterator[None]:
+    """Bound the writes made inside the block to ``deadline`` (``time.monotonic()``).
+
+    Each statement of a write transaction gets the time left as a server-side
+    timeout (where the backend has one) and none is started after the
+    deadline, so a write that runs out of time raises :class:`WriteTimeout`
+    and is rolled back instead of committing after the caller gave up on it.
+    """
+    token = _write_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _write_deadline.reset(token)
+
+
+def like_prefix(prefix: Text) -> Text:
+    """LIKE pattern (with ``ESCAPE '!'``) matching strings that start with ``prefix`` literally"""
+    return prefix.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%"
+
+
+class Storage:
+    """Queries shared by every backend; subclasses provide the pool and DDL"""
+
+    name = "base"
+    schema_version = 0  # newest migration (migrations/) whose tables and columns the queries here use
+    max_params = 60000  # bind parameters per statement
+    lock_clause = ""  # appended to SELECTs whose rows are about to be updated
+    insert_ignore = "INSERT IGNORE"  # INSERT that skips rows whose key already exists
+
+    def statement_timeout(self, seconds: float) -> Text:
+        """Prefix bounding one statement to ``seconds`` on the server ('' if the backend cannot)"""
+        return ""
+
+    def __init__(self, pool: ConnectionPool, router: Optional[ReadRouter] = None):
+        self.pool = pool
+        self.router = router
+
+    @contextmanager
+    def cursor(self, commit: bool = False, read_only: bool = False) -> Iterator[Any]:
+        """Borrow a pooled connection and yield a cursor; commit on success if asked.
+
+        ``read_only`` queries may be served by a replica chosen by the router.
+        """
+        replica = self.router.choose(current_session()) if read_only and self.router is not None else None
+        if replica is None:
+            connection = self.pool.connect()
+        else:
+            try:
+                connection = replica.pool.connect()
+            except Exception as e:
+                self.router.mark_down(replica, e)
+                DB_READS.inc(target="primary", reason="replica_error")
+                replica = None
+                connection = self.pool.connect()
+        started = time.perf_counter()
+        try:
+            cursor = connection.cursor()
+            try:
+                yield cursor
+                if commit:
+                    connection.commit()
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+            if replica is not None:
+                replica.observe(time.perf_counter() - started)
+
+    # customers
+
+    def find_customer_id(self, name: Text) -> Optional[int]:
+        with self.cursor(read_only=True) as cursor:
+            cursor.execute("SELECT id FROM customers WHERE name = %s LIMIT 1", (name,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    # invoices
+
+    def pending_invoice_summary(self, customer_id: int) -> InvoiceSummary:
+        """(invoice_count, total_amount) of unpaid, unscheduled invoices"""
+        with self.cursor(read_only=True) as cursor:
+            cursor.execute(
+                """
+                SELECT COUNT(*) as invoice_count, SUM(amount) as total_amount
+                FROM invoices
+                WHERE customer_id = %s AND status = 'pending' AND payment_date IS NULL
+                """,
+                (customer_id,),
+            )
+            return tuple(cursor.fetchone())
+
+    def pending_invoice_dates(self, customer_id: int) -> Optional[Tuple[date, date]]:
+        """(issue_date, due_date) of the pending invoice that falls due first"""
+        with self.cursor(read_only=True) as cursor:
+            cursor.execute(
+                """
+                SELECT issue_date, due_date FROM invoices
+                WHERE customer_id = %s AND status = 'pending' AND payment_date IS NULL
+                ORDER BY due_date, id LIMIT 1
+                """,
+                (customer_id,),
+            )
+            row = cursor.fetchone()
+        return (_as_date(row[0]), _as_date(row[1])) if row else None
+
+    def transition_invoices(
+        self,
+        customer_id: int,
+        from_statuses: Sequence[Text],
+        to_status: Text,
+        idempotency_key: Text,
+        payment_date: Optional[Text] = None,
+        session_id: Optional[Text] = None,
+    ) -> Tuple[bool, List[int]]:
+        """Move the customer's invoices in ``from_statuses`` to ``to_status``.
+
+        Pending invoices that already carry a payment date are left alone,
+        as in the pending summary; other statuses move regardless of it.
+
+        One short transaction: lock the matching rows (in id order, so
+        concurrent turns for the same customer queue instead of deadlocking),
+        update them, write one audit row per invoice and record
+        ``idempotency_key``. If the key was already recorded the whole
+        transaction is rolled back and the original invoice ids are returned
+        with ``applied=False``.
+
+        The session's reads stay on the primary for the read-your-writes window.
+        Inside :func:`write_deadline` it raises :class:`WriteTimeout`, with
+        nothing written, if the deadline passes before the commit.
+        """
+        if self.router is not None:
+            self.router.note_write(session_id)
+        deadline = _write_deadline.get()
+        connection = self.pool.connect()
+        try:
+            cursor = connection.cursor()
+
+            def execute(sql: Text, params: Sequence[Any]) -> None:
+                if deadline is not None:
+                    sql = self._bounded(sql, deadline)
+                cursor.execute(sql, params)
+
+            try:
+                self._begin_write(cursor)
+                status_placeholders = ", ".join(["%s"] * len(from_statuses))
+                execute(
+                    f"SELECT id, status FROM invoices WHERE customer_id = %s AND status IN ({status_placeholders}) "
+                    f"AND (status <> 'pending' OR payment_date IS NULL) ORDER BY id{self.lock_clause}",
+                    (customer_id, *from_statuses),
+                )
+                rows = cursor.fetchall()
+                invoice_ids = [row[0] for row in rows]
+                if invoice_ids:
+                    id_placeholders = ", ".join(["%s"] * len(invoice_ids))
+                    if payment_date is not None:
+                        execute(
+                            f"UPDATE invoices SET status = %s, payment_date = %s WHERE id IN ({id_placeholders})",
+                            (to_status, payment_date, *invoice_ids),
+                        )
+                    else:
+                        execute(
+                            f"UPDATE invoices SET status = %s WHERE id IN ({id_placeholders})",
+                            (to_status, *invoice_ids),
+                        )
+                    audit_placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+                    execute(
+                        "INSERT INTO invoice_audit (invoice_id, customer_id, from_status, to_status, "
+                        f"payment_date, idempotency_key, session_id) VALUES {audit_placeholders}",
+                        [value for invoice_id, from_status in rows
+                         for value in (invoice_id, customer_id, from_status, to_status,
+                                       payment_date, idempotency_key, session_id)],
+                    )
+                try:
+                    execute(
+                        "INSERT INTO invoice_transitions (idempotency_key, customer_id, to_status, invoice_ids) "
+                        "VALUES (%s, %s, %s, %s)",
+                        (idempotency_key, customer_id, to_status, ",".join(map(str, invoice_ids))),
+                    )
+                except Exception as e:
+                    if not is_integrity_error(e):
+                        raise
+                    # Already applied by an earlier attempt of this turn
+                    connection.rollback()
+                    cursor.execute(
+                        "SELECT invoice_ids FROM invoice_transitions WHERE idempotency_key = %s",
+                        (idempotency_key,),
+                    )
+                    row = cursor.fetchone()
+                    return False, [int(i) for i in (row[0] or "").split(",") if i] if row else []
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise WriteTimeout("write deadline passed before commit")
+                connection.commit()
+                return True, invoice_ids
+            except Exception as e:
+                if getattr(e, "errno", None) in _TIMEOUT_ERRNOS:
+                    raise WriteTimeout(str(e)) from e
+                raise
+            finally:
+                cursor.close()
+        finally:
+            connection.close()  # rolls back an unfinished transaction
+
+    def _bounded(self, sql: Text, deadline: float) -> Text:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise WriteTimeout("write deadline passed")
+        return self.statement_timeout(left) + sql
+
+    def _begin_write(self, cursor: Any) -> None:
+        """Start the transaction of a read-modify-write (dialect specific)"""
+
+    # campaigns
+
+    def pending_customers(self, after_id: int = 0, limit: int = 500, shard: int = 0,
+                          shards: int = 1) -> List[Tuple[int, Text, int, Any]]:
+        """One page of (customer_id, name, invoice_count, total) with pending invoices, by id"""
+        with self.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.id, c.name, COUNT(*), SUM(i.amount)
+                FROM customers c
+                JOIN invoices i ON i.customer_id = c.id
+                WHERE c.id > %s AND c.id %% %s = %s
+                AND i.status = 'pending' AND i.payment_date IS NULL
+                GROUP BY c.id, c.name
+                ORDER BY c.id
+                LIMIT %s
+                """,
+                (after_id, shards, shard, limit),
+            )
+            return cursor.fetchall()
+
+    def interactions_page(self, session_prefix: Text, after_id: int = 0, limit: int = 5000,
+                          interaction_type: Optional[Text] = None) -> List[Tuple[int, Text, Text, Optional[Text]]]:
+        """One page of (id, session_id, interaction_type, data) for sessions starting with the prefix"""
+        query = ("SELECT id, session_id, interaction_type, data FROM interactions "
+                 "WHERE session_id LIKE %s ESCAPE '!' AND id > %s")
+        params: List[Any] = [like_prefix(session_prefix), after_id]
+        if interaction_type is not None:
+            query += " AND interaction_type = %s"
+            params.append(interaction_type)
+        with self.cursor(read_only=True) as cursor:
+            cursor.execute(query + " ORDER BY id LIMIT %s", (*params, limit))
+            return cursor.fetchall()
+
+    def iter_session_interactions(self, session_prefix: Text, interaction_types: Sequence[Text],
+                                  batch_size: int = 5000) -> Iterator[List[Tuple[Text, Text, Optional[Text], Any]]]:
+        """Batches of (session_id, interaction_type, data, timestamp) for sessions starting with the
+        prefix, ordered by session so each conversation arrives contiguously; one streamed query"""
+        with self.cursor(read_only=True) as cursor:
+            cursor.execute(
+                "SELECT session_id, interaction_type, data, timestamp FROM interactions "
+                f"WHERE session_id LIKE %s ESCAPE '!' "
+                f"AND interaction_type IN ({', '.join(['%s'] * len(interaction_types))}) "
+                "ORDER BY session_id, timestamp, id",
+                (like_prefix(session_prefix), *interaction_types),
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+
+    def customer_invoice_totals(self, customer_ids: Sequence[int]) -> Dict[int, Dict[Text, Any]]:
+        """customer_id -> {"name", <status>: (invoice_count, amount)} for the given customers"""
+        if not customer_ids:
+            return {}
+        with self.cursor(read_only=True) as cursor:
+            cursor.execute(
+                "SELECT c.id, c.name, i.status, COUNT(i.id), SUM(i.amount) FROM customers c "
+                "LEFT JOIN invoices i ON i.customer_id = c.id "
+                f"WHERE c.id IN ({', '.join(['%s'] * len(customer_ids))}) GROUP BY c.id, c.name, i.status",
+                list(customer_ids),
+            )
+            totals: Dict[int, Dict[Text, Any]] = {}
+            for customer_id, name, status, count, amount in cursor.fetchall():
+                entry = totals.setdefault(customer_id, {"name": name})
+                if status is not None:
+                    entry[status] = (int(count), amount)
+            return totals
+
+    # interactions
+
+    def check_schema(self) -> None:
+        """Raise SchemaError if the database lacks the tables/columns these queries use.
+
+        The schema is owned by ``migrate.py``; nothing here creates tables at runtime.
+        """
+        with self.cursor() as cursor:
+            try:
+                cursor.execute("SELECT id, session_id, customer_id, interaction_type, data, timestamp "
+                               "FROM interactions WHERE 1 = 0")
+                cursor.fetchall()
+            except Exception as e:
+                raise SchemaError(f"interactions table missing or outdated ({e}); run `python migrate.py up`") from e
+
+    def insert_interactions(self, rows: Sequence[InteractionRow]) -> None:
+        """Insert many interactions with one multi-row INSERT"""
+        if not rows:
+            return
+        placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+        params = [value for row in rows for value in row]
+        with self.cursor(commit=True) as cursor:
+            cursor.execute(
+                "INSERT INTO interactions (session_id, interaction_type, data, timestamp) "
+                f"VALUES {placeholders}",
+                params,
+            )
+
+    # retention
+
+    def interaction_groups(self, before: date, interaction_types: Optional[Sequence[Text]] = None,
+                           exclude_types: Sequence[Text] = ()) -> List[InteractionGroup]:
+        """(day, type, events, sessions) of raw interactions older than ``before``"""
+        query = ("SELECT DATE(timestamp), interaction_type, COUNT(*), COUNT(DISTINCT session_id) "
+                 "FROM interactions WHERE timestamp < %s AND interaction_type IS NOT NULL")
+        params: List[Any] = [before]
+        if interaction_types is not None:
+            query += f" AND interaction_type IN ({', '.join(['%s'] * len(interaction_types))})"
+            params.extend(interaction_types)
+        if exclude_types:
+            query += f" AND interaction_type NOT IN ({', '.join(['%s'] * len(exclude_types))})"
+            params.extend(exclude_types)
+        with self.cursor() as cursor:
+            cursor.execute(query + " GROUP BY DATE(timestamp), interaction_type ORDER BY 1, 2", params)
+            return [(_as_date(day), kind, int(events), int(sessions))
+                    for day, kind, events, sessions in cursor.fetchall()]
+
+    def add_interaction_rollups(self, groups: Sequence[InteractionGroup]) -> int:
+        """Store daily aggregates; a day and type already rolled up keeps its first totals"""
+        if not groups:
+            return 0
+        with self.cursor(commit=True) as cursor:
+            cursor.execute(
+                f"{self.insert_ignore} INTO interaction_daily (day, interaction_type, events, sessions) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(groups))}",
+                [value for group in groups for value in group],
+            )
+            return cursor.rowcount
+
+    def iter_interactions_of_day(self, day: date, interaction_type: Text,
+                                 batch_size: int = 5000) -> Iterator[List[Tuple]]:
+        """Batches of (id, session_id, customer_id, interaction_type, data, timestamp) of that day
+        and type, streamed from a single query"""
+        with self.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, session_id, customer_id, interaction_type, data, timestamp FROM interactions "
+                "WHERE timestamp >= %s AND timestamp < %s AND interaction_type = %s ORDER BY timestamp, id",
+                (day, day + timedelta(days=1), interaction_type),
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+
+    def delete_interactions_of_day(self, day: date, interaction_type: Text, limit: int = 5000) -> int:
+        """Delete up to ``limit`` rows of that day and type in one short transaction"""
+        with self.cursor(commit=True) as cursor:
+            cursor.execute(
+                "SELECT id FROM interactions WHERE timestamp >= %s AND timestamp < %s "
+                "AND interaction_type = %s LIMIT %s",
+                (day, day + timedelta(days=1), interaction_type, limit),
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if ids:
+                cursor.execute(f"DELETE FROM interactions WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+            return len(ids)
+
+    def delete_rollups_before(self, day: date) -> int:
+        with self.cursor(commit=True) as cursor:
+            cursor.execute("DELETE FROM interaction_daily WHERE day < %s", (day,))
+            return cursor.rowcount
+
+    def interaction_extent(self) -> Dict[Text, Any]:
+        """Oldest/newest raw interaction and rolled-up day"""
+        with self.cursor(read_only=True) as cursor:
+            cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM interactions")
+            oldest, newest = cursor.fetchone()
+            cursor.execute("SELECT MIN(day), MAX(day), COUNT(*) FROM interaction_daily")
+            first_day, last_day, rollups = cursor.fetchone()
+        return {"oldest": oldest, "newest": newest, "rollup_first_day": first_day,
+                "rollup_last_day": last_day, "rollup_rows": rollups}
+
+    def interaction_partitions(self) -> List[Tuple[Text, Optional[date]]]:
+        """(name, exclusive upper bound) of the monthly partitions; empty when not partitioned"""
+        return []
+
+    def add_interaction_partitions(self, through: date) -> List[Text]:
+        """Create monthly partitions so that ``through`` has its own; returns the new names"""
+        return []
+
+    def drop_interaction_partitions(self, before: date) -> List[Text]:
+        """Drop the partitions that only hold rows older than ``before``"""
+        return []
+
+    # bulk loads
+
+    def upsert_customers(self, rows: Sequence[Tuple]) -> None:
+        """Insert or update customers by id; rows follow CUSTOMER_COLUMNS"""
+        self._upsert("customers", CUSTOMER_COLUMNS, "id", CUSTOMER_UPDATE_COLUMNS, rows)
+
+    def upsert_invoices(self, rows: Sequence[Tuple]) -> None:
+        """Insert or update invoices by invoice_number; rows follow INVOICE_COLUMNS.
+
+        The imported status replaces the stored one when billing reports the
+        invoice paid, or while the stored one is still ``pending``; a
+        ``payment_scheduled`` or ``disputed`` set by the bot is otherwise kept.
+        """
+        incoming = self._incoming("status")
+        status = (f"status = CASE WHEN {incoming} = 'paid' OR invoices.status = 'pending' "
+                  f"THEN {incoming} ELSE invoices.status END")
+        self._upsert("invoices", INVOICE_COLUMNS, "invoice_number", INVOICE_UPDATE_COLUMNS, rows, (status,))
+
+    def _upsert(self, table: Text, columns: Sequence[Text], key: Text, update_columns: Sequence[Text],
+                rows: Sequence[Tuple], assignments: Sequence[Text] = ()) -> None:
+        if not rows:
+            return
+        row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        per_statement = max(1, self.max_params // len(columns))
+        # One transaction for all statements, so a chunk is applied or not at all
+        with self.cursor(commit=True) as cursor:
+            for start in range(0, len(rows), per_statement):
+                part = rows[start:start + per_statement]
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(columns)}) "
+                    f"VALUES {', '.join([row_placeholder] * len(part))} "
+                    f"{self._upsert_clause(key, update_columns)}{''.join(', ' + a for a in assignments)}",
+                    [value for row in part for value in row],
+                )
+
+    def _upsert_clause(self, key: Text, update_columns: Sequence[Text]) -> Text:
+        raise NotImplementedError
+
+    def _incoming(self, column: Text) -> Text:
+        """The value a conflicting upsert row brings for ``column``"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[Text, Any]:
+        stats = {"backend": self.name, **self.pool.stats()}
+        if self.router is not None:
+            stats["read_routing"] = self.router.stats()
+        return stats
+
+
+class MySQLStorage(Storage):
+    name = "mysql"
+    lock_clause = " FOR UPDATE"
+    schema_version = 5  # interaction_daily
+
+    def statement_timeout(self, seconds: float) -> Text:
+        # MariaDB; also aborts waits for row locks. 0 would mean no limit
+        return f"SET STATEMENT max_statement_time={max(seconds, 0.001):.3f} FOR "
+
+    def __init__(self, pool: Optional[ConnectionPool] = None, router: Optional[ReadRouter] = None):
+        super().__init__(pool or get_pool(), router)
+
+    def check_schema(self) -> None:
+        with self.cursor() as cursor:
+            try:
+                cursor.execute("SELECT MAX(version) FROM schema_migrations")
+                (version,) = cursor.fetchone()
+            except Exception as e:
+                raise SchemaError(f"schema_migrations not found ({e}); run `python migrate.py up`") from e
+        if (version or 0) < self.schema_version:
+            raise SchemaError(f"database schema is at migration {version}, the actions need "
+                              f"{self.schema_version}; run `python migrate.py up`")
+        super().check_schema()
+
+    def _upsert_clause(self, key: Text, update_columns: Sequence[Text]) -> Text:
+        return "ON DUPLICATE KEY UPDATE " + ", ".join(f"{c} = {self._incoming(c)}" for c in update_columns)
+
+    def _incoming(self, column: Text) -> Text:
+        return f"VALUES({column})"
+
+    def interaction_partitions(self) -> List[Tuple[Text, Optional[date]]]:
+        with self.cursor() as cursor:
+            cursor.execute(
+                "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'interactions' "
+                "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"
+            )
+            rows = cursor.fetchall()
+        return [(name, None if bound == "MAXVALUE" else date.fromisoformat(bound.strip("'")[:10]))
+                for name, bound in rows]
+
+    def add_interaction_partitions(self, through: date) -> List[Text]:
+        partitions = self.interaction_partitions()
+        if not partitions or partitions[-1][1] is not None:
+            return []  # not partitioned (migration 0006 not applied) or no catch-all partition
+        bounds = [bound for _, bound in partitions if bound is not None]
+        start = max(bounds) if bounds else _month_start(through)
+        new = []
+        while start <= through:
+            end = _next_month(start)
+            new.append((f"p{start:%Y%m}", end))
+            start = end
+        if new:
+            # The catch-all partition is empty when this runs ahead of time, so the split is instant
+            definitions = ", ".join(f"PARTITION {name} VALUES LESS THAN ('{end.isoformat()}')" for name, end in new)
+            catch_all = partitions[-1][0]
+            with self.cursor(commit=True) as cursor:
+                cursor.execute(f"ALTER TABLE interactions REORGANIZE PARTITION {catch_all} INTO "
+                               f"({definitions}, PARTITION {catch_all} VALUES LESS THAN (MAXVALUE))")
+        return [name for name, _ in new]
+
+    def drop_interaction_partitions(self, before: date) -> List[Text]:
+        names = [name for name, bound in self.interaction_partitions() if bound is not None and bound <= before]
+        if names:
+            with self.cursor(commit=True) as cursor:
+                cursor.execute(f"ALTER TABLE interactions DROP PARTITION {', '.join(names)}")
+        return names
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255) NOT NULL,
+    email VARCHAR(255),
+    phone VARCHAR(50),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_customers_name ON customers (name);
+
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER REFERENCES customers(id),
+    invoice_number VARCHAR(50) NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    issue_date DATE NOT NULL,
+    due_date DATE NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending'
+        CHECK (status IN ('pending', 'paid', 'payment_scheduled', 'disputed')),
+    payment_date DATE NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_invoices_customer_status_payment
+    ON invoices (customer_id, status, payment_date);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_invoices_invoice_number ON invoices (invoice_number);
+
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id VARCHAR(255),
+    customer_id INTEGER REFERENCES customers(id),
+    interaction_type VARCHAR(100),
+    data TEXT,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_session_timestamp
+    ON interactions (session_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions (timestamp);
+
+CREATE TABLE IF NOT EXISTS interaction_daily (
+    day DATE NOT NULL,
+    interaction_type VARCHAR(100) NOT NULL,
+    events INTEGER NOT NULL,
+    sessions INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (day, interaction_type)
+);
+
+CREATE TABLE IF NOT EXISTS invoice_transitions (
+    idempotency_key VARCHAR(191) PRIMARY KEY,
+    customer_id INTEGER NOT NULL,
+    to_status VARCHAR(20) NOT NULL,
+    invoice_ids TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS invoice_audit (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    invoice_id INTEGER NOT NULL,
+    customer_id INTEGER NOT NULL,
+    from_status VARCHAR(20) NOT NULL,
+    to_status VARCHAR(20) NOT NULL,
+    payment_date DATE NULL,
+    idempotency_key VARCHAR(191) NOT NULL,
+    session_id VARCHAR(255),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_invoice_audit_invoice ON invoice_audit (invoice_id, created_at);
+"""
+
+
+def _as_date(value: Any) -> date:
+    # MySQL returns DATE() as a date, SQLite as 'YYYY-MM-DD'
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _qmark(query: Text) -> Text:
+    # pyformat -> qmark: %s is a parameter, %% a literal percent sign
+    return query.replace("%s", "?").replace("%%", "%")
+
+
+def connect_sqlite(path: Text, **kwargs: Any) -> sqlite3.Connection:
+    """sqlite3 connection that enforces the schema's foreign keys (off by default in SQLite)"""
+    conn = sqlite3.connect(path, **kwargs)
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+class _SQLiteCursor:
+    """Cursor that accepts the MySQL ``%s`` placeholders used by the queries"""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, query: Text, params: Any = ()) -> None:
+        self._cursor.execute(_qmark(query), tuple(params or ()))
+
+    def executemany(self, query: Text, seq_of_params: Any) -> None:
+        self._cursor.executemany(_qmark(query), seq_of_params)
+
+    def __getattr__(self, name: Text) -> Any:
+        return getattr(self._cursor, name)
+
+
+class SQLiteConnection:
+    """sqlite3 connection exposing the subset of the mysql.connector API we use"""
+
+    def __init__(self, path: Text):
+        self._conn = connect_sqlite(path, check_same_thread=False, timeout=30)
+
+    def cursor(self) -> _SQLiteCursor:
+        return _SQLiteCursor(self._conn.cursor())
+
+    def __getattr__(self, name: Text) -> Any:
+        return getattr(self._conn, name)
+
+
+def sqlite_pool(path: Text, size: int = 4, max_overflow: int = 4) -> ConnectionPool:
+    return ConnectionPool(lambda: SQLiteConnection(path), size=size, max_overflow=max_overflow,
+                          recycle=0, pre_ping=False)
+
+
+class SQLiteStorage(Storage):
+    name = "sqlite"
+    insert_ignore = "INSERT OR IGNORE"
+    max_params = 32766  # SQLITE_MAX_VARIABLE_NUMBER since 3.32
+
+    def __init__(self, path: Text, pool_size: int = 4, max_overflow: int = 4, router: Optional[ReadRouter] = None):
+        self.path = path
+        self.create_schema()
+        super().__init__(sqlite_pool(path, pool_size, max_overflow), router)
+
+    def _begin_write(self, cursor: Any) -> None:
+        # SQLite has no row locks; take the database write lock up front so
+        # the SELECT and the UPDATE see the same rows
+        cursor.execute("BEGIN IMMEDIATE")
+
+    def _upsert_clause(self, key: Text, update_columns: Sequence[Text]) -> Text:
+        return f"ON CONFLICT({key}) DO UPDATE SET " + ", ".join(f"{c} = {self._incoming(c)}" for c in update_columns)
+
+    def _incoming(self, column: Text) -> Text:
+        return f"excluded.{column}"
+
+    def create_schema(self) -> None:
+        conn = connect_sqlite(self.path)
+        try:
+            # WAL lets the action threads read while the logger writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SQLITE_SCHEMA)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def seed(self, customers: int = 1, invoices_per_customer: int = 1) -> None:
+        """Insert the demo customer plus ``customers - 1`` synthetic ones with pending invoices"""
+        conn = connect_sqlite(self.path)
+        try:
+            conn.execute(
+                "INSERT OR IGNORE INTO customers (id, name, email, phone) "
+                "VALUES (1, 'Dennis Kangme', 'dennis@example.com', '+56912345678')"
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO customers (id, name) VALUES (?, ?)",
+                [(i, f"Customer {i}") for i in range(2, customers + 1)],
+            )
+            conn.executemany(
+                "INSERT INTO invoices (customer_id, invoice_number, amount, issue_date, due_date, status) "
+                "VALUES (?, ?, 55000.00, '2025-05-01', '2025-05-23', 'pending')",
+                [
+                    (c, f"INV-{c:06d}-{n:03d}")
+                    for c in range(1, customers + 1)
+                    for n in range(invoices_per_customer)
+                ],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def is_empty(self) -> bool:
+        with self.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM customers")
+            return cursor.fetchone()[0] == 0
+
+
+def create_storage(backend: Optional[Text] = None, seed_demo: bool = True) -> Storage:
+    """Build the backend named by ``backend`` / DB_BACKEND.
+
+    An empty SQLite database gets the demo customer unless ``seed_demo`` is
+    False (tools that load or read real data).
+    """
+    backend = (backend or os.getenv('DB_BACKEND', 'mysql')).lower()
+    if backend == "mysql":
+        hosts = parse_replicas(os.getenv('DB_REPLICAS', ''))
+        replicas = [Replica(host, create_mysql_pool(host)) for host in hosts]
+        return MySQLStorage(router=create_router(replicas, mysql_replica_lag))
+    if backend == "sqlite":
+        paths = parse_replicas(os.getenv('SQLITE_REPLICAS', ''))
+        replicas = [Replica(path, sqlite_pool(path)) for path in paths]
+        storage = SQLiteStorage(os.getenv('SQLITE_PATH', 'verisure_demo.sqlite3'),
+                                router=create_router(replicas, no_replica_lag))
+        if seed_demo and storage.is_empty():
+            storage.seed()
+        return storage
+    raise ValueError(f"DB_BACKEND must be 'mysql' or 'sqlite', got {backend!r}")
+
+
+def create_router(replicas: Sequence[Replica], lag_check) -> Optional[ReadRouter]:
+    """Read router over ``replicas`` configured from env; None without replicas"""
+    if not replicas:
+        return None
+    window = os.getenv('DB_READ_YOUR_WRITES_WINDOW', '')
+    return ReadRouter(
+        replicas,
+        strategy=os.getenv('DB_READ_STRATEGY', 'round_robin'),
+        max_lag=float(os.getenv('DB_REPLICA_MAX_LAG', '5')),
+        read_your_writes=float(window) if window else None,
+        check_interval=float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5')),
+        lag_check=lag_check,
+    )
+
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """Return the process-wide storage backend, created from env on first use"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+
+def set_storage(storage: Storage) -> None:
+    """Install a specific backend (benchmarks and offline tools)"""
+    global _storage
+    with _storage_lock:
+        if _storage is not None and _storage is not storage:
+            _storage.pool.dispose()
+            if _storage.router is not None:
+                _storage.router.dispose()
+        _storage = storage
@@ -0,0 +1,16 @@
+"""Text normalization shared by the date parser and keyword matcher"""
+
+from typing import Text
+
+# Accent folding keeps string length, so match spans map back to the input
+_ACCENTS = (("á", "a"), ("é", "e"), ("í", "i"), ("ó", "o"), ("ú", "u"), ("ü", "u"), ("ñ", "n"))
+
+
+def normalize(text: Text) -> Text:
+    """Lower-case and fold Spanish accents (length-preserving)"""
+    text = text.lower()
+    if text.isascii():
+        return text
+    for accented, plain in _ACCENTS:
+        text = text.replace(accented, plain)
+    return text
@@ -0,0 +1,185 @@
+"""Start-up warm-up and readiness of the action server.
+
+A fresh worker would otherwise make its first conversations pay for the
+first DB connections, the schema check, building the keyword
+automaton and response templates and cold caches. :func:`warm_up` does all
+of it once, before the worker accepts requests, timing each step:
+
+- ``db_pool``: opens WARMUP_CONNECTIONS pooled connections (default
+  DB_POOL_SIZE) and starts the DB executor threads
+- ``schema``: checks the migrations are applied (``migrate.py up``; the
+  worker does not become ready without them), then starts the interaction logger
+- ``replicas``: first lag check of the read replicas, if any
+- ``matchers``: keyword automaton, date parser and formatting tables
+- ``templates``: response templates from domain.yml
+- ``customers``: ids and invoice summaries of the first WARMUP_CUSTOMERS
+  customers with pending invoices, where the next campaign batch starts
+
+Failed steps are retried every WARMUP_RETRY_INTERVAL seconds for up to
+WARMUP_TIMEOUT seconds; after that the worker serves anyway (the actions
+have DB fallbacks) but :data:`READINESS` stays not ready until a later
+call completes the remaining steps.
+"""
+
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Text, Tuple
+
+from actions.instrumentation import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_PROCESS_STARTED = time.monotonic()
+
+
+class Readiness:
+    """Per-process start-up state: step durations, errors and whether the warm-up finished"""
+
+    def __init__(self):
+        self.ready = False
+        self.steps: Dict[Text, float] = {}
+        self.errors: Dict[Text, Text] = {}
+        self.started = _PROCESS_STARTED  # time.monotonic() when the process began starting up
+        self.startup_time: Optional[float] = None
+
+    def record(self, step: Text, seconds: float, error: Optional[Exception] = None) -> None:
+        self.steps[step] = self.steps.get(step, 0.0) + seconds
+        if error is None:
+            self.errors.pop(step, None)
+        else:
+            self.errors[step] = str(error)
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "startup_s": round(self.startup_time, 3) if self.startup_time is not None else None,
+            "steps_ms": {step: round(seconds * 1000, 1) for step, seconds in self.steps.items()},
+            "errors": dict(self.errors),
+        }
+
+
+READINESS = Readiness()
+
+
+def _gauges() -> Dict[Text, float]:
+    gauges = {f"startup_{step}_seconds": seconds for step, seconds in READINESS.steps.items()}
+    gauges["startup_ready"] = float(READINESS.ready)
+    return gauges
+
+
+REGISTRY.add_collector(_gauges)
+
+
+def _noop(_: int) -> None:
+    pass
+
+
+def warm_pool() -> None:
+    from actions.async_db import get_executor
+    from actions.storage import get_storage
+
+    pool = get_storage().pool
+    count = min(int(os.getenv('WARMUP_CONNECTIONS', str(pool.size))), pool.capacity)
+    connections = [pool.connect() for _ in range(count)]
+    for connection in connections:
+        connection.close()
+    list(get_executor().map(_noop, range(count)))
+
+
+def warm_schema() -> None:
+    from actions.interaction_logger import get_interaction_logger
+
+    interaction_logger = get_interaction_logger()
+    if not interaction_logger.check_schema():
+        raise RuntimeError("database schema not migrated")
+    interaction_logger.start()
+
+
+def warm_replicas() -> None:
+    from actions.storage import get_storage
+
+    router = get_storage().router
+    if router is not None:
+        router.start()
+
+
+def warm_matchers() -> None:
+    from actions.date_parser import parse_date
+    from actions.keyword_matcher import get_keyword_matcher
+    from actions.rendering import format_currency, format_date
+
+    get_keyword_matcher().scan("hola, sí soy yo y puedo pagar mañana")
+    result = parse_date("el próximo jueves")
+    if result is not None:
+        format_date(result.date, weekday=True)
+    format_currency(1234567)
+
+
+def warm_templates() -> None:
+    from actions.rendering import get_templates
+
+    if not get_templates():
+        raise RuntimeError("no response templates in the domain file")
+
+
+def warm_customers() -> None:
+    """Seed the customer and invoice summary caches with the start of the next campaign batch"""
+    from actions.cache import customer_id_cache, invoice_summary_cache, invoice_summary_fallback
+    from actions.storage import get_storage
+
+    limit = int(os.getenv('WARMUP_CUSTOMERS', '500'))
+    if limit <= 0:
+        return
+    for customer_id, name, count, total in get_storage().pending_customers(limit=limit):
+        summary = (count, total)
+        customer_id_cache.set(name, customer_id)
+        invoice_summary_cache.set(customer_id, summary)
+        invoice_summary_fallback.set(name, (customer_id, summary))
+
+
+STEPS: List[Tuple[Text, Callable[[], None]]] = [
+    ("db_pool", warm_pool),
+    ("schema", warm_schema),
+    ("replicas", warm_replicas),
+    ("matchers", warm_matchers),
+    ("templates", warm_templates),
+    ("customers", warm_customers),
+]
+
+
+def warm_up(readiness: Readiness = READINESS, timeout: Optional[float] = None,
+            retry_interval: Optional[float] = None, started: Optional[float] = None) -> bool:
+    """Run the steps not done yet, retrying failed ones until ``timeout``; True once all succeeded.
+
+    ``started`` (``time.monotonic()``) is when the process began starting up.
+    """
+    if started is not None:
+        readiness.started = started
+    timeout = float(os.getenv('WARMUP_TIMEOUT', '30')) if timeout is None else timeout
+    retry_interval = float(os.getenv('WARMUP_RETRY_INTERVAL', '2')) if retry_interval is None else retry_interval
+    deadline = time.monotonic() + timeout
+    pending = [(name, step) for name, step in STEPS if name not in readiness.steps or name in readiness.errors]
+    while True:
+        failed = []
+        for name, step in pending:
+            step_started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                readiness.record(name, time.perf_counter() - step_started, e)
+                failed.append((name, step))
+            else:
+                readiness.record(name, time.perf_counter() - step_started)
+        pending = failed
+        if not pending or time.monotonic() + retry_interval > deadline:
+            break
+        logger.warning("warm-up incomplete, retrying", extra={"steps": [name for name, _ in pending]})
+        time.sleep(retry_interval)
+
+    readiness.ready = not pending
+    readiness.startup_time = time.monotonic() - readiness.started
+    log = logger.info if readiness.ready else logger.error
+    log("warm-up finished" if readiness.ready else "warm-up incomplete, serving without it",
+        extra=readiness.status())
+    return readiness.ready
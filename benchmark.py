@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the action hot paths
+
+Covers the date helpers, the keyword classifiers and every action's run()
+end-to-end against a fake tracker and an in-process SQLite database. Each
+action run gets a new sender_id, message_id and customer, so the invoice
+updates do their full transaction instead of hitting the idempotency key
+of an earlier iteration. Results are compared against a local baseline
+(benchmark_baseline.json, not committed): timings only mean something on
+the host that recorded them, so save one there first. A baseline from a
+different host or Python is reported but not compared.
+
+Usage:
+    python benchmark.py --save-baseline      # first run on this host: store the baseline
+    python benchmark.py                      # run and compare with the baseline, if any
+    python benchmark.py --filter date --threshold 0.10
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+class Case(NamedTuple):
+    name: str
+    func: Callable
+    is_async: bool = False
+
+
+class Result(NamedTuple):
+    name: str
+    median_us: float
+    min_us: float
+    stdev_us: float
+    loops: int
+
+
+def setup_offline_database(directory: str):
+    """Point the actions at a seeded SQLite file instead of MySQL"""
+    from actions.storage import SQLiteStorage, set_storage
+
+    storage = SQLiteStorage(os.path.join(directory, "benchmark.sqlite3"))
+    storage.seed(customers=1000, invoices_per_customer=3)
+    set_storage(storage)
+
+
+def tracker_factory(text: str, slots: Dict, names: List[str]) -> Callable:
+    """New tracker per call: a fresh conversation turn for the next customer"""
+    from actions.offline import make_tracker
+
+    counter = itertools.count()
+
+    def next_tracker():
+        n = next(counter)
+        return make_tracker(text, slots={**slots, "client_name": names[n % len(names)]},
+                            sender_id=f"benchmark-{n}", message_id=f"benchmark-{n}")
+    return next_tracker
+
+
+def build_cases() -> List[Case]:
+    from actions import actions as a
+    from actions.offline import run_action_async
+    from actions.rendering import format_currency, format_date, render
+    from actions.storage import get_storage
+
+    date_action = a.ActionHandleDateQuestion()
+    payment_action = a.ActionHandlePaymentResponse()
+    reason_action = a.ActionClassifyReason()
+    identity_action = a.ActionCheckIdentity()
+
+    cases = []
+    for expression in ["mañana", "el próximo jueves", "viernes", "fin de mes", "próximo mes",
+                       "el 15/09", "no sé todavía"]:
+        cases.append(Case(f"date.convert_relative_date[{expression}]",
+                          lambda e=expression: date_action.convert_relative_date(e)))
+    payment_day = date(2025, 8, 8)
+    cases.append(Case("render.format_date", lambda: format_date(payment_day, weekday=True)))
+    cases.append(Case("render.format_currency", lambda: format_currency(Decimal("1234567.50"))))
+    cases.append(Case("render.utter_invoice_pending_info",
+                      lambda: render("utter_invoice_pending_info", client_name="Dennis Kangme",
+                                     pending_invoice_count=2, pending_invoice_total="$110.000")))
+
+    for message in ["sí, puedo pagar", "no puedo pagar", "¿cuándo vence la factura?", "bueno, veamos"]:
+        cases.append(Case(f"classify.payment_response[{message}]",
+                          lambda m=message: payment_action.classify_payment_response(m)))
+    for message in ["estoy cesante", "ya pagué esa factura", "no sé"]:
+        cases.append(Case(f"classify.reason[{message}]", lambda m=message: reason_action.classify_reason(m)))
+    for message in ["sí, soy yo", "no, no soy dennis"]:
+        cases.append(Case(f"classify.identity[{message}]", lambda m=message: identity_action.confirms_identity(m)))
+
+    slots = {"client_name": "Dennis Kangme", "is_dennis": True, "amount": 100}
+    runs = [
+        (a.ActionExtractClientName(), "hola, soy dennis kangme"),
+        (a.ActionCheckIdentity(), "sí, soy yo"),
+        (a.ActionHandleIdentityResponse(), "sí"),
+        (a.ActionHandlePaymentResponse(), "sí, puedo pagar"),
+        (a.ActionHandleDateQuestion(), "el próximo viernes"),
+        (a.ActionClassifyReason(), "ya pagué"),
+        (a.ActionCheckSufficientFunds(), ""),
+        (a.ActionGetPendingInvoicesInfo(), ""),
+    ]
+    names = [name for _, name, _, _ in get_storage().pending_customers(limit=1000)]
+    for action, text in runs:
+        next_tracker = tracker_factory(text, slots, names)
+        cases.append(Case(f"run.{action.name()}",
+                          lambda ac=action, nt=next_tracker: run_action_async(ac, nt()), is_async=True))
+    return cases
+
+
+def _time_loops(case: Case, loops: int, loop: asyncio.AbstractEventLoop) -> float:
+    if case.is_async:
+        async def repeat():
+            start = time.perf_counter()
+            for _ in range(loops):
+                await case.func()
+            return time.perf_counter() - start
+        return loop.run_until_complete(repeat())
+
+    func = case.func
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return time.perf_counter() - start
+
+
+def settle(timeout: float = 5.0) -> None:
+    """Wait for the interaction logger to write what earlier samples queued"""
+    from actions.interaction_logger import get_interaction_logger
+
+    interaction_logger = get_interaction_logger()
+    deadline = time.monotonic() + timeout
+    while interaction_logger.stats()["queued"] and time.monotonic() < deadline:
+        time.sleep(0.005)
+    time.sleep(0.005)  # the last batch taken off the queue is still being written
+
+
+def measure(case: Case, loop: asyncio.AbstractEventLoop, repeat: int, min_time: float) -> Result:
+    """Calibrate a loop count so each sample takes ``min_time``, then sample"""
+    loops = 1
+    while True:
+        elapsed = _time_loops(case, loops, loop)
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    samples = []
+    for _ in range(repeat):
+        # The logger's writes compete with the next sample for the CPU
+        settle()
+        samples.append(_time_loops(case, loops, loop) / loops * 1e6)
+    return Result(case.name, statistics.median(samples), min(samples),
+                  statistics.stdev(samples) if len(samples) > 1 else 0.0, loops)
+
+
+def load_baseline(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def host_metadata() -> Dict[str, str]:
+    """What a baseline must share with this run for the timings to compare."""
+    return {
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+
+
+def host_mismatch(baseline: Dict) -> List[str]:
+    """Describe the host metadata that differs from the baseline's."""
+    return [f"{key}: {baseline.get(key)} != {value}"
+            for key, value in host_metadata().items() if baseline.get(key) != value]
+
+
+def save_baseline(path: str, results: List[Result]) -> None:
+    data = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **host_metadata(),
+        "results": {r.name: {"median_us": r.median_us, "min_us": r.min_us} for r in results},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    print(f"Baseline guardado en {path}")
+
+
+def report(results: List[Result], baseline: Optional[Dict], threshold: float) -> List[str]:
+    """Print the results table; return the names that regressed.
+
+    Compares the fastest sample with the baseline's: the minimum is the
+    run least disturbed by other work on the machine, so it is the most
+    repeatable figure.
+    """
+    regressions = []
+    base = (baseline or {}).get("results", {})
+    print(f"{'benchmark':<60} {'median µs':>11} {'min µs':>10} {'base min':>10} {'delta':>8}")
+    print("-" * 103)
+    for r in results:
+        line = f"{r.name:<60} {r.median_us:>11.2f} {r.min_us:>10.2f}"
+        if r.name in base:
+            reference = base[r.name]["min_us"]
+            delta = (r.min_us - reference) / reference if reference else 0.0
+            flag = ""
+            if delta > threshold:
+                regressions.append(r.name)
+                flag = "  REGRESSION"
+            line += f" {reference:>10.2f} {delta:>+8.1%}{flag}"
+        print(line)
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the action hot paths")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=7, help="Samples per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per sample")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown vs baseline before failing (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    from actions.async_db import shutdown_executor
+    from actions.interaction_logger import get_interaction_logger
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_offline_database(directory)
+        cases = [c for c in build_cases() if args.filter in c.name]
+        loop = asyncio.new_event_loop()
+        try:
+            # Keep the actions' own log output out of the report
+            logging.disable(logging.CRITICAL)
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                results = [measure(case, loop, args.repeat, args.min_time) for case in cases]
+                get_interaction_logger().stop()
+        finally:
+            logging.disable(logging.NOTSET)
+            loop.close()
+            shutdown_executor()
+
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    if baseline is not None:
+        mismatch = host_mismatch(baseline)
+        if mismatch:
+            print(f"⚠️  El baseline {args.baseline} es de otro host ({'; '.join(mismatch)}); "
+                  f"no se compara. Regenéralo aquí con --save-baseline.\n")
+            baseline = None
+    regressions = report(results, baseline, args.threshold)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        return 0
+    if baseline is None and not args.save_baseline:
+        print("\nSin baseline para este host: ejecuta primero `python benchmark.py --save-baseline`.")
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) más lentos que el baseline (umbral {args.threshold:.0%})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
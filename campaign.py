@@ -0,0 +1,658 @@
+#!/usr/bin/env python3
+"""
+Outbound collections campaign scheduler for Verisure Rasa Demo
+
+Selects customers with pending invoices, feeds them through a bounded work
+queue to concurrent workers and opens one conversation per customer by
+triggering the EXTERNAL_init_context intent with the client name through
+the Rasa HTTP API (rasa run --enable-api). A token bucket caps the trigger
+rate. Every trigger is recorded in the interactions table under the
+conversation id ``campaign-<id>-<customer_id>``, so an interrupted run
+skips customers it already reached, and ``outcomes`` classifies each
+customer from the interactions the bot logged for that conversation.
+
+With several scheduler processes, --shard K --shards N splits the customer
+set between them (customer_id % N == K).
+
+Usage:
+    python campaign.py run --campaign 2025-06-a --concurrency 50 --rate 20
+    python campaign.py outcomes --campaign 2025-06-a --csv outcomes.csv
+    python campaign.py export --campaign 2025-06-a --output outcomes.parquet --summary summary.json
+    DB_BACKEND=sqlite python campaign.py run --campaign demo --stub   # local stub Rasa
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+TRIGGER_INTENT = "EXTERNAL_init_context"
+TRIGGER_PATH = "/conversations/{conversation_id}/trigger_intent"
+SESSION_PREFIX = "campaign-{campaign}-"
+
+# Outcomes, most conclusive first; a customer gets the first that applies
+OUTCOMES = (
+    "payment_scheduled",
+    "disputed",
+    "financial_difficulty",
+    "declined",
+    "wrong_person",
+    "identified",
+    "no_response",
+    "trigger_failed",
+)
+
+
+@dataclass
+class Target:
+    customer_id: int
+    name: str
+    invoice_count: int
+    total: Any
+
+
+@dataclass
+class RunStats:
+    selected: int = 0
+    skipped: int = 0
+    triggered: int = 0
+    failed: int = 0
+    retries: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+
+def session_id(campaign: str, customer_id: int) -> str:
+    return f"{SESSION_PREFIX.format(campaign=campaign)}{customer_id}"
+
+
+def session_customer_id(campaign: str, session: str) -> Optional[int]:
+    """customer_id of one of the campaign's conversations; None for any other session.
+
+    The prefix also matches campaigns whose name extends this one ("demo" vs
+    "demo-2": ``campaign-demo-2-17``), so only a digits-only suffix counts.
+    """
+    prefix = SESSION_PREFIX.format(campaign=campaign)
+    suffix = session[len(prefix):]
+    if not session.startswith(prefix) or not suffix.isascii() or not suffix.isdigit():
+        return None
+    return int(suffix)
+
+
+class RateLimiter:
+    """Token bucket shared by the workers: at most ``rate`` triggers/s, bursts of ``burst``"""
+
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def iter_targets(storage, shard: int, shards: int, limit: Optional[int], page_size: int = 500) -> Iterator[Target]:
+    """Stream customers with pending invoices in id order (keyset pagination)"""
+    after_id = 0
+    produced = 0
+    while limit is None or produced < limit:
+        page = storage.pending_customers(after_id, page_size, shard, shards)
+        if not page:
+            return
+        for customer_id, name, invoice_count, total in page:
+            yield Target(customer_id, name, invoice_count, total)
+            produced += 1
+            if limit is not None and produced >= limit:
+                return
+        after_id = page[-1][0]
+
+
+def iter_interactions(storage, campaign: str, page_size: int = 5000,
+                      interaction_type: Optional[str] = None) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """Stream (session_id, interaction_type, data) of the campaign's conversations, optionally of one type"""
+    prefix = SESSION_PREFIX.format(campaign=campaign)
+    after_id = 0
+    while True:
+        page = storage.interactions_page(prefix, after_id, page_size, interaction_type=interaction_type)
+        if not page:
+            return
+        for _, session, interaction_type, data in page:
+            yield session, interaction_type, data
+        after_id = page[-1][0]
+
+
+def reached_customers(storage, campaign: str) -> Set[int]:
+    """Customer ids already triggered successfully in this campaign"""
+    reached = set()
+    for session, _, _ in iter_interactions(storage, campaign, interaction_type="campaign_triggered"):
+        customer_id = session_customer_id(campaign, session)
+        if customer_id is not None:
+            reached.add(customer_id)
+    return reached
+
+
+def outcome_of(interaction_type: str, data: Optional[str]) -> Optional[str]:
+    """The outcome a single logged interaction implies, if any"""
+    if interaction_type == "payment_date_confirmed":
+        return "payment_scheduled"
+    if interaction_type == "reason_classified":
+        return {"payment_dispute": "disputed", "financial_difficulty": "financial_difficulty"}.get(data, "declined")
+    if interaction_type == "identity_check":
+        return "identified" if data == "is_dennis=True" else "wrong_person"
+    if interaction_type == "campaign_triggered":
+        return "no_response"
+    if interaction_type == "campaign_trigger_failed":
+        return "trigger_failed"
+    return None
+
+
+def collect_outcomes(storage, campaign: str) -> Dict[int, str]:
+    """customer_id -> most conclusive outcome, computed while streaming"""
+    rank = {outcome: index for index, outcome in enumerate(OUTCOMES)}
+    outcomes: Dict[int, str] = {}
+    for session, interaction_type, data in iter_interactions(storage, campaign):
+        outcome = outcome_of(interaction_type, data)
+        if outcome is None:
+            continue
+        customer_id = session_customer_id(campaign, session)
+        if customer_id is None:
+            continue
+        current = outcomes.get(customer_id)
+        if current is None or rank[outcome] < rank[current]:
+            outcomes[customer_id] = outcome
+    return outcomes
+
+
+async def trigger(session, base_url: str, token: Optional[str], conversation_id: str, target: Target,
+                  timeout: float, output_channel: str = "latest") -> int:
+    """POST the trigger_intent request; returns the HTTP status"""
+    import aiohttp
+
+    params = {"output_channel": output_channel}
+    if token:
+        params["token"] = token
+    payload = {"name": TRIGGER_INTENT, "entities": {"client_name": target.name}}
+    async with session.post(base_url.rstrip("/") + TRIGGER_PATH.format(conversation_id=conversation_id),
+                            params=params, json=payload,
+                            timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        await response.read()
+        return response.status
+
+
+async def run_campaign(storage, campaign: str, base_url: str, token: Optional[str], concurrency: int,
+                       rate: Optional[float], shard: int, shards: int, limit: Optional[int],
+                       retries: int, timeout: float, resume: bool = True,
+                       output_channel: str = "latest") -> Tuple[RunStats, float]:
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    stats = RunStats()
+    limiter = RateLimiter(rate, burst=max(1, int(rate or 1)))
+    done = await loop.run_in_executor(None, reached_customers, storage, campaign) if resume else set()
+    queue: "asyncio.Queue[Optional[Target]]" = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def record(rows: List[Tuple]) -> None:
+        await loop.run_in_executor(None, storage.insert_interactions, rows)
+
+    async def producer() -> None:
+        targets = iter_targets(storage, shard, shards, limit)
+        while True:
+            # Pages are fetched off the event loop; the bounded queue is the backpressure
+            target = await loop.run_in_executor(None, next, targets, None)
+            if target is None:
+                break
+            stats.selected += 1
+            if target.customer_id in done:
+                stats.skipped += 1
+                continue
+            await queue.put(target)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker(http) -> None:
+        while True:
+            target = await queue.get()
+            if target is None:
+                return
+            conversation_id = session_id(campaign, target.customer_id)
+            status, error = None, None
+            for attempt in range(retries + 1):
+                await limiter.acquire()
+                start = time.perf_counter()
+                try:
+                    status = await trigger(http, base_url, token, conversation_id, target, timeout, output_channel)
+                    error = None if status == 200 else f"HTTP {status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = f"{type(e).__name__}: {e}"
+                stats.latencies.append(time.perf_counter() - start)
+                if error is None or (status is not None and status < 500):
+                    break
+                if attempt < retries:
+                    stats.retries += 1
+                    await asyncio.sleep(min(10.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5))
+            if error is None:
+                stats.triggered += 1
+                await record([(conversation_id, "campaign_triggered",
+                               f"invoices={target.invoice_count}, total={target.total}", datetime.now())])
+            else:
+                stats.failed += 1
+                await record([(conversation_id, "campaign_trigger_failed", error, datetime.now())])
+
+    start = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as http:
+        await asyncio.gather(producer(), *(worker(http) for _ in range(concurrency)))
+    return stats, time.perf_counter() - start
+
+
+async def start_stub_rasa(port: int, storage, latency: float, error_rate: float, seed: Optional[int] = None):
+    """Local stand-in for the Rasa trigger_intent API.
+
+    It answers like Rasa and, to exercise outcome tracking, logs the
+    interactions a real conversation would produce with a random ending.
+    """
+    from aiohttp import web
+
+    rng = random.Random(seed)
+    endings = [
+        ("payment_date_confirmed", "2025-07-01"),
+        ("reason_classified", "financial_difficulty"),
+        ("reason_classified", "payment_dispute"),
+        ("reason_classified", "other"),
+        None,  # stops answering after the identity check
+    ]
+    loop = asyncio.get_running_loop()
+
+    async def trigger_intent(request):
+        conversation_id = request.match_info["conversation_id"]
+        payload = await request.json()
+        if latency:
+            await asyncio.sleep(rng.expovariate(1.0 / latency))
+        if error_rate and rng.random() < error_rate:
+            return web.json_response({"error": "stub failure"}, status=500)
+        name = (payload.get("entities") or {}).get("client_name", "")
+        now = datetime.now()
+        rows = [(conversation_id, "client_name_extracted_from_entity", name, now)]
+        if rng.random() < 0.15:
+            rows.append((conversation_id, "identity_check", "is_dennis=False", now))
+        else:
+            rows.append((conversation_id, "identity_check", "is_dennis=True", now))
+            ending = rng.choice(endings)
+            if ending:
+                rows.append((conversation_id, *ending, now))
+        await loop.run_in_executor(None, storage.insert_interactions, rows)
+        return web.json_response({"tracker": {"sender_id": conversation_id}, "messages": []})
+
+    app = web.Application()
+    app.router.add_post(TRIGGER_PATH, trigger_intent)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def summarize_outcomes(outcomes: Dict[int, str]) -> Dict[str, int]:
+    counts = {outcome: 0 for outcome in OUTCOMES}
+    for outcome in outcomes.values():
+        counts[outcome] += 1
+    return counts
+
+
+def print_run_report(stats: RunStats, elapsed: float) -> None:
+    from load_test import percentile
+
+    latencies = sorted(stats.latencies)
+    print("=" * 50)
+    print(f"Clientes seleccionados: {stats.selected} (ya contactados: {stats.skipped})")
+    print(f"Conversaciones iniciadas: {stats.triggered}  Fallidas: {stats.failed}  Reintentos: {stats.retries}")
+    print(f"Duración: {elapsed:.2f}s  Throughput: {stats.triggered / elapsed if elapsed else 0:.1f} triggers/s")
+    print(f"Latencia trigger (ms): p50={percentile(latencies, 50) * 1000:.1f} "
+          f"p95={percentile(latencies, 95) * 1000:.1f} max={(latencies[-1] if latencies else 0) * 1000:.1f}")
+
+
+def print_outcomes(counts: Dict[str, int]) -> None:
+    total = sum(counts.values())
+    print(f"Resultados ({total} clientes):")
+    for outcome in OUTCOMES:
+        share = counts[outcome] / total if total else 0.0
+        print(f"  {outcome:<22} {counts[outcome]:>8} {share:>7.1%}")
+
+
+def write_outcomes_csv(path: str, outcomes: Dict[int, str]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["customer_id", "outcome"])
+        for customer_id in sorted(outcomes):
+            writer.writerow([customer_id, outcomes[customer_id]])
+
+
+# Interactions an outcome record is built from
+EXPORT_TYPES = ("campaign_triggered", "campaign_trigger_failed", "identity_check",
+                "payment_date_confirmed", "reason_classified")
+EXPORT_COLUMNS = (
+    "campaign", "customer_id", "customer_name", "session_id", "outcome", "reason_type", "payment_date",
+    "scheduled_delay_days", "contacted_at", "outcome_at", "last_interaction_at", "interactions",
+    "pending_invoices", "pending_amount", "scheduled_invoices", "scheduled_amount",
+    "disputed_invoices", "disputed_amount", "paid_invoices", "paid_amount",
+)
+INVOICE_STATUS_COLUMNS = (("pending", "pending"), ("payment_scheduled", "scheduled"),
+                          ("disputed", "disputed"), ("paid", "paid"))
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    # MySQL returns datetimes, SQLite ISO strings
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _as_iso_date(value: Optional[str]) -> Optional[str]:
+    try:
+        return datetime.strptime((value or "").strip(), "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return None
+
+
+def iter_sessions(storage, campaign: str, batch_size: int = 5000) -> Iterator[Tuple[str, List[Tuple]]]:
+    """(session_id, [(interaction_type, data, timestamp), ...]) one conversation at a time"""
+    current, events = None, []
+    for batch in storage.iter_session_interactions(SESSION_PREFIX.format(campaign=campaign), EXPORT_TYPES,
+                                                   batch_size):
+        for session, interaction_type, data, timestamp in batch:
+            if session != current:
+                if current is not None:
+                    yield current, events
+                current, events = session, []
+            events.append((interaction_type, data, _as_datetime(timestamp)))
+    if current is not None:
+        yield current, events
+
+
+def build_record(campaign: str, session: str, events: List[Tuple]) -> Optional[Dict[str, Any]]:
+    """One outcome row from a conversation's interactions (invoice columns are filled later)"""
+    customer_id = session_customer_id(campaign, session)
+    if customer_id is None:
+        return None
+    rank = {outcome: index for index, outcome in enumerate(OUTCOMES)}
+    outcome, outcome_at, contacted_at = None, None, None
+    reason_type, payment_date = None, None
+    for interaction_type, data, timestamp in events:
+        if interaction_type == "campaign_triggered" and contacted_at is None:
+            contacted_at = timestamp
+        elif interaction_type == "reason_classified":
+            reason_type = data
+        elif interaction_type == "payment_date_confirmed":
+            payment_date = _as_iso_date(data) or payment_date
+        current = outcome_of(interaction_type, data)
+        if current is not None and (outcome is None or rank[current] < rank[outcome]):
+            outcome, outcome_at = current, timestamp
+
+    delay = None
+    if outcome == "payment_scheduled" and payment_date and contacted_at:
+        delay = (datetime.strptime(payment_date, "%Y-%m-%d").date() - contacted_at.date()).days
+    return {
+        "campaign": campaign, "customer_id": customer_id, "customer_name": None, "session_id": session,
+        "outcome": outcome, "reason_type": reason_type, "payment_date": payment_date,
+        "scheduled_delay_days": delay, "contacted_at": contacted_at, "outcome_at": outcome_at,
+        "last_interaction_at": events[-1][2] if events else None, "interactions": len(events),
+    }
+
+
+def add_invoice_totals(storage, records: List[Dict[str, Any]]) -> None:
+    """Fill the customer and current invoice columns with one query per batch"""
+    totals = storage.customer_invoice_totals([record["customer_id"] for record in records])
+    for record in records:
+        customer = totals.get(record["customer_id"], {})
+        record["customer_name"] = customer.get("name")
+        for status, column in INVOICE_STATUS_COLUMNS:
+            count, amount = customer.get(status, (0, None))
+            record[f"{column}_invoices"] = count
+            record[f"{column}_amount"] = float(amount) if amount is not None else 0.0
+
+
+class OutcomeSummary:
+    """Campaign metrics accumulated while records stream past"""
+
+    def __init__(self):
+        self.counts = {outcome: 0 for outcome in OUTCOMES}
+        self.delay_total = 0
+        self.delays = 0
+        self.scheduled_amount = 0.0
+
+    def add(self, record: Dict[str, Any]) -> None:
+        if record["outcome"] is not None:
+            self.counts[record["outcome"]] += 1
+        if record["scheduled_delay_days"] is not None:
+            self.delay_total += record["scheduled_delay_days"]
+            self.delays += 1
+        if record["outcome"] == "payment_scheduled":
+            self.scheduled_amount += record["scheduled_amount"]
+
+    def metrics(self) -> Dict[str, Any]:
+        contacted = sum(self.counts.values()) - self.counts["trigger_failed"]
+        responded = contacted - self.counts["no_response"]
+
+        def rate(value: int) -> float:
+            return round(value / contacted, 4) if contacted else 0.0
+
+        return {
+            "customers": sum(self.counts.values()),
+            "contacted": contacted,
+            "response_rate": rate(responded),
+            "promise_to_pay_rate": rate(self.counts["payment_scheduled"]),
+            "dispute_rate": rate(self.counts["disputed"]),
+            "financial_difficulty_rate": rate(self.counts["financial_difficulty"]),
+            "avg_scheduled_delay_days": round(self.delay_total / self.delays, 2) if self.delays else None,
+            "scheduled_amount": round(self.scheduled_amount, 2),
+            "outcomes": dict(self.counts),
+        }
+
+
+class CsvRecordWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=EXPORT_COLUMNS)
+        self._writer.writeheader()
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        self._writer.writerows(records)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetRecordWriter:
+    """One Parquet row group per batch, so memory stays bounded by the batch size"""
+
+    def __init__(self, path: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        string, integer, real, stamp = pa.string(), pa.int64(), pa.float64(), pa.timestamp("us")
+        types = {
+            "customer_id": integer, "scheduled_delay_days": integer, "interactions": integer,
+            "contacted_at": stamp, "outcome_at": stamp, "last_interaction_at": stamp,
+            "payment_date": pa.date32(),
+        }
+        for _, column in INVOICE_STATUS_COLUMNS:
+            types[f"{column}_invoices"] = integer
+            types[f"{column}_amount"] = real
+        self._schema = pa.schema([(name, types.get(name, string)) for name in EXPORT_COLUMNS])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="snappy")
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        columns = {name: [record[name] for record in records] for name in EXPORT_COLUMNS}
+        columns["payment_date"] = [datetime.strptime(value, "%Y-%m-%d").date() if value else None
+                                   for value in columns["payment_date"]]
+        self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def export_outcomes(storage, campaign: str, writer, batch_size: int = 1000) -> OutcomeSummary:
+    """Stream one record per conversation to ``writer``; returns the summary metrics"""
+    summary = OutcomeSummary()
+    batch: List[Dict[str, Any]] = []
+
+    def flush() -> None:
+        add_invoice_totals(storage, batch)
+        for record in batch:
+            summary.add(record)
+        writer.write(batch)
+        batch.clear()
+
+    for session, events in iter_sessions(storage, campaign):
+        record = build_record(campaign, session, events)
+        if record is None:
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return summary
+
+
+def print_summary(metrics: Dict[str, Any]) -> None:
+    print(f"Clientes: {metrics['customers']}  Contactados: {metrics['contacted']}")
+    print(f"Tasa de respuesta: {metrics['response_rate']:.1%}  "
+          f"Promesas de pago: {metrics['promise_to_pay_rate']:.1%}  Disputas: {metrics['dispute_rate']:.1%}")
+    delay = metrics["avg_scheduled_delay_days"]
+    print(f"Plazo promedio de pago comprometido: {'-' if delay is None else f'{delay:.1f} días'}  "
+          f"Monto comprometido: {metrics['scheduled_amount']:,.2f}")
+
+
+async def run_command(args, storage) -> Dict:
+    runner = None
+    base_url = args.url
+    if args.stub:
+        runner = await start_stub_rasa(args.stub_port, storage, args.stub_latency, args.stub_error_rate, args.seed)
+        base_url = f"http://127.0.0.1:{args.stub_port}"
+    try:
+        stats, elapsed = await run_campaign(
+            storage, args.campaign, base_url, args.token, args.concurrency, args.rate,
+            args.shard, args.shards, args.limit, args.retries, args.timeout, resume=not args.restart,
+            output_channel=args.output_channel,
+        )
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    return {"stats": stats, "elapsed": elapsed}
+
+
+def export_command(args, storage) -> int:
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    try:
+        writer = ParquetRecordWriter(args.output) if fmt == "parquet" else CsvRecordWriter(args.output)
+    except ImportError:
+        print("Parquet export needs pyarrow (pip install pyarrow)")
+        return 2
+    start = time.perf_counter()
+    try:
+        summary = export_outcomes(storage, args.campaign, writer, args.batch_size)
+    finally:
+        writer.close()
+    metrics = summary.metrics()
+    print(f"{metrics['customers']} registros exportados a {args.output} en {time.perf_counter() - start:.1f}s")
+    print_summary(metrics)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump({"campaign": args.campaign, **metrics}, f, indent=2)
+    return 0
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run an outbound collections campaign")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Open conversations with customers that have pending invoices")
+    run.add_argument("--campaign", required=True, help="Campaign id, part of every conversation id")
+    run.add_argument("--url", default=os.getenv("RASA_URL", "http://localhost:5005"), help="Rasa server URL")
+    run.add_argument("--token", default=os.getenv("RASA_TOKEN"), help="Rasa API token (default: RASA_TOKEN)")
+    run.add_argument("--output-channel", default="latest", help="Channel the bot's first message goes to")
+    run.add_argument("--concurrency", type=int, default=20, help="Triggers in flight")
+    run.add_argument("--rate", type=float, default=None, help="Max triggers per second")
+    run.add_argument("--limit", type=int, default=None, help="Stop after this many customers")
+    run.add_argument("--shard", type=int, default=0, help="This scheduler's shard (customer_id %% shards)")
+    run.add_argument("--shards", type=int, default=1, help="Number of scheduler processes")
+    run.add_argument("--retries", type=int, default=2, help="Retries for 5xx/timeouts, with backoff")
+    run.add_argument("--timeout", type=float, default=30.0, help="Per-trigger request timeout")
+    run.add_argument("--restart", action="store_true", help="Trigger customers already contacted again")
+    run.add_argument("--stub", action="store_true", help="Run against a local stub Rasa instead of --url")
+    run.add_argument("--stub-port", type=int, default=5098)
+    run.add_argument("--stub-latency", type=float, default=0.02, help="Mean stub response time (s)")
+    run.add_argument("--stub-error-rate", type=float, default=0.0)
+    run.add_argument("--seed", type=int, default=None, help="Stub random seed")
+
+    outcomes = subparsers.add_parser("outcomes", help="Per-customer results from the interactions table")
+    outcomes.add_argument("--campaign", required=True)
+    outcomes.add_argument("--csv", help="Write customer_id,outcome rows to this file")
+    outcomes.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
+    export = subparsers.add_parser("export", help="Stream one outcome record per customer to CSV or Parquet")
+    export.add_argument("--campaign", required=True)
+    export.add_argument("--output", required=True, help="Output file (.csv or .parquet)")
+    export.add_argument("--format", choices=("csv", "parquet"), help="Default: from the --output extension")
+    export.add_argument("--summary", help="Also write the summary metrics to this JSON file")
+    export.add_argument("--batch-size", type=int, default=1000, help="Records per invoice lookup / row group")
+    args = parser.parse_args(argv)
+
+    from actions.storage import create_storage
+
+    if args.command == "run" and not 0 <= args.shard < args.shards:
+        parser.error("--shard must be between 0 and --shards - 1")
+
+    try:
+        storage = create_storage()
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        return 1
+
+    try:
+        if args.command == "run":
+            result = asyncio.run(run_command(args, storage))
+            print_run_report(result["stats"], result["elapsed"])
+            if args.stub:
+                print_outcomes(summarize_outcomes(collect_outcomes(storage, args.campaign)))
+            return 0 if result["stats"].failed == 0 else 1
+
+        if args.command == "export":
+            return export_command(args, storage)
+
+        customer_outcomes = collect_outcomes(storage, args.campaign)
+        counts = summarize_outcomes(customer_outcomes)
+        if args.json:
+            print(json.dumps(counts, indent=2))
+        else:
+            print_outcomes(counts)
+        if args.csv:
+            write_outcomes_csv(args.csv, customer_outcomes)
+        return 0
+    finally:
+        storage.pool.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
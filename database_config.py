@@ -2,6 +2,8 @@ import os
 import mysql.connector
 from mysql.connector import Error
 
+from migrate import migrate_up
+
 def create_database_and_tables():
     """Create database and tables for Verisure demo"""
     try:
@@ -19,48 +21,8 @@ def create_database_and_tables():
             cursor.execute("CREATE DATABASE IF NOT EXISTS verisure_demo")
             cursor.execute("USE verisure_demo")
             
-            # Create customers table
-            create_customers_table = """
-            CREATE TABLE IF NOT EXISTS customers (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                email VARCHAR(255),
-                phone VARCHAR(50),
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-            cursor.execute(create_customers_table)
-            
-            # Create invoices table
-            create_invoices_table = """
-            CREATE TABLE IF NOT EXISTS invoices (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                customer_id INT,
-                invoice_number VARCHAR(50) NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                issue_date DATE NOT NULL,
-                due_date DATE NOT NULL,
-                status ENUM('pending', 'paid', 'payment_scheduled', 'disputed') DEFAULT 'pending',
-                payment_date DATE NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (customer_id) REFERENCES customers(id)
-            )
-            """
-            cursor.execute(create_invoices_table)
-            
-            # Create interactions table
-            create_interactions_table = """
-            CREATE TABLE IF NOT EXISTS interactions (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                session_id VARCHAR(255),
-                customer_id INT,
-                interaction_type VARCHAR(100),
-                data TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (customer_id) REFERENCES customers(id)
-            )
-            """
-            cursor.execute(create_interactions_table)
+            # Create or upgrade tables through the versioned migrations
+            migrate_up(connection)
             
             # Insert demo data
             insert_demo_data(cursor)
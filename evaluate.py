@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of the actions' keyword classifiers against data/nlu.yml
+
+The actions do not use the NLU intent to decide; they run their own
+keyword rules (keywords.yml) on the message text. This script takes the
+labelled examples in the NLU training data, runs each classifier over the
+whole corpus in one batch and reports a confusion matrix, per-label
+precision/recall/F1 and throughput, so the rules can be tuned without
+going through ``rasa shell``.
+
+The batch path is a plain loop, not vectorized: it scans every distinct
+message once with KeywordMatcher.scan_many and applies each action's
+decision rule to the matched categories. Throughput is also measured for
+the per-message path the actions use at runtime. Examples of intents a
+classifier is not meant to handle are left out of its evaluation.
+
+It is also a gate: the exit status is 1 when a classifier's accuracy falls
+below its floor in MIN_ACCURACY (the accuracy the current keywords.yml
+reaches), so a keyword change that makes a classifier worse fails CI.
+Raise the floors when the keywords improve; --fail-under sets one floor
+for every classifier instead (0 makes the run a report only).
+
+Usage:
+    python evaluate.py
+    python evaluate.py --classifier reason --errors 20
+    python evaluate.py --json report.json --fail-under 0.9
+    python evaluate.py --fail-under 0          # report only
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import yaml
+
+DEFAULT_NLU_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "nlu.yml")
+
+# [text](entity), [text]{"entity": ...}
+_ANNOTATION = re.compile(r"\[([^\]]+)\](?:\([^)]*\)|\{[^}]*\})")
+
+NONE = "(none)"
+
+# Minimum accuracy per classifier on data/nlu.yml
+MIN_ACCURACY: Dict[str, float] = {
+    "identity": 0.65,
+    "payment_response": 0.95,
+    "reason": 0.55,
+}
+
+
+class Classifier(NamedTuple):
+    group: str  # keywords.yml group it reads
+    labels: Dict[str, str]  # intent -> expected label
+    decide: Callable  # matched categories -> label
+    single: Callable  # (action instances, text) -> label, the runtime path
+
+
+class Example(NamedTuple):
+    text: str
+    intent: str
+
+
+def load_examples(path: str) -> List[Example]:
+    """Every example in a Rasa NLU file, entity annotations stripped"""
+    with open(path, encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    examples = []
+    for block in data.get("nlu") or []:
+        intent = block.get("intent")
+        if not intent:
+            continue
+        for line in (block.get("examples") or "").splitlines():
+            line = line.strip()
+            if line.startswith("- "):
+                examples.append(Example(_ANNOTATION.sub(r"\1", line[2:].strip()), intent))
+    return examples
+
+
+def build_classifiers() -> Dict[str, Classifier]:
+    from actions.actions import ActionCheckIdentity, ActionClassifyReason, ActionHandlePaymentResponse
+
+    def payment_label(flags: Tuple[bool, bool, bool]) -> str:
+        # Same precedence as ActionHandlePaymentResponse.run
+        can_pay, cannot_pay, ask_date = flags
+        return "can_pay" if can_pay else "cannot_pay" if cannot_pay else "ask_date" if ask_date else NONE
+
+    return {
+        "identity": Classifier(
+            "identity", {"confirm_identity": "confirm", "deny_identity": "deny"},
+            lambda c: "confirm" if ActionCheckIdentity.identity_from_categories(c) else "deny",
+            lambda a, text: "confirm" if a["identity"].confirms_identity(text) else "deny"),
+        "payment_response": Classifier(
+            "payment_response", {"can_pay": "can_pay", "cannot_pay": "cannot_pay", "ask_invoice_date": "ask_date"},
+            lambda c: payment_label(ActionHandlePaymentResponse.payment_response_from_categories(c)),
+            lambda a, text: payment_label(a["payment_response"].classify_payment_response(text))),
+        "reason": Classifier(
+            "reason", {"financial_difficulty": "financial_difficulty", "payment_dispute": "payment_dispute"},
+            ActionClassifyReason.reason_from_categories,
+            lambda a, text: a["reason"].classify_reason(text)),
+    }
+
+
+def classify_batch(matcher, classifier: Classifier, texts: List[str]) -> List[str]:
+    decide, group = classifier.decide, classifier.group
+    return [decide(result.categories(group)) for result in matcher.scan_many(texts)]
+
+
+def throughput(func: Callable[[], object], count: int, min_time: float) -> float:
+    """Messages per second of ``func``, which classifies ``count`` messages"""
+    loops = 0
+    started = time.perf_counter()
+    while True:  # at least one pass, so --min-time 0 still measures
+        func()
+        loops += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return loops * count / elapsed
+
+
+def metrics(expected: List[str], predicted: List[str]) -> Dict:
+    labels = sorted(set(expected) | set(predicted), key=lambda label: (label == NONE or label == "other", label))
+    confusion = Counter(zip(expected, predicted))
+    per_label = {}
+    for label in labels:
+        tp = confusion[(label, label)]
+        predicted_count = sum(1 for p in predicted if p == label)
+        support = sum(1 for e in expected if e == label)
+        precision = tp / predicted_count if predicted_count else 0.0
+        recall = tp / support if support else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_label[label] = {"precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4),
+                            "support": support}
+    scored = [label for label in labels if per_label[label]["support"]]
+    return {
+        "examples": len(expected),
+        "accuracy": round(sum(e == p for e, p in zip(expected, predicted)) / len(expected), 4) if expected else 0.0,
+        "macro_f1": round(sum(per_label[label]["f1"] for label in scored) / len(scored), 4) if scored else 0.0,
+        "labels": labels,
+        "confusion": [[confusion[(e, p)] for p in labels] for e in labels],
+        "per_label": per_label,
+    }
+
+
+def evaluate(name: str, classifier: Classifier, examples: List[Example], matcher, actions: Dict,
+             min_time: float) -> Tuple[Dict, List[Tuple[Example, str]]]:
+    selected = [e for e in examples if e.intent in classifier.labels]
+    texts = [e.text for e in selected]
+    expected = [classifier.labels[e.intent] for e in selected]
+    predicted = classify_batch(matcher, classifier, texts)
+    result = metrics(expected, predicted)
+    if texts:
+        result["batch_msgs_per_s"] = round(throughput(lambda: classify_batch(matcher, classifier, texts),
+                                                      len(texts), min_time))
+        result["single_msgs_per_s"] = round(throughput(lambda: [classifier.single(actions, t) for t in texts],
+                                                       len(texts), min_time))
+    errors = [(e, p) for e, p, x in zip(selected, predicted, expected) if p != x]
+    return {"classifier": name, **result}, errors
+
+
+def print_report(result: Dict, errors: List[Tuple[Example, str]], show: int) -> None:
+    labels = result["labels"]
+    corner = "esperado \\ predicho"
+    width = max([len(corner)] + [len(label) for label in labels])
+    column = max(8, *(len(label) for label in labels))
+    print(f"\n== {result['classifier']} ==  ejemplos: {result['examples']}  exactitud: {result['accuracy']:.1%}  "
+          f"macro F1: {result['macro_f1']:.3f}")
+    if not result["examples"]:
+        return
+    print(f"{corner:<{width}} " + " ".join(f"{label:>{column}}" for label in labels))
+    for label, row in zip(labels, result["confusion"]):
+        print(f"{label:<{width}} " + " ".join(f"{count:>{column}}" for count in row))
+    print(f"\n{'etiqueta':<{width}} {'precisión':>10} {'recall':>8} {'F1':>7} {'soporte':>8}")
+    for label in labels:
+        stats = result["per_label"][label]
+        print(f"{label:<{width}} {stats['precision']:>10.3f} {stats['recall']:>8.3f} {stats['f1']:>7.3f} "
+              f"{stats['support']:>8}")
+    print(f"Rendimiento: {result['batch_msgs_per_s']:,} msg/s en lote, "
+          f"{result['single_msgs_per_s']:,} msg/s mensaje a mensaje")
+    for example, predicted in errors[:show]:
+        print(f"  ✗ {example.text!r}: {example.intent} -> {predicted}")
+    if len(errors) > show:
+        print(f"  ... y {len(errors) - show} errores más (--errors)")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate the actions' keyword classifiers against NLU examples")
+    parser.add_argument("--nlu", default=DEFAULT_NLU_PATH, help="Rasa NLU file with labelled examples")
+    parser.add_argument("--classifier", action="append", help="Only this classifier (repeatable)")
+    parser.add_argument("--errors", type=int, default=10, help="Misclassified examples to print per classifier")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds spent measuring each throughput")
+    parser.add_argument("--json", help="Also write the full report to this JSON file")
+    parser.add_argument("--fail-under", type=float, default=None,
+                        help="Exit with 1 if any classifier's accuracy is below this, instead of its "
+                             "MIN_ACCURACY floor (0 = report only)")
+    args = parser.parse_args(argv)
+
+    import logging
+
+    from actions.actions import ActionCheckIdentity, ActionClassifyReason, ActionHandlePaymentResponse
+    from actions.keyword_matcher import get_keyword_matcher
+
+    logging.getLogger("actions").setLevel(logging.ERROR)  # after the import configured it
+    classifiers = build_classifiers()
+    if args.classifier:
+        unknown = set(args.classifier) - set(classifiers)
+        if unknown:
+            print(f"Unknown classifier(s): {', '.join(sorted(unknown))}; available: {', '.join(classifiers)}")
+            return 2
+        classifiers = {name: c for name, c in classifiers.items() if name in args.classifier}
+    try:
+        examples = load_examples(args.nlu)
+    except (OSError, yaml.YAMLError) as e:
+        print(f"Could not read {args.nlu}: {e}")
+        return 1
+
+    matcher = get_keyword_matcher()
+    actions = {"identity": ActionCheckIdentity(), "payment_response": ActionHandlePaymentResponse(),
+               "reason": ActionClassifyReason()}
+    print(f"{len(examples)} ejemplos en {args.nlu}")
+    results = []
+    for name, classifier in classifiers.items():
+        result, errors = evaluate(name, classifier, examples, matcher, actions, args.min_time)
+        results.append(result)
+        print_report(result, errors, args.errors)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"nlu": args.nlu, "results": results}, f, indent=2, ensure_ascii=False)
+    failing = []
+    for r in results:
+        floor = args.fail_under if args.fail_under is not None else MIN_ACCURACY.get(r["classifier"], 0.0)
+        if r["accuracy"] < floor:
+            failing.append(f"{r['classifier']} ({r['accuracy']:.1%} < {floor:.0%})")
+    if failing:
+        print(f"\n❌ Exactitud bajo el mínimo: {', '.join(failing)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Bulk import of customers and invoices from a billing export
+
+Reads CSV or JSONL (optionally .gz) as a stream, validates each record and
+writes chunks with multi-row upserts: customers by ``id`` and invoices by
+``invoice_number``. Each chunk is one transaction, after which a checkpoint
+file records how many records are done, so an interrupted import resumes
+where it stopped. Invalid records are written to a rejects file instead of
+stopping the load. The target is the configured storage backend
+(DB_BACKEND / DB_* / SQLITE_PATH).
+
+Columns:
+    customers: id, name, email, phone
+    invoices:  invoice_number, customer_id, amount, issue_date, due_date, status
+
+Usage:
+    python import_data.py customers export/customers.csv
+    python import_data.py invoices export/invoices.jsonl.gz --chunk-size 5000
+    python import_data.py invoices export/invoices.csv --restart   # ignore the checkpoint
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+INVOICE_STATUSES = ("pending", "paid", "payment_scheduled", "disputed")
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+class RowError(ValueError):
+    """A record that cannot be imported"""
+
+
+def _text(row: Dict[str, Any], field: str, max_length: int, required: bool = False) -> Optional[str]:
+    value = row.get(field)
+    value = "" if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise RowError(f"{field} is required")
+        return None
+    if len(value) > max_length:
+        raise RowError(f"{field} longer than {max_length} characters")
+    return value
+
+
+def _positive_int(row: Dict[str, Any], field: str) -> int:
+    try:
+        value = int(str(row.get(field, "")).strip())
+    except ValueError:
+        raise RowError(f"{field} must be an integer")
+    if value <= 0:
+        raise RowError(f"{field} must be positive")
+    return value
+
+
+def _iso_date(row: Dict[str, Any], field: str) -> str:
+    value = str(row.get(field) or "").strip()
+    if not ISO_DATE.match(value):
+        raise RowError(f"{field} must be YYYY-MM-DD")
+    try:
+        time.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise RowError(f"{field} is not a valid date")
+    return value
+
+
+def validate_customer(row: Dict[str, Any]) -> Tuple:
+    email = _text(row, "email", 255)
+    if email is not None and "@" not in email:
+        raise RowError("email is not valid")
+    return (_positive_int(row, "id"), _text(row, "name", 255, required=True), email, _text(row, "phone", 50))
+
+
+def validate_invoice(row: Dict[str, Any]) -> Tuple:
+    try:
+        amount = Decimal(str(row.get("amount", "")).strip())
+    except InvalidOperation:
+        raise RowError("amount must be a number")
+    if not amount.is_finite() or amount < 0 or amount >= Decimal("100000000"):
+        raise RowError("amount must be between 0 and 99999999.99")  # DECIMAL(10,2)
+    issue_date = _iso_date(row, "issue_date")
+    due_date = _iso_date(row, "due_date")
+    if due_date < issue_date:
+        raise RowError("due_date is before issue_date")
+    status = _text(row, "status", 20) or "pending"
+    if status not in INVOICE_STATUSES:
+        raise RowError(f"status must be one of {', '.join(INVOICE_STATUSES)}")
+    return (
+        _text(row, "invoice_number", 50, required=True),
+        _positive_int(row, "customer_id"),
+        str(amount.quantize(Decimal("0.01"))),
+        issue_date,
+        due_date,
+        status,
+    )
+
+
+def is_row_error(error: Exception) -> bool:
+    """Errors caused by the data (e.g. unknown customer_id) rather than the database"""
+    return any(cls.__name__ in ("IntegrityError", "DataError") for cls in type(error).__mro__)
+
+
+KINDS: Dict[str, Tuple[Callable[[Dict[str, Any]], Tuple], str]] = {
+    "customers": (validate_customer, "upsert_customers"),
+    "invoices": (validate_invoice, "upsert_invoices"),
+}
+
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if name.endswith(".csv"):
+        return "csv"
+    raise ValueError(f"Cannot tell the format of {path}; use --format")
+
+
+def open_text(path: str) -> io.TextIOBase:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def read_records(f: io.TextIOBase, fmt: str) -> Iterator[Dict[str, Any]]:
+    """Yield one dict per record; unparseable JSON lines yield an __error__ marker"""
+    if fmt == "csv":
+        yield from csv.DictReader(f)
+        return
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"__error__": f"invalid JSON: {e}", "__raw__": line.rstrip("\n")}
+            continue
+        yield record if isinstance(record, dict) else {"__error__": "record is not an object", "__raw__": record}
+
+
+def checkpoint_key(path: str, kind: str) -> Dict[str, Any]:
+    st = os.stat(path)
+    return {"input": os.path.abspath(path), "kind": kind, "size": st.st_size, "mtime": st.st_mtime}
+
+
+def load_checkpoint(path: str, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The saved progress, if it belongs to this same input file"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if any(data.get(k) != v for k, v in key.items()):
+        return None
+    return data
+
+
+def save_checkpoint(path: str, data: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)  # atomic, so a crash never leaves a torn checkpoint
+
+
+class Importer:
+    """Validates and writes records chunk by chunk, tracking progress"""
+
+    def __init__(self, storage, kind: str, rejects: Optional[io.TextIOBase] = None,
+                 progress_interval: float = 5.0):
+        self.validate, method = KINDS[kind]
+        self.write = getattr(storage, method)
+        self.rejects = rejects
+        self.progress_interval = progress_interval
+        self.records = 0
+        self.loaded = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+        self._last_progress = self.started
+
+    def reject(self, record_number: int, error: str, row: Any) -> None:
+        self.rejected += 1
+        if self.rejects is not None:
+            self.rejects.write(json.dumps({"record": record_number, "error": error, "row": row},
+                                          ensure_ascii=False, default=str) + "\n")
+
+    def process_chunk(self, first_record: int, chunk: List[Dict[str, Any]]) -> None:
+        valid: List[Tuple[int, Tuple]] = []
+        for offset, row in enumerate(chunk):
+            number = first_record + offset
+            if "__error__" in row:
+                self.reject(number, row["__error__"], row.get("__raw__"))
+                continue
+            try:
+                valid.append((number, self.validate(row)))
+            except RowError as e:
+                self.reject(number, str(e), row)
+
+        self.write_isolating(valid)
+        self.records += len(chunk)
+        if self.rejects is not None:
+            self.rejects.flush()
+
+    def write_isolating(self, valid: List[Tuple[int, Tuple]]) -> None:
+        """Write rows; on a constraint violation bisect to reject only the bad ones"""
+        if not valid:
+            return
+        try:
+            self.write([value for _, value in valid])
+            self.loaded += len(valid)
+        except Exception as e:
+            if not is_row_error(e):
+                raise  # connection lost, lock timeout...: stop and resume later
+            if len(valid) == 1:
+                self.reject(valid[0][0], f"database: {e}", valid[0][1])
+                return
+            middle = len(valid) // 2
+            self.write_isolating(valid[:middle])
+            self.write_isolating(valid[middle:])
+
+    def throughput(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.records / elapsed if elapsed > 0 else 0.0
+
+    def maybe_report(self, done: int) -> None:
+        now = time.monotonic()
+        if now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            print(f"  {done:,} records | {self.loaded:,} loaded | {self.rejected:,} rejected | "
+                  f"{self.throughput():,.0f} records/s")
+
+
+def run_import(storage, kind: str, path: str, fmt: str, chunk_size: int, checkpoint_path: str,
+               restart: bool = False, rejects_path: Optional[str] = None,
+               progress_interval: float = 5.0) -> Importer:
+    key = checkpoint_key(path, kind)
+    state = None if restart else load_checkpoint(checkpoint_path, key)
+    skip = state["records"] if state else 0
+    if skip:
+        print(f"Resuming {path} after record {skip:,} (checkpoint {checkpoint_path})")
+
+    rejects = open(rejects_path, "a" if skip else "w", encoding="utf-8") if rejects_path else None
+    importer = Importer(storage, kind, rejects, progress_interval)
+    try:
+        with open_text(path) as f:
+            records = itertools.islice(read_records(f, fmt), skip, None)
+            done = skip
+            while True:
+                chunk = list(itertools.islice(records, chunk_size))
+                if not chunk:
+                    break
+                importer.process_chunk(done + 1, chunk)
+                done += len(chunk)
+                save_checkpoint(checkpoint_path, {
+                    **key,
+                    "records": done,
+                    "loaded": (state or {}).get("loaded", 0) + importer.loaded,
+                    "rejected": (state or {}).get("rejected", 0) + importer.rejected,
+                })
+                importer.maybe_report(done)
+    finally:
+        if rejects is not None:
+            rejects.close()
+            if not skip and importer.rejected == 0:
+                os.remove(rejects_path)
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return importer
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import customers or invoices from CSV/JSONL")
+    parser.add_argument("kind", choices=sorted(KINDS), help="What the file contains")
+    parser.add_argument("path", help="Input file (.csv, .jsonl, .ndjson, optionally .gz)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Override format detection")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Records per transaction")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <path>.<kind>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--rejects", help="Write rejected records here as JSONL (default: <path>.rejects.jsonl)")
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), help="Override DB_BACKEND")
+    parser.add_argument("--progress", type=float, default=5.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    from actions.storage import create_storage
+
+    try:
+        fmt = args.format or detect_format(args.path)
+    except ValueError as e:
+        print(e)
+        return 2
+    checkpoint_path = args.checkpoint or f"{args.path}.{args.kind}.checkpoint"
+    rejects_path = args.rejects or f"{args.path}.rejects.jsonl"
+
+    try:
+        storage = create_storage(args.backend, seed_demo=False)
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        return 1
+
+    try:
+        importer = run_import(storage, args.kind, args.path, fmt, args.chunk_size, checkpoint_path,
+                              restart=args.restart, rejects_path=rejects_path,
+                              progress_interval=args.progress)
+    except KeyboardInterrupt:
+        print(f"Interrupted; progress is saved in {checkpoint_path}, run the same command again to resume")
+        return 130
+    except Exception as e:
+        print(f"Import failed: {e}")
+        print(f"Progress is saved in {checkpoint_path}; run the same command again to resume")
+        return 1
+    finally:
+        storage.pool.dispose()
+
+    elapsed = time.monotonic() - importer.started
+    print(f"{importer.records:,} records in {elapsed:.1f}s ({importer.throughput():,.0f} records/s): "
+          f"{importer.loaded:,} loaded, {importer.rejected:,} rejected")
+    if importer.rejected:
+        print(f"Rejected records: {rejects_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
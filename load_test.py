@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Load test for Verisure Rasa Demo
+
+Runs many concurrent simulated conversations against the Rasa REST webhook
+and reports turn latency percentiles, throughput and error rate.
+
+Usage:
+    python load_test.py --conversations 200 --concurrency 50 --rate 20
+    python load_test.py --stub --conversations 500   # offline, local stub bot
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+FLOWS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "flows.yml")
+WEBHOOK_PATH = "/webhooks/rest/webhook"
+
+
+@dataclass
+class Scenario:
+    name: str
+    flows: List[str]
+    messages: List[str]
+
+
+# Conversation paths through data/flows.yml; each message is one user turn
+SCENARIOS: Dict[str, Scenario] = {
+    "pay_tomorrow": Scenario(
+        "pay_tomorrow",
+        ["verisure_billing_flow", "confirm_identity_flow", "can_pay_flow"],
+        ["hola", "sí", "puedo pagar", "mañana"],
+    ),
+    "cannot_pay": Scenario(
+        "cannot_pay",
+        ["verisure_billing_flow", "confirm_identity_flow", "cannot_pay_flow", "financial_difficulty_flow"],
+        ["hola", "sí", "no puedo pagar", "estoy cesante"],
+    ),
+    "dispute": Scenario(
+        "dispute",
+        ["verisure_billing_flow", "confirm_identity_flow", "cannot_pay_flow", "payment_dispute_flow"],
+        ["hola", "sí", "no puedo pagar", "ya pagué"],
+    ),
+    "wrong_person": Scenario(
+        "wrong_person",
+        ["verisure_billing_flow", "deny_identity_flow"],
+        ["hola", "no, no soy yo"],
+    ),
+}
+
+DEFAULT_MIX = {"pay_tomorrow": 4, "cannot_pay": 2, "dispute": 2, "wrong_person": 1}
+
+
+@dataclass
+class Results:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    turns: int = 0
+    conversations: Dict[str, int] = field(default_factory=dict)
+    failed_conversations: int = 0
+
+
+def validate_scenarios(flows_path: str = FLOWS_PATH) -> None:
+    """Fail early if a scenario references a flow that no longer exists"""
+    with open(flows_path, encoding="utf-8") as f:
+        known = set((yaml.safe_load(f) or {}).get("flows", {}))
+    for scenario in SCENARIOS.values():
+        missing = [flow for flow in scenario.flows if flow not in known]
+        if missing:
+            raise ValueError(f"Scenario {scenario.name} references unknown flows: {missing}")
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse 'pay_tomorrow=4,dispute=1' into scenario weights"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}; choose from {sorted(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_conversation(session, url: str, scenario: Scenario, sender: str, think_time: float,
+                           timeout: float, results: Results) -> None:
+    import aiohttp
+
+    failed = False
+    for message in scenario.messages:
+        start = time.perf_counter()
+        try:
+            async with session.post(url, json={"sender": sender, "message": message},
+                                    timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                await response.read()
+                ok = response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+        results.latencies.append(time.perf_counter() - start)
+        results.turns += 1
+        if not ok:
+            results.errors += 1
+            failed = True
+            break
+        if think_time:
+            await asyncio.sleep(random.expovariate(1.0 / think_time))
+    results.conversations[scenario.name] = results.conversations.get(scenario.name, 0) + 1
+    if failed:
+        results.failed_conversations += 1
+
+
+async def run_load(url: str, conversations: int, concurrency: int, rate: Optional[float],
+                   mix: Dict[str, float], think_time: float, timeout: float, seed: Optional[int]) -> Tuple[Results, float]:
+    """Launch conversations with Poisson arrivals at ``rate``/s (or all at once)"""
+    import aiohttp
+
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = Results()
+    semaphore = asyncio.Semaphore(concurrency)
+    run_id = f"{int(time.time())}-{os.getpid()}"
+
+    async def limited(session, index: int, scenario: Scenario) -> None:
+        async with semaphore:
+            await run_conversation(session, url, scenario, f"load_{run_id}_{index}", think_time, timeout, results)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = []
+        start = time.perf_counter()
+        for index in range(conversations):
+            scenario = SCENARIOS[rng.choices(names, weights)[0]]
+            tasks.append(asyncio.create_task(limited(session, index, scenario)))
+            if rate:
+                await asyncio.sleep(rng.expovariate(rate))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+async def start_stub_server(port: int, latency: float, error_rate: float):
+    """Minimal stand-in for the Rasa REST channel, for offline runs"""
+    from aiohttp import web
+
+    async def webhook(request):
+        payload = await request.json()
+        if latency:
+            await asyncio.sleep(random.expovariate(1.0 / latency))
+        if error_rate and random.random() < error_rate:
+            return web.json_response({"error": "stub failure"}, status=500)
+        return web.json_response([{"recipient_id": payload.get("sender"), "text": "ok"}])
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    return runner
+
+
+def build_report(results: Results, elapsed: float) -> Dict:
+    latencies = sorted(results.latencies)
+    return {
+        "conversations": sum(results.conversations.values()),
+        "failed_conversations": results.failed_conversations,
+        "scenarios": results.conversations,
+        "turns": results.turns,
+        "errors": results.errors,
+        "error_rate": results.errors / results.turns if results.turns else 0.0,
+        "elapsed_s": elapsed,
+        "throughput_turns_per_s": results.turns / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": (latencies[-1] if latencies else 0.0) * 1000,
+        },
+    }
+
+
+def print_report(report: Dict) -> None:
+    print("=" * 50)
+    print(f"Conversaciones: {report['conversations']} ({report['failed_conversations']} con error)")
+    for name, count in sorted(report["scenarios"].items()):
+        print(f"  {name}: {count}")
+    print(f"Turnos: {report['turns']}  Errores: {report['errors']} ({report['error_rate']:.2%})")
+    print(f"Duración: {report['elapsed_s']:.2f}s  Throughput: {report['throughput_turns_per_s']:.1f} turnos/s")
+    latency = report["latency_ms"]
+    print(f"Latencia por turno (ms): p50={latency['p50']:.1f} p95={latency['p95']:.1f} "
+          f"p99={latency['p99']:.1f} max={latency['max']:.1f}")
+
+
+async def main_async(args) -> Dict:
+    runner = None
+    url = args.url
+    if args.stub:
+        runner = await start_stub_server(args.stub_port, args.stub_latency, args.stub_error_rate)
+        url = f"http://127.0.0.1:{args.stub_port}{WEBHOOK_PATH}"
+    try:
+        results, elapsed = await run_load(url, args.conversations, args.concurrency, args.rate,
+                                          args.mix, args.think_time, args.timeout, args.seed)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    return build_report(results, elapsed)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent load test for the Rasa REST webhook")
+    parser.add_argument("--url", default=f"http://localhost:5005{WEBHOOK_PATH}", help="Bot webhook URL")
+    parser.add_argument("--conversations", type=int, default=100, help="Total conversations to run")
+    parser.add_argument("--concurrency", type=int, default=20, help="Max conversations in flight")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="New conversations per second (Poisson); default starts all at once")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Scenario weights, e.g. pay_tomorrow=4,cannot_pay=2,dispute=2,wrong_person=1")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds between user turns")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-turn request timeout")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for a reproducible mix")
+    parser.add_argument("--stub", action="store_true", help="Run against a local stub bot instead of --url")
+    parser.add_argument("--stub-port", type=int, default=5099)
+    parser.add_argument("--stub-latency", type=float, default=0.01, help="Mean stub response time (s)")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    validate_scenarios()
+    report = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0 if report["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for Verisure Rasa Demo
+
+Migrations live in migrations/ as NNNN_name.up.sql / NNNN_name.down.sql
+pairs. Applied versions are recorded in the schema_migrations table.
+
+Usage:
+    python migrate.py status
+    python migrate.py up [--to VERSION]
+    python migrate.py down [--to VERSION | --steps N]
+"""
+
+import argparse
+import os
+import re
+import sys
+from typing import Dict, List, NamedTuple, Set
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.(up|down)\.sql$")
+
+CREATE_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    up_path: str
+    down_path: str
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Discover migration files, sorted by version"""
+    found: Dict[int, Dict[str, str]] = {}
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version, name, direction = int(match.group(1)), match.group(2), match.group(3)
+        entry = found.setdefault(version, {"name": name})
+        if entry["name"] != name:
+            raise ValueError(f"Conflicting names for migration {version}: {entry['name']} / {name}")
+        entry[direction] = os.path.join(directory, filename)
+
+    migrations = []
+    for version in sorted(found):
+        entry = found[version]
+        if "up" not in entry or "down" not in entry:
+            raise ValueError(f"Migration {version}_{entry['name']} needs both .up.sql and .down.sql")
+        migrations.append(Migration(version, entry["name"], entry["up"], entry["down"]))
+    return migrations
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a script into statements, ignoring full-line -- comments"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def get_connection():
+    """Connect to the configured database"""
+    import mysql.connector
+
+    return mysql.connector.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', ''),
+        database=os.getenv('DB_NAME', 'verisure_demo')
+    )
+
+
+def applied_versions(cursor) -> Set[int]:
+    cursor.execute(CREATE_VERSION_TABLE)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def run_script(cursor, path: str) -> None:
+    with open(path, encoding="utf-8") as f:
+        for statement in split_statements(f.read()):
+            cursor.execute(statement)
+
+
+def migrate_up(connection, target: int = None, migrations: List[Migration] = None) -> List[Migration]:
+    """Apply pending migrations up to ``target`` (default: latest)"""
+    migrations = migrations if migrations is not None else load_migrations()
+    cursor = connection.cursor()
+    done = applied_versions(cursor)
+    applied = []
+    for migration in migrations:
+        if migration.version in done or (target is not None and migration.version > target):
+            continue
+        print(f"Applying {migration.version:04d}_{migration.name}...")
+        run_script(cursor, migration.up_path)
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+            (migration.version, migration.name),
+        )
+        connection.commit()
+        applied.append(migration)
+    cursor.close()
+    return applied
+
+
+def migrate_down(connection, target: int = None, steps: int = None, migrations: List[Migration] = None) -> List[Migration]:
+    """Revert applied migrations down to ``target`` (exclusive) or by ``steps``"""
+    migrations = migrations if migrations is not None else load_migrations()
+    cursor = connection.cursor()
+    done = applied_versions(cursor)
+    candidates = [m for m in reversed(migrations) if m.version in done]
+    if target is not None:
+        candidates = [m for m in candidates if m.version > target]
+    elif steps is not None:
+        candidates = candidates[:steps]
+    else:
+        candidates = candidates[:1]
+
+    reverted = []
+    for migration in candidates:
+        print(f"Reverting {migration.version:04d}_{migration.name}...")
+        run_script(cursor, migration.down_path)
+        cursor.execute("DELETE FROM schema_migrations WHERE version = %s", (migration.version,))
+        connection.commit()
+        reverted.append(migration)
+    cursor.close()
+    return reverted
+
+
+def print_status(connection) -> None:
+    cursor = connection.cursor()
+    done = applied_versions(cursor)
+    cursor.close()
+    for migration in load_migrations():
+        state = "applied" if migration.version in done else "pending"
+        print(f"{migration.version:04d}_{migration.name}: {state}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Apply or revert schema migrations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="List migrations and whether they are applied")
+    up = subparsers.add_parser("up", help="Apply pending migrations")
+    up.add_argument("--to", type=int, help="Highest version to apply")
+    down = subparsers.add_parser("down", help="Revert applied migrations (default: the latest one)")
+    group = down.add_mutually_exclusive_group()
+    group.add_argument("--to", type=int, help="Revert every migration above this version")
+    group.add_argument("--steps", type=int, help="Number of migrations to revert")
+    args = parser.parse_args(argv)
+
+    try:
+        connection = get_connection()
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        return 1
+
+    try:
+        if args.command == "status":
+            print_status(connection)
+        elif args.command == "up":
+            applied = migrate_up(connection, target=args.to)
+            print(f"{len(applied)} migration(s) applied")
+        else:
+            reverted = migrate_down(connection, target=args.to, steps=args.steps)
+            print(f"{len(reverted)} migration(s) reverted")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return 1
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
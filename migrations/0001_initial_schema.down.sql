@@ -0,0 +1,3 @@
+DROP TABLE IF EXISTS interactions;
+DROP TABLE IF EXISTS invoices;
+DROP TABLE IF EXISTS customers;
@@ -0,0 +1,8 @@
+DROP INDEX idx_interactions_session_timestamp ON interactions;
+
+-- The composite index may have replaced the implicit foreign key index on
+-- invoices.customer_id, so recreate a plain one before dropping it.
+CREATE INDEX idx_invoices_customer_id ON invoices (customer_id);
+DROP INDEX idx_invoices_customer_status_payment ON invoices;
+
+DROP INDEX idx_customers_name ON customers;
@@ -0,0 +1,6 @@
+-- Indexes for the columns every action query filters on
+CREATE INDEX idx_customers_name ON customers (name);
+
+CREATE INDEX idx_invoices_customer_status_payment ON invoices (customer_id, status, payment_date);
+
+CREATE INDEX idx_interactions_session_timestamp ON interactions (session_id, timestamp);
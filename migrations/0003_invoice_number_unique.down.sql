@@ -0,0 +1 @@
+DROP INDEX idx_invoices_invoice_number ON invoices;
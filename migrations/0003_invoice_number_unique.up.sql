@@ -0,0 +1,7 @@
+-- Billing exports identify invoices by number; bulk imports upsert on it.
+-- Earlier setups re-ran the demo seed (INSERT IGNORE without a unique key),
+-- leaving copies of the same invoice number: keep the lowest id of each.
+DELETE duplicate FROM invoices duplicate
+JOIN invoices kept ON kept.invoice_number = duplicate.invoice_number AND kept.id < duplicate.id;
+
+CREATE UNIQUE INDEX idx_invoices_invoice_number ON invoices (invoice_number);
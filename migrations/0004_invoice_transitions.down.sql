@@ -0,0 +1,3 @@
+DROP TABLE IF EXISTS invoice_audit;
+
+DROP TABLE IF EXISTS invoice_transitions;
@@ -0,0 +1,22 @@
+-- Invoice state machine: one row per applied transition (idempotency key)
+-- and one audit row per invoice that changed status
+CREATE TABLE IF NOT EXISTS invoice_transitions (
+    idempotency_key VARCHAR(191) PRIMARY KEY,
+    customer_id INT NOT NULL,
+    to_status VARCHAR(20) NOT NULL,
+    invoice_ids TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS invoice_audit (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    invoice_id INT NOT NULL,
+    customer_id INT NOT NULL,
+    from_status VARCHAR(20) NOT NULL,
+    to_status VARCHAR(20) NOT NULL,
+    payment_date DATE NULL,
+    idempotency_key VARCHAR(191) NOT NULL,
+    session_id VARCHAR(255),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_invoice_audit_invoice (invoice_id, created_at)
+);
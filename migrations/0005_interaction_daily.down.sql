@@ -0,0 +1,3 @@
+DROP INDEX idx_interactions_timestamp ON interactions;
+
+DROP TABLE IF EXISTS interaction_daily;
@@ -0,0 +1,12 @@
+-- Daily per-type aggregates of the raw interactions compacted by retention.py,
+-- and the index the retention job scans raw interactions by
+CREATE TABLE IF NOT EXISTS interaction_daily (
+    day DATE NOT NULL,
+    interaction_type VARCHAR(100) NOT NULL,
+    events INT NOT NULL,
+    sessions INT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (day, interaction_type)
+);
+
+CREATE INDEX idx_interactions_timestamp ON interactions (timestamp);
@@ -0,0 +1,9 @@
+ALTER TABLE interactions REMOVE PARTITIONING;
+
+ALTER TABLE interactions
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id),
+    MODIFY timestamp DATETIME DEFAULT CURRENT_TIMESTAMP;
+
+ALTER TABLE interactions
+    ADD CONSTRAINT interactions_ibfk_1 FOREIGN KEY (customer_id) REFERENCES customers(id);
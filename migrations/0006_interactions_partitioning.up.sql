@@ -0,0 +1,26 @@
+-- Monthly RANGE partitions on timestamp so retention.py drops old months
+-- instead of deleting rows. MySQL requires the partitioning column in every
+-- unique key and does not support foreign keys on partitioned tables.
+-- Rebuilds the table: run it in a maintenance window on large tables.
+-- retention.py splits pmax into monthly partitions ahead of time.
+-- The foreign key name is looked up: it is only interactions_ibfk_1 when
+-- 0001 created the table.
+SET @fk = (SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+           WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'interactions'
+           AND REFERENCED_TABLE_NAME = 'customers' LIMIT 1);
+SET @drop_fk = IF(@fk IS NULL, 'DO 0', CONCAT('ALTER TABLE interactions DROP FOREIGN KEY `', @fk, '`'));
+PREPARE drop_fk FROM @drop_fk;
+EXECUTE drop_fk;
+DEALLOCATE PREPARE drop_fk;
+
+UPDATE interactions SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL;
+
+ALTER TABLE interactions
+    MODIFY timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, timestamp);
+
+ALTER TABLE interactions PARTITION BY RANGE COLUMNS (timestamp) (
+    PARTITION p_old VALUES LESS THAN ('2025-01-01'),
+    PARTITION pmax VALUES LESS THAN (MAXVALUE)
+);
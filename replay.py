@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Replay recorded conversations against the current actions
+
+Streams the ``action_run`` interactions the action server records for the
+action runs (INTERACTION_LOG_TURNS, see actions/replay.py) in pages by id, rebuilds each turn's
+tracker (message, intent, entities, slots) and runs the current code of
+the same action offline, with relative dates resolved against the day the
+turn was recorded. Reports which turns now produce different slots, events
+or responses, and the recorded vs. replayed time per action.
+
+The actions run against a separate SQLite database (seeded with demo data
+unless --target points to a copy of production) and their own interaction
+logging is discarded, so the source database is only read. Slots that
+depend on data (e.g. pending_invoice_count) only match when the target has
+the same data; use --ignore-slot otherwise.
+
+Usage:
+    python replay.py                                  # every recorded turn
+    python replay.py --session-prefix campaign-2025-06-a --limit 5000
+    python replay.py --diffs diffs.jsonl --fail-on-diff --ignore-slot pending_invoice_count
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+
+@dataclass
+class ActionTiming:
+    turns: int = 0
+    diffs: int = 0
+    errors: int = 0
+    recorded_ms: List[float] = field(default_factory=list)
+    replayed_ms: List[float] = field(default_factory=list)
+
+
+@dataclass
+class ReplayStats:
+    turns: int = 0
+    unreadable: int = 0
+    unknown_action: int = 0
+    with_diffs: int = 0
+    errors: int = 0
+    last_id: int = 0
+    sessions: Set[str] = field(default_factory=set)
+    actions: Dict[str, ActionTiming] = field(default_factory=lambda: defaultdict(ActionTiming))
+
+
+class DiscardingLogger:
+    """Stands in for the interaction logger so replayed actions write nothing"""
+
+    def __init__(self):
+        self.discarded = 0
+
+    def log(self, session_id, interaction_type, data=None) -> bool:
+        self.discarded += 1
+        return True
+
+    def stop(self, timeout: float = 10.0) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"discarded": self.discarded}
+
+
+def load_actions() -> Dict[str, Any]:
+    """Instances of every Action defined in actions/actions.py, by name"""
+    from rasa_sdk import Action
+
+    from actions import actions as module
+
+    registry = {}
+    for _, cls in inspect.getmembers(module, inspect.isclass):
+        if issubclass(cls, Action) and cls is not Action and cls.__module__ == module.__name__:
+            action = cls()
+            registry[action.name()] = action
+    return registry
+
+
+def iter_turn_rows(storage, session_prefix: str, after_id: int = 0,
+                   page_size: int = 5000) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """Stream (id, session_id, data) of recorded turns, one page per query"""
+    from actions.replay import TURN_TYPE
+
+    while True:
+        page = storage.interactions_page(session_prefix, after_id, page_size, interaction_type=TURN_TYPE)
+        if not page:
+            return
+        for row_id, session_id, _, data in page:
+            yield row_id, session_id, data
+        after_id = page[-1][0]
+
+
+def setup_target(path: Optional[str]) -> None:
+    """Point the actions at the replay database, away from the source"""
+    from actions.interaction_logger import set_interaction_logger
+    from actions.storage import SQLiteStorage, set_storage
+
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="replay-"), "replay.sqlite3")
+    storage = SQLiteStorage(path)
+    if storage.is_empty():
+        storage.seed(customers=1000, invoices_per_customer=3)
+    set_storage(storage)
+    set_interaction_logger(DiscardingLogger())
+
+
+async def replay(source, registry: Dict[str, Any], args, diffs_file=None) -> ReplayStats:
+    from actions.replay import diff_turn, parse_turn, replay_turn
+
+    if args.action:
+        unknown = set(args.action) - set(registry)
+        if unknown:
+            raise ValueError(f"Unknown action(s): {', '.join(sorted(unknown))}")
+    stats = ReplayStats(last_id=args.after_id)
+    shown = 0
+    for row_id, session_id, data in iter_turn_rows(source, args.session_prefix, args.after_id, args.page_size):
+        stats.last_id = row_id
+        turn = parse_turn(row_id, session_id, data)
+        if turn is None:
+            stats.unreadable += 1
+            continue
+        if args.action and turn.action not in args.action:
+            continue
+        action = registry.get(turn.action)
+        if action is None:
+            stats.unknown_action += 1
+            continue
+
+        timing = stats.actions[turn.action]
+        stats.turns += 1
+        timing.turns += 1
+        stats.sessions.add(session_id)
+        try:
+            events, messages, elapsed = await replay_turn(action, turn)
+            diffs = diff_turn(turn, events, messages, args.ignore_slot)
+        except Exception as e:
+            stats.errors += 1
+            timing.errors += 1
+            diffs, elapsed = [f"raised {type(e).__name__}: {e}"], 0.0
+        else:
+            timing.recorded_ms.append(turn.ms)
+            timing.replayed_ms.append(elapsed * 1000)
+
+        if diffs:
+            stats.with_diffs += 1
+            timing.diffs += 1
+            if diffs_file is not None:
+                diffs_file.write(json.dumps({"id": row_id, "session_id": session_id, "action": turn.action,
+                                             "text": turn.text, "diffs": diffs}, ensure_ascii=False) + "\n")
+            if shown < args.show:
+                shown += 1
+                print(f"#{row_id} {session_id} {turn.action} {turn.text!r}")
+                for line in diffs:
+                    print(f"    {line}")
+        if args.limit and stats.turns >= args.limit:
+            break
+    return stats
+
+
+def print_report(stats: ReplayStats, elapsed: float) -> None:
+    from load_test import percentile
+
+    print("=" * 50)
+    print(f"Turnos reproducidos: {stats.turns} en {len(stats.sessions)} conversaciones "
+          f"({stats.turns / elapsed if elapsed else 0:.0f} turnos/s)")
+    print(f"Con diferencias: {stats.with_diffs} ({stats.with_diffs / stats.turns if stats.turns else 0:.1%})  "
+          f"Errores: {stats.errors}  Ilegibles: {stats.unreadable}  Acción desconocida: {stats.unknown_action}")
+    print(f"Último id: {stats.last_id} (continuar con --after-id {stats.last_id})")
+    if not stats.actions:
+        return
+    print(f"\n{'acción':<36} {'turnos':>7} {'diffs':>6} {'grabado p50/p95 ms':>20} {'replay p50/p95 ms':>20}")
+    for name, timing in sorted(stats.actions.items()):
+        recorded = sorted(timing.recorded_ms)
+        replayed = sorted(timing.replayed_ms)
+        print(f"{name:<36} {timing.turns:>7} {timing.diffs:>6} "
+              f"{percentile(recorded, 50):>9.2f}/{percentile(recorded, 95):<10.2f} "
+              f"{percentile(replayed, 50):>9.2f}/{percentile(replayed, 95):<10.2f}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded action turns against the current actions")
+    parser.add_argument("--session-prefix", default="", help="Only sessions whose id starts with this")
+    parser.add_argument("--action", action="append", help="Only this action (repeatable)")
+    parser.add_argument("--after-id", type=int, default=0, help="Start after this interactions id")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many turns (0 = all)")
+    parser.add_argument("--page-size", type=int, default=5000, help="Rows read per query")
+    parser.add_argument("--ignore-slot", action="append", default=[], help="Do not compare this slot (repeatable)")
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), help="Source of the recorded turns (DB_BACKEND)")
+    parser.add_argument("--target", help="SQLite file the actions run against (default: a fresh seeded file)")
+    parser.add_argument("--diffs", help="Write every turn with differences here as JSONL")
+    parser.add_argument("--show", type=int, default=20, help="Turns with differences to print")
+    parser.add_argument("--fail-on-diff", action="store_true", help="Exit with 1 if any turn differs")
+    args = parser.parse_args(argv)
+
+    import logging
+
+    from actions.storage import create_storage
+
+    try:
+        source = create_storage(args.backend, seed_demo=False)
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        return 1
+    setup_target(args.target)
+    registry = load_actions()
+    logging.getLogger("actions").setLevel(logging.ERROR)  # after the import configured it
+
+    diffs_file = open(args.diffs, "w", encoding="utf-8") if args.diffs else None
+    started = time.perf_counter()
+    try:
+        stats = asyncio.run(replay(source, registry, args, diffs_file))
+    except ValueError as e:
+        print(e)
+        return 2
+    finally:
+        if diffs_file is not None:
+            diffs_file.close()
+        source.pool.dispose()
+    print_report(stats, time.perf_counter() - started)
+    if args.fail_on_diff and (stats.with_diffs or stats.errors):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
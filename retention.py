@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Retention for the interactions table
+
+Raw interactions older than their retention window are compacted, one day
+and interaction type at a time:
+
+1. rolled up into interaction_daily (events and distinct sessions),
+2. archived to <archive-dir>/YYYY-MM-DD/<type>.jsonl.gz,
+3. deleted in short batches (on MySQL, whole monthly partitions past every
+   window are dropped instead, see migration 0006).
+
+Every step is idempotent: a day already rolled up keeps its totals and an
+existing archive file is not rewritten, so an interrupted run is resumed by
+running it again. On MySQL the job also creates next months' partitions
+ahead of time. Rollups older than their own window are deleted.
+
+Windows (days) come from INTERACTIONS_RETENTION_DAYS, per-type overrides
+from INTERACTIONS_TYPE_RETENTION (e.g. "action_run=14,campaign_triggered=365")
+and INTERACTIONS_ROLLUP_RETENTION_DAYS (0 keeps rollups forever).
+
+Usage:
+    python retention.py run                 # run daily, e.g. from cron
+    python retention.py run --dry-run
+    python retention.py status
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+ROLLUP_CHUNK = 1000
+
+
+class Window(NamedTuple):
+    cutoff: date  # rows before this day are past retention
+    types: Optional[Tuple[str, ...]]  # None = every type without an override
+    exclude: Tuple[str, ...]
+
+
+def parse_type_retention(value: str) -> Dict[str, int]:
+    """'action_run=14,campaign_triggered=365' -> {'action_run': 14, ...}"""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, sep, days = item.partition("=")
+        if not sep or not days.strip().isdigit():
+            raise ValueError(f"Invalid retention override {item!r}; expected type=days")
+        overrides[name.strip()] = int(days)
+    return overrides
+
+
+def retention_windows(today: date, default_days: int, overrides: Dict[str, int]) -> List[Window]:
+    windows = [Window(today - timedelta(days=days), (name,), ()) for name, days in sorted(overrides.items())]
+    windows.append(Window(today - timedelta(days=default_days), None, tuple(sorted(overrides))))
+    return windows
+
+
+def archive_path(directory: str, day: date, interaction_type: str) -> str:
+    safe_type = re.sub(r"[^\w.-]", "_", interaction_type)
+    return os.path.join(directory, day.isoformat(), f"{safe_type}.jsonl.gz")
+
+
+def archive_group(storage, directory: str, day: date, interaction_type: str, page_size: int) -> Optional[int]:
+    """Write the day's rows of one type to compressed JSONL; None if already archived"""
+    path = archive_path(directory, day, interaction_type)
+    if os.path.exists(path):
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    written = 0
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for batch in storage.iter_interactions_of_day(day, interaction_type, page_size):
+            for row_id, session_id, customer_id, kind, data, timestamp in batch:
+                f.write(json.dumps({"id": row_id, "session_id": session_id, "customer_id": customer_id,
+                                    "interaction_type": kind, "data": data, "timestamp": timestamp},
+                                   ensure_ascii=False, default=str) + "\n")
+            written += len(batch)
+    os.replace(tmp, path)  # atomic, so a partial archive is never mistaken for a finished one
+    return written
+
+
+class RetentionStats:
+    def __init__(self):
+        self.groups = 0
+        self.rows = 0
+        self.rolled_up = 0
+        self.archived_files = 0
+        self.archived_rows = 0
+        self.deleted = 0
+        self.partitions_added: List[str] = []
+        self.partitions_dropped: List[str] = []
+        self.rollups_deleted = 0
+
+
+def run_retention(storage, today: date, default_days: int, overrides: Dict[str, int], rollup_days: int,
+                  archive_dir: Optional[str], batch_size: int = 5000, months_ahead: int = 2,
+                  dry_run: bool = False) -> RetentionStats:
+    stats = RetentionStats()
+    windows = retention_windows(today, default_days, overrides)
+
+    ahead = today
+    for _ in range(months_ahead):
+        ahead = (ahead.replace(day=1) + timedelta(days=32)).replace(day=1)
+    if not dry_run:
+        stats.partitions_added = storage.add_interaction_partitions(ahead)
+
+    groups = []
+    for window in windows:
+        groups.extend(storage.interaction_groups(window.cutoff, window.types, window.exclude))
+    stats.groups = len(groups)
+    stats.rows = sum(events for _, _, events, _ in groups)
+    if dry_run:
+        return stats
+
+    for start in range(0, len(groups), ROLLUP_CHUNK):
+        stats.rolled_up += storage.add_interaction_rollups(groups[start:start + ROLLUP_CHUNK])
+
+    if archive_dir:
+        for day, interaction_type, _, _ in groups:
+            written = archive_group(storage, archive_dir, day, interaction_type, batch_size)
+            if written is not None:
+                stats.archived_files += 1
+                stats.archived_rows += written
+
+    # Whole months past the longest window go at once; the rest row by row
+    stats.partitions_dropped = storage.drop_interaction_partitions(min(w.cutoff for w in windows))
+    for day, interaction_type, _, _ in groups:
+        while True:
+            deleted = storage.delete_interactions_of_day(day, interaction_type, batch_size)
+            stats.deleted += deleted
+            if deleted < batch_size:
+                break
+
+    if rollup_days > 0:
+        stats.rollups_deleted = storage.delete_rollups_before(today - timedelta(days=rollup_days))
+    return stats
+
+
+def print_status(storage) -> None:
+    extent = storage.interaction_extent()
+    print(f"Raw interactions: {extent['oldest'] or '-'} .. {extent['newest'] or '-'}")
+    print(f"Daily rollups:    {extent['rollup_first_day'] or '-'} .. {extent['rollup_last_day'] or '-'} "
+          f"({extent['rollup_rows']} rows)")
+    partitions = storage.interaction_partitions()
+    if not partitions:
+        print("Partitions:       none")
+        return
+    print("Partitions:")
+    for name, bound in partitions:
+        print(f"  {name:<12} < {bound.isoformat() if bound else 'MAXVALUE'}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Roll up, archive and delete old interactions")
+    parser.add_argument("command", choices=("run", "status"))
+    parser.add_argument("--days", type=int, default=int(os.getenv("INTERACTIONS_RETENTION_DAYS", "90")),
+                        help="Days raw interactions are kept")
+    parser.add_argument("--type-days", default=os.getenv("INTERACTIONS_TYPE_RETENTION", ""),
+                        help="Per-type windows, e.g. action_run=14,campaign_triggered=365")
+    parser.add_argument("--rollup-days", type=int,
+                        default=int(os.getenv("INTERACTIONS_ROLLUP_RETENTION_DAYS", "730")),
+                        help="Days daily rollups are kept (0 = forever)")
+    parser.add_argument("--archive-dir", default=os.getenv("INTERACTIONS_ARCHIVE_DIR", "archive/interactions"),
+                        help="Where compressed JSONL archives are written ('' = do not archive)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per read page and delete batch")
+    parser.add_argument("--months-ahead", type=int, default=2, help="Monthly partitions to create in advance")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be compacted")
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), help="Override DB_BACKEND")
+    args = parser.parse_args(argv)
+
+    from actions.storage import create_storage
+
+    try:
+        overrides = parse_type_retention(args.type_days)
+    except ValueError as e:
+        print(e)
+        return 2
+    try:
+        storage = create_storage(args.backend, seed_demo=False)
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        return 1
+
+    try:
+        if args.command == "status":
+            print_status(storage)
+            return 0
+        started = time.monotonic()
+        stats = run_retention(storage, date.today(), args.days, overrides, args.rollup_days,
+                              args.archive_dir or None, args.batch_size, args.months_ahead, args.dry_run)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to finish")
+        return 130
+    except Exception as e:
+        print(f"Retention failed: {e}")
+        print("Completed steps are kept; run the same command again to finish")
+        return 1
+    finally:
+        storage.pool.dispose()
+
+    if args.dry_run:
+        print(f"Would compact {stats.rows:,} interactions in {stats.groups:,} day/type groups")
+        return 0
+    print(f"Compacted {stats.rows:,} interactions in {stats.groups:,} day/type groups "
+          f"in {time.monotonic() - started:.1f}s")
+    print(f"  rollups written: {stats.rolled_up:,}  archived: {stats.archived_rows:,} rows "
+          f"in {stats.archived_files:,} files  deleted: {stats.deleted:,} rows")
+    if stats.partitions_added or stats.partitions_dropped:
+        print(f"  partitions added: {', '.join(stats.partitions_added) or '-'}  "
+              f"dropped: {', '.join(stats.partitions_dropped) or '-'}")
+    if stats.rollups_deleted:
+        print(f"  expired rollups deleted: {stats.rollups_deleted:,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
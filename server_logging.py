@@ -0,0 +1,56 @@
+"""JSON logging and admin-token check shared by the action server and its workers.
+
+Kept outside the ``actions`` package on purpose: the ``action_server.py``
+master imports it before forking, and anything the master imports is
+inherited by every worker, so a module under ``actions/`` would never pick
+up edits on ``--reload`` or SIGHUP. ``actions.instrumentation`` re-exports
+these names for the actions themselves.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Text
+
+
+def admin_authorized(headers: Any) -> bool:
+    """Admin requests need PROFILE_ADMIN_TOKEN set and sent back in X-Admin-Token"""
+    token = os.getenv("PROFILE_ADMIN_TOKEN")
+    return bool(token) and headers.get("X-Admin-Token") == token
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with any ``extra`` fields merged in"""
+
+    _RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> Text:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+def configure_logging() -> None:
+    """Attach the JSON handler to the ``actions`` logger (LOG_FORMAT=text to opt out)"""
+    root = logging.getLogger("actions")
+    if getattr(root, "_configured", False):
+        return
+    root._configured = True
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    if os.getenv("LOG_FORMAT", "json").lower() == "json":
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        root.addHandler(handler)
+        root.propagate = False
+
+
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from actions.storage import SQLiteStorage  # noqa: E402
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """Empty embedded database with the full schema"""
+    storage = SQLiteStorage(str(tmp_path / "test.sqlite3"))
+    yield storage
+    storage.pool.dispose()
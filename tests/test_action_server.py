@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_master_does_not_import_the_actions_package():
+    # Workers fork from the master: anything it imports from actions/ would
+    # be inherited and never reloaded
+    script = ("import sys, action_server\n"
+              "class Master:\n"
+              "    reuse_port = False\n"
+              "    def __init__(self, *args, **kwargs): pass\n"
+              "    def run(self): pass\n"
+              "action_server.Master = Master\n"
+              "assert action_server.main(['--workers', '1']) == 0\n"
+              "print(sorted(m for m in sys.modules if m.split('.')[0] == 'actions'))\n")
+    env = dict(os.environ, LOG_FORMAT="text")
+    env.pop("METRICS_PORT", None)
+    result = subprocess.run([sys.executable, "-c", script], cwd=BASE_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_aggregate_sums_counters_and_labels_gauges_by_worker():
+    from action_server import aggregate
+
+    worker = ("# HELP runs_total Runs\n# TYPE runs_total counter\nruns_total{{action=\"a\"}} {runs}\n"
+              "# TYPE latency histogram\nlatency_bucket{{le=\"+Inf\"}} {runs}\nlatency_sum {runs}\n"
+              "latency_count {runs}\n# TYPE pool_size gauge\npool_size {pool}\n")
+    text = aggregate([(0, worker.format(runs=2, pool=4)), (1, worker.format(runs=3, pool=5))])
+    lines = text.splitlines()
+    assert "# HELP runs_total Runs" in lines
+    assert 'runs_total{action="a"} 5.0' in lines
+    assert 'latency_bucket{le="+Inf"} 5.0' in lines and "latency_count 5.0" in lines
+    assert 'pool_size{worker="0"} 4.0' in lines and 'pool_size{worker="1"} 5.0' in lines
+
+
+def test_reuse_port_sockets_share_a_port():
+    from action_server import bind_socket, reuse_port_supported
+
+    if not reuse_port_supported():
+        pytest.skip("SO_REUSEPORT not available")
+    first = bind_socket("127.0.0.1", 0, reuse_port=True)
+    try:
+        port = first.getsockname()[1]
+        second = bind_socket("127.0.0.1", port, reuse_port=True)
+        second.close()
+    finally:
+        first.close()
+
+
+def test_watched_files_include_the_actions_package():
+    from action_server import watched_mtimes
+
+    watched = {os.path.relpath(path, BASE_DIR) for path in watched_mtimes()}
+    assert os.path.join("actions", "actions.py") in watched and "domain.yml" in watched
+    assert "server_logging.py" not in watched
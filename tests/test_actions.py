@@ -0,0 +1,87 @@
+import inspect
+
+import pytest
+from rasa_sdk import Action
+
+from actions import actions, cache, invoice_state
+from actions.interaction_logger import InteractionLogger
+from actions.offline import make_tracker, run_action
+
+
+@pytest.fixture
+def interaction_logger(storage, monkeypatch):
+    interaction_logger = InteractionLogger(lambda: storage, flush_interval=0.05)
+    monkeypatch.setattr(actions, "get_interaction_logger", lambda: interaction_logger)
+    yield interaction_logger
+    interaction_logger.stop()
+
+
+@pytest.fixture
+def offline(storage, interaction_logger, monkeypatch):
+    """Actions wired to the test database"""
+    monkeypatch.setattr(actions, "get_storage", lambda: storage)
+    monkeypatch.setattr(invoice_state, "get_storage", lambda: storage)
+    for c in (cache.customer_id_cache, cache.invoice_summary_cache, cache.invoice_summary_fallback):
+        c.clear()
+    storage.upsert_customers([(1, "Ana", "ana@example.com", "+56911111111")])
+    storage.upsert_invoices([("F-1", 1, "100000.00", "2026-01-01", "2026-02-01", "pending"),
+                             ("F-2", 1, "50000.00", "2026-01-05", "2026-02-05", "pending")])
+    return storage
+
+
+def slots(events):
+    return {event["name"]: event["value"] for event in events if event.get("event") == "slot"}
+
+
+def invoice_statuses(storage):
+    with storage.cursor() as cursor:
+        cursor.execute("SELECT status FROM invoices ORDER BY id")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def logged(storage, interaction_logger):
+    interaction_logger.stop()
+    with storage.cursor() as cursor:
+        cursor.execute("SELECT interaction_type, data FROM interactions ORDER BY id")
+        return cursor.fetchall()
+
+
+def test_every_action_runs_as_a_coroutine():
+    classes = [value for value in vars(actions).values()
+               if inspect.isclass(value) and issubclass(value, Action) and value is not Action]
+    assert classes
+    for cls in classes:
+        assert inspect.iscoroutinefunction(cls.run), cls.__name__
+
+
+def test_pending_invoices_info_reads_the_summary(offline, interaction_logger):
+    events, _ = run_action(actions.ActionGetPendingInvoicesInfo(), make_tracker(slots={"client_name": "Ana"}))
+    assert slots(events) == {"pending_invoice_count": "2", "pending_invoice_total": "$150.000"}
+    assert logged(offline, interaction_logger) == [("pending_invoices_info", "count=2, total=150000.0")]
+
+
+def test_payment_date_schedules_the_invoices_once_per_turn(offline):
+    tracker = make_tracker("puedo pagar mañana", slots={"client_name": "Ana"}, sender_id="s1", message_id="m1")
+    events, messages = run_action(actions.ActionHandleDateQuestion(), tracker)
+    run_action(actions.ActionHandleDateQuestion(), tracker)  # a retried request
+
+    assert "payment_date" in slots(events) and messages
+    assert invoice_statuses(offline) == ["payment_scheduled"] * 2
+    with offline.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM invoice_audit")
+        assert cursor.fetchone()[0] == 2
+
+
+def test_dispute_marks_the_invoices_disputed(offline, interaction_logger):
+    tracker = make_tracker("ya pagué esa factura", slots={"client_name": "Ana"}, sender_id="s1", message_id="m1")
+    events, _ = run_action(actions.ActionClassifyReason(), tracker)
+
+    assert slots(events) == {"reason_type": "payment_dispute"}
+    assert invoice_statuses(offline) == ["disputed"] * 2
+    assert logged(offline, interaction_logger) == [("reason_classified", "payment_dispute")]
+
+
+def test_unknown_customer_is_left_alone(offline):
+    tracker = make_tracker("ya pagué", slots={"client_name": "Nadie"}, sender_id="s1", message_id="m1")
+    run_action(actions.ActionClassifyReason(), tracker)
+    assert invoice_statuses(offline) == ["pending"] * 2
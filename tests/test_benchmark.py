@@ -0,0 +1,44 @@
+import json
+
+from benchmark import Result, host_metadata, host_mismatch, main, report
+
+ARGS = ["--filter", "render.format_currency", "--repeat", "1", "--min-time", "0.001"]
+
+
+def baseline(min_us, **metadata):
+    return {**host_metadata(), **metadata,
+            "results": {"render.format_currency": {"median_us": min_us, "min_us": min_us}}}
+
+
+def test_report_flags_slowdowns_over_the_threshold(capsys):
+    results = [Result("render.format_currency", 1.3, 1.2, 0.0, 1), Result("new.case", 1.0, 1.0, 0.0, 1)]
+    assert report(results, baseline(1.0), threshold=0.25) == []
+    assert report(results, baseline(0.9), threshold=0.25) == ["render.format_currency"]
+
+
+def test_host_mismatch_lists_the_differences():
+    assert host_mismatch(baseline(1.0)) == []
+    assert host_mismatch(baseline(1.0, host="ci-runner")) == [f"host: ci-runner != {host_metadata()['host']}"]
+
+
+def test_baseline_from_another_host_is_not_compared(tmp_path, capsys):
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps(baseline(0.000001, host="ci-runner")), encoding="utf-8")
+    assert main(ARGS + ["--baseline", str(path)]) == 0
+    assert "otro host" in capsys.readouterr().out
+
+
+def test_saved_baseline_is_compared_on_the_same_host(tmp_path, capsys):
+    path = tmp_path / "baseline.json"
+    assert main(ARGS + ["--baseline", str(path), "--save-baseline"]) == 0
+    assert json.loads(path.read_text(encoding="utf-8"))["host"] == host_metadata()["host"]
+
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    saved["results"]["render.format_currency"]["min_us"] = 0.000001
+    path.write_text(json.dumps(saved), encoding="utf-8")
+    assert main(ARGS + ["--baseline", str(path)]) == 1
+
+
+def test_missing_baseline_only_reports(tmp_path, capsys):
+    assert main(ARGS + ["--baseline", str(tmp_path / "missing.json")]) == 0
+    assert "--save-baseline" in capsys.readouterr().out
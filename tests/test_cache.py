@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from actions import actions, cache, invoice_state
+from actions.cache import TTLCache
+
+
+def test_entries_expire_after_the_ttl():
+    ttl_cache = TTLCache("t", ttl=0.01)
+    ttl_cache.set("a", 1)
+    assert ttl_cache.get("a") == 1
+    time.sleep(0.02)
+    assert ttl_cache.get("a") is None
+    assert ttl_cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    ttl_cache = TTLCache("t", maxsize=2)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3)
+    assert ttl_cache.get("b") is None and ttl_cache.get("a") == 1
+    assert ttl_cache.stats()["evictions"] == 1
+
+
+def test_invalidate_where_drops_matching_entries():
+    ttl_cache = TTLCache("t")
+    for key, value in [("a", 1), ("b", 2), ("c", 1)]:
+        ttl_cache.set(key, value)
+    assert ttl_cache.invalidate_where(lambda key, value: value == 1) == 2
+    assert ttl_cache.get("b") == 2 and ttl_cache.get("a") is None
+
+
+@pytest.fixture
+def customer(storage, monkeypatch):
+    monkeypatch.setattr(actions, "get_storage", lambda: storage)
+    monkeypatch.setattr(invoice_state, "get_storage", lambda: storage)
+    for c in (cache.customer_id_cache, cache.invoice_summary_cache, cache.invoice_summary_fallback):
+        c.clear()
+    storage.upsert_customers([(1, "Ana", "ana@example.com", "+56911111111"),
+                              (2, "Luis", "luis@example.com", "+56922222222")])
+    storage.upsert_invoices([("F-1", 1, "100.00", "2026-01-01", "2026-02-01", "pending"),
+                             ("F-2", 2, "50.00", "2026-01-01", "2026-02-01", "pending")])
+    return storage
+
+
+def test_transition_drops_the_customer_summary_and_its_fallback(customer):
+    assert actions.fetch_pending_invoices_summary("Ana")[0] == 1
+    assert actions.fetch_pending_invoices_summary("Luis")[0] == 1
+
+    invoice_state.dispute(1, "key-1")
+
+    assert cache.invoice_summary_cache.get(1) is None
+    assert cache.invoice_summary_fallback.get("Ana") is None
+    assert cache.invoice_summary_fallback.get("Luis") is not None
+    assert actions.fetch_pending_invoices_summary("Ana")[0] == 0
@@ -0,0 +1,116 @@
+import csv
+from datetime import datetime
+
+import pytest
+
+from campaign import (EXPORT_COLUMNS, CsvRecordWriter, ParquetRecordWriter, collect_outcomes, export_outcomes,
+                      reached_customers, session_customer_id, session_id)
+
+
+def log(storage, *rows):
+    storage.insert_interactions([(session, kind, data, datetime(2025, 6, 2, 10, 0)) for session, kind, data in rows])
+
+
+@pytest.mark.parametrize("campaign, session, expected", [
+    ("demo", "campaign-demo-17", 17),
+    ("demo", "campaign-demo-2-17", None),
+    ("demo", "campaign-demo-", None),
+    ("demo", "campaign-demo-1x", None),
+    ("demo-2", "campaign-demo-2-17", 17),
+    ("a_b", "campaign-a_b-3", 3),
+])
+def test_session_customer_id(campaign, session, expected):
+    assert session_customer_id(campaign, session) == expected
+
+
+def test_overlapping_campaign_names_are_kept_apart(storage):
+    log(storage,
+        (session_id("demo-2", 1), "campaign_triggered", None),
+        (session_id("demo-2", 1), "payment_date_confirmed", "2025-06-10"),
+        (session_id("demo", 5), "campaign_triggered", None))
+
+    assert reached_customers(storage, "demo") == {5}
+    assert reached_customers(storage, "demo-2") == {1}
+    assert collect_outcomes(storage, "demo") == {5: "no_response"}
+    assert collect_outcomes(storage, "demo-2") == {1: "payment_scheduled"}
+
+
+def test_like_wildcards_in_campaign_names_are_literal(storage):
+    log(storage,
+        (session_id("a_b", 1), "campaign_triggered", None),
+        (session_id("axb", 2), "campaign_triggered", None),
+        (session_id("100%", 3), "campaign_triggered", None),
+        (session_id("100x", 4), "campaign_triggered", None))
+
+    assert reached_customers(storage, "a_b") == {1}
+    assert reached_customers(storage, "100%") == {3}
+
+
+def test_reached_customers_only_reads_trigger_rows(storage, monkeypatch):
+    log(storage,
+        (session_id("demo", 1), "campaign_triggered", None),
+        (session_id("demo", 1), "payment_date_confirmed", "2025-06-10"),
+        (session_id("demo", 2), "identity_confirmed", None))
+    page = storage.interactions_page
+    requested = []
+
+    def spy(*args, **kwargs):
+        rows = page(*args, **kwargs)
+        requested.extend(kind for _, _, kind, _ in rows)
+        return rows
+
+    monkeypatch.setattr(storage, "interactions_page", spy)
+    assert reached_customers(storage, "demo") == {1}
+    assert requested == ["campaign_triggered"]
+
+
+@pytest.fixture
+def exported_campaign(storage):
+    storage.upsert_customers([(1, "Ana", "ana@example.com", "+56911111111"),
+                              (2, "Luis", "luis@example.com", "+56922222222")])
+    storage.upsert_invoices([("F-1", 1, "100.00", "2025-05-01", "2025-06-01", "payment_scheduled"),
+                             ("F-2", 2, "50.00", "2025-05-01", "2025-06-01", "disputed")])
+    storage.insert_interactions([
+        (session_id("demo", 1), "campaign_triggered", None, datetime(2025, 6, 2, 10, 0)),
+        (session_id("demo", 1), "identity_check", "is_dennis=True", datetime(2025, 6, 2, 10, 1)),
+        (session_id("demo", 1), "payment_date_confirmed", "2025-06-12", datetime(2025, 6, 2, 10, 2)),
+        (session_id("demo", 2), "campaign_triggered", None, datetime(2025, 6, 2, 11, 0)),
+        (session_id("demo", 2), "reason_classified", "payment_dispute", datetime(2025, 6, 2, 11, 3)),
+        (session_id("demo", 3), "campaign_trigger_failed", None, datetime(2025, 6, 2, 12, 0)),
+        (session_id("other", 4), "campaign_triggered", None, datetime(2025, 6, 2, 12, 0)),
+    ])
+    return storage
+
+
+def test_export_writes_one_record_per_conversation(exported_campaign, tmp_path):
+    path = tmp_path / "outcomes.csv"
+    writer = CsvRecordWriter(str(path))
+    try:
+        summary = export_outcomes(exported_campaign, "demo", writer, batch_size=2)
+    finally:
+        writer.close()
+
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = {row["customer_id"]: row for row in csv.DictReader(f)}
+    assert sorted(rows) == ["1", "2", "3"]
+    assert rows["1"]["outcome"] == "payment_scheduled" and rows["1"]["scheduled_delay_days"] == "10"
+    assert rows["1"]["customer_name"] == "Ana" and rows["1"]["scheduled_amount"] == "100.0"
+    assert rows["2"]["outcome"] == "disputed" and rows["2"]["reason_type"] == "payment_dispute"
+    assert rows["3"]["outcome"] == "trigger_failed" and rows["3"]["pending_invoices"] == "0"
+
+    metrics = summary.metrics()
+    assert metrics["customers"] == 3 and metrics["contacted"] == 2
+    assert metrics["promise_to_pay_rate"] == 0.5 and metrics["dispute_rate"] == 0.5
+    assert metrics["avg_scheduled_delay_days"] == 10 and metrics["scheduled_amount"] == 100.0
+
+
+def test_parquet_export_matches_the_csv_columns(exported_campaign, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "outcomes.parquet"
+    writer = ParquetRecordWriter(str(path))
+    try:
+        export_outcomes(exported_campaign, "demo", writer)
+    finally:
+        writer.close()
+    table = pq.read_table(str(path))
+    assert table.column_names == list(EXPORT_COLUMNS) and table.num_rows == 3
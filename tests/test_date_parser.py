@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+
+from actions.date_parser import parse_date, reference_date
+
+TODAY = date(2025, 6, 11)  # a Wednesday
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("mañana", "2025-06-12"),
+    ("pasado mañana", "2025-06-13"),
+    ("hoy", "2025-06-11"),
+    ("el viernes", "2025-06-13"),
+    ("el miércoles", "2025-06-18"),  # today's weekday means next week
+    ("fin de mes", "2025-06-30"),
+    ("el próximo mes", "2025-07-11"),
+    ("en 3 días", "2025-06-14"),
+    ("dentro de dos semanas", "2025-06-25"),
+    ("el 5", "2025-07-05"),
+    ("el 20", "2025-06-20"),
+    ("15 de octubre", "2025-10-15"),
+    ("15/10", "2025-10-15"),
+    ("10/06", "2026-06-10"),  # already passed this year
+    ("15/10/2026", "2026-10-15"),
+    ("11/06/2025", "2025-06-11"),
+])
+def test_resolves_relative_to_today(text, expected):
+    assert parse_date(text, TODAY).isoformat() == expected
+
+
+@pytest.mark.parametrize("text", ["15/10/2024", "10/06/25", "31/02/2026", "el 45", "cuando pueda"])
+def test_past_or_impossible_dates_are_not_dates(text):
+    assert parse_date(text, TODAY) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("hoy no, mañana", "2025-06-12"),
+    ("no hoy, el viernes", "2025-06-13"),
+    ("no el lunes, el martes", "2025-06-17"),
+    ("el lunes no puedo, el martes sí", "2025-06-17"),
+    ("no, mañana", "2025-06-12"),
+    ("casino hoy", "2025-06-11"),
+])
+def test_negated_expressions_are_skipped(text, expected):
+    assert parse_date(text, TODAY).isoformat() == expected
+
+
+def test_only_negated_expressions_is_no_date():
+    assert parse_date("ni hoy ni mañana", TODAY) is None
+
+
+def test_several_dates_lower_the_confidence():
+    single, several = parse_date("mañana", TODAY), parse_date("mañana o el viernes", TODAY)
+    assert several.date == single.date
+    assert several.confidence < single.confidence
+
+
+def test_reference_date_replaces_today():
+    with reference_date(TODAY):
+        assert parse_date("mañana").isoformat() == "2025-06-12"
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from actions.db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.rollbacks = 0
+        self.alive = True
+        self.in_transaction = True
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def factory():
+        created.append(FakeConnection())
+        return created[-1]
+
+    kwargs.setdefault("ping", lambda raw: raw.alive)
+    return ConnectionPool(factory, **kwargs), created
+
+
+def test_connections_are_reused_and_rolled_back_on_return():
+    pool, created = make_pool(size=1, max_overflow=0)
+    with pool.connect():
+        pass
+    with pool.connect():
+        pass
+    assert len(created) == 1
+    assert created[0].rollbacks == 2
+    assert pool.stats()["borrowed"] == 2
+
+
+def test_overflow_connections_are_closed_on_return():
+    pool, created = make_pool(size=1, max_overflow=1)
+    first, second = pool.connect(), pool.connect()
+    first.close()
+    second.close()
+    assert [c.closed for c in created] == [False, True]
+    assert pool.stats()["idle"] == 1
+
+
+def test_borrow_times_out_when_exhausted():
+    pool, _ = make_pool(size=1, max_overflow=0, timeout=0.05)
+    held = pool.connect()
+    with pytest.raises(PoolTimeout):
+        pool.connect()
+    assert pool.stats()["timeouts"] == 1
+    held.close()
+
+
+def test_waiter_gets_the_returned_connection():
+    pool, created = make_pool(size=1, max_overflow=0, timeout=2)
+    held = pool.connect()
+    threading.Timer(0.05, held.close).start()
+    with pool.connect():
+        pass
+    assert len(created) == 1 and pool.stats()["waits"] >= 1
+
+
+def test_dead_idle_connection_is_replaced():
+    pool, created = make_pool(size=1, max_overflow=0)
+    pool.connect().close()
+    created[0].alive = False
+    pool.connect().close()
+    assert len(created) == 2 and created[0].closed
+    assert pool.stats()["ping_failures"] == 1
+
+
+def test_failed_connect_frees_the_slot():
+    def factory():
+        raise OSError("refused")
+
+    pool = ConnectionPool(factory, size=1, max_overflow=0, timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(OSError):
+            pool.connect()
+    assert pool.stats()["checked_out"] == 0
@@ -0,0 +1,50 @@
+import threading
+
+from actions.db_router import ReadRouter, Replica
+from actions.storage import sqlite_pool
+
+
+def make_router(tmp_path, lags, **kwargs):
+    """Router over SQLite replicas whose first checks report ``lags``"""
+    replicas = [Replica(f"r{i}", sqlite_pool(str(tmp_path / f"r{i}.sqlite3"))) for i in range(len(lags))]
+    checked = iter(lags)
+    kwargs.setdefault("lag_check", lambda cursor: next(checked, 0.0))
+    return ReadRouter(replicas, max_lag=5.0, check_interval=3600, **kwargs)
+
+
+def test_round_robin_skips_lagging_replicas(tmp_path):
+    router = make_router(tmp_path, [0.0, 60.0, 1.0])
+    try:
+        chosen = [router.choose().name for _ in range(4)]
+        assert sorted(set(chosen)) == ["r0", "r2"]
+    finally:
+        router.dispose()
+
+
+def test_reads_stay_on_the_primary_after_a_write(tmp_path):
+    router = make_router(tmp_path, [0.0], read_your_writes=60)
+    try:
+        router.note_write("session-1")
+        assert router.choose("session-1") is None
+        assert router.choose("session-2").name == "r0"
+    finally:
+        router.dispose()
+
+
+def test_first_check_runs_outside_the_router_lock(tmp_path):
+    done = threading.Event()
+
+    def lag_check(cursor):
+        # Another read, a write note and a stats call while the first check runs
+        worker = threading.Thread(target=lambda: (router.note_write("s"), router.stats(), done.set()))
+        worker.start()
+        worker.join(timeout=2)
+        return 0.0
+
+    router = make_router(tmp_path, [0.0], lag_check=lag_check)
+    try:
+        router.start()
+        assert done.is_set()
+        assert router.choose().name == "r0"
+    finally:
+        router.dispose()
@@ -0,0 +1,37 @@
+import pytest
+
+from actions.actions import ActionCheckIdentity, ActionClassifyReason, ActionHandlePaymentResponse
+from actions.keyword_matcher import get_keyword_matcher
+from evaluate import DEFAULT_NLU_PATH, build_classifiers, classify_batch, load_examples, main, metrics
+
+
+def test_load_examples_strips_entity_annotations(tmp_path):
+    path = tmp_path / "nlu.yml"
+    path.write_text('version: "3.1"\nnlu:\n- intent: can_pay\n  examples: |\n'
+                    '    - puedo pagar el [lunes](date)\n    - pago el [15]{"entity": "date"}\n'
+                    '- synonym: lunes\n  examples: |\n    - lunes\n', encoding="utf-8")
+    assert [(e.text, e.intent) for e in load_examples(str(path))] == [
+        ("puedo pagar el lunes", "can_pay"), ("pago el 15", "can_pay")]
+
+
+def test_metrics_precision_recall_and_confusion():
+    result = metrics(["a", "a", "b", "b"], ["a", "b", "b", "b"])
+    assert result["accuracy"] == 0.75
+    assert result["per_label"]["a"] == {"precision": 1.0, "recall": 0.5, "f1": 0.6667, "support": 2}
+    assert result["per_label"]["b"]["precision"] == 0.6667
+    assert result["confusion"] == [[1, 1], [0, 2]]
+
+
+@pytest.mark.parametrize("name", ["identity", "payment_response", "reason"])
+def test_batch_classification_matches_the_runtime_path(name):
+    classifier = build_classifiers()[name]
+    texts = [e.text for e in load_examples(DEFAULT_NLU_PATH)]
+    actions = {"identity": ActionCheckIdentity(), "payment_response": ActionHandlePaymentResponse(),
+               "reason": ActionClassifyReason()}
+    assert classify_batch(get_keyword_matcher(), classifier, texts) == [classifier.single(actions, t) for t in texts]
+
+
+def test_accuracy_floors_gate_the_exit_code(capsys):
+    assert main(["--min-time", "0", "--errors", "0"]) == 0
+    assert main(["--min-time", "0", "--errors", "0", "--fail-under", "1.0"]) == 1
+    assert "Exactitud bajo el mínimo" in capsys.readouterr().out
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+from actions import instrumentation
+from actions.instrumentation import (ACTION_DB_QUERIES, ACTION_ERRORS, ACTION_RUNS, Counter, Histogram, JsonFormatter,
+                                     Registry, current_action, instrumented, record_query)
+
+
+@pytest.fixture(autouse=True)
+def no_metrics_server(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_server_checked", True)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, action="a")
+    lines = histogram.expose()
+    assert 'latency_seconds_bucket{action="a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{action="a",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{action="a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{action="a"} 4' in lines
+    assert histogram.count(action="a") == 4
+
+
+def test_label_values_are_escaped():
+    counter = Counter("runs_total", "Runs")
+    counter.inc(action='say "hi"\\')
+    assert counter.expose()[-1] == 'runs_total{action="say \\"hi\\"\\\\"} 1.0'
+
+
+def test_failing_collectors_are_skipped():
+    registry = Registry()
+    registry.counter("runs_total", "Runs").inc()
+    registry.add_collector(lambda: {"pool_size": 4})
+    registry.add_collector(lambda: 1 / 0)
+    text = registry.expose()
+    assert "runs_total 1.0" in text and "# TYPE pool_size gauge\npool_size 4.0" in text
+
+
+class FakeAction:
+    def __init__(self, name, queries=0, fail=False):
+        self._name, self.queries, self.fail = name, queries, fail
+
+    def name(self):
+        return self._name
+
+    @instrumented
+    async def run(self, dispatcher, tracker, domain):
+        for _ in range(self.queries):
+            record_query(0.001)
+        assert current_action().action == self._name
+        if self.fail:
+            raise RuntimeError("boom")
+        return []
+
+    @instrumented
+    def run_sync(self, dispatcher, tracker, domain):
+        record_query(0.001)
+        return []
+
+
+def test_instrumented_records_runs_queries_and_errors():
+    asyncio.run(FakeAction("action_test_ok", queries=3).run(None, None, {}))
+    with pytest.raises(RuntimeError):
+        asyncio.run(FakeAction("action_test_fail", fail=True).run(None, None, {}))
+    FakeAction("action_test_sync").run_sync(None, None, {})
+
+    assert ACTION_RUNS.value(action="action_test_ok") == 1
+    assert ACTION_DB_QUERIES.value(action="action_test_ok") == 3
+    assert ACTION_ERRORS.value(action="action_test_fail") == 1
+    assert ACTION_DB_QUERIES.value(action="action_test_sync") == 1
+    assert current_action() is None
+
+
+def test_json_formatter_merges_extra_fields():
+    record = logging.LogRecord("actions.test", logging.INFO, __file__, 1, "saved %s", ("invoice",), None)
+    record.customer_id = 7
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload["msg"] == "saved invoice" and payload["level"] == "info" and payload["customer_id"] == 7
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from actions.interaction_logger import InteractionLogger
+
+
+class HeldStorage:
+    """Storage whose schema check waits for ``release``, so nothing is flushed until then"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.release = threading.Event()
+
+    def check_schema(self):
+        self.release.wait(5)
+        self.storage.check_schema()
+
+    def insert_interactions(self, batch):
+        self.storage.insert_interactions(batch)
+
+
+def logged(storage):
+    with storage.cursor() as cursor:
+        cursor.execute("SELECT session_id, interaction_type, data FROM interactions ORDER BY id")
+        return cursor.fetchall()
+
+
+def test_queued_events_are_flushed_on_stop(storage):
+    interaction_logger = InteractionLogger(lambda: storage, batch_size=2, flush_interval=0.05)
+    for i in range(5):
+        assert interaction_logger.log(f"s{i}", "greet", str(i))
+    interaction_logger.stop()
+    assert logged(storage) == [(f"s{i}", "greet", str(i)) for i in range(5)]
+    stats = interaction_logger.stats()
+    assert stats["flushed"] == 5 and stats["dropped"] == 0 and stats["queued"] == 0
+
+
+@pytest.mark.parametrize("policy, kept", [
+    ("drop_newest", ["0", "1"]),
+    ("drop_oldest", ["1", "2"]),
+    ("block", ["0", "1"]),
+])
+def test_overflow_policy(storage, policy, kept):
+    held = HeldStorage(storage)
+    interaction_logger = InteractionLogger(lambda: held, max_queue=2, overflow_policy=policy, block_timeout=0.01)
+    accepted = [interaction_logger.log("s", "greet", str(i)) for i in range(3)]
+    held.release.set()
+    interaction_logger.stop()
+    assert [data for _, _, data in logged(storage)] == kept
+    assert accepted == [True, True, policy == "drop_oldest"]
+    assert interaction_logger.stats()["dropped"] == 1
+
+
+def test_unknown_overflow_policy_is_refused(storage):
+    with pytest.raises(ValueError):
+        InteractionLogger(lambda: storage, overflow_policy="drop_all")
+
+
+def test_failed_flush_counts_the_batch_as_dropped(storage):
+    class Broken:
+        def check_schema(self):
+            pass
+
+        def insert_interactions(self, batch):
+            raise RuntimeError("db down")
+
+    interaction_logger = InteractionLogger(lambda: Broken(), flush_interval=0.05)
+    interaction_logger.log("s", "greet")
+    interaction_logger.stop()
+    stats = interaction_logger.stats()
+    assert stats["flush_errors"] == 1 and stats["dropped"] == 1
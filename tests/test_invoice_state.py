@@ -0,0 +1,69 @@
+import pytest
+
+from actions import invoice_state
+
+
+@pytest.fixture
+def invoices(storage, monkeypatch):
+    monkeypatch.setattr(invoice_state, "get_storage", lambda: storage)
+    storage.upsert_customers([(1, "Ana", "ana@example.com", "+56911111111")])
+    storage.upsert_invoices([(f"F-{i}", 1, "100.00", "2026-01-01", "2026-02-01", "pending") for i in range(2)])
+    return storage
+
+
+def statuses(storage):
+    with storage.cursor() as cursor:
+        cursor.execute("SELECT status, payment_date FROM invoices ORDER BY id")
+        return [tuple(str(v) if v is not None else None for v in row) for row in cursor.fetchall()]
+
+
+def audit_rows(storage):
+    with storage.cursor() as cursor:
+        cursor.execute("SELECT from_status, to_status FROM invoice_audit ORDER BY id")
+        return cursor.fetchall()
+
+
+def test_schedule_payment_moves_pending_invoices(invoices):
+    result = invoice_state.schedule_payment(1, "2026-03-01", "key-1", session_id="s1")
+    assert result.applied and result.count == 2
+    assert statuses(invoices) == [("payment_scheduled", "2026-03-01")] * 2
+    assert audit_rows(invoices) == [("pending", "payment_scheduled")] * 2
+
+
+def test_retried_turn_is_not_applied_twice(invoices):
+    first = invoice_state.schedule_payment(1, "2026-03-01", "key-1")
+    retry = invoice_state.schedule_payment(1, "2026-03-01", "key-1")
+    assert not retry.applied and retry.invoice_ids == first.invoice_ids
+    assert len(audit_rows(invoices)) == 2
+
+
+def test_dispute_leaves_scheduled_invoices(invoices):
+    invoice_state.schedule_payment(1, "2026-03-01", "key-1")
+    result = invoice_state.dispute(1, "key-2")
+    assert result.applied and result.count == 0
+    assert [status for status, _ in statuses(invoices)] == ["payment_scheduled"] * 2
+
+
+@pytest.mark.parametrize("to_status, from_statuses", [
+    ("pending", None),
+    ("payment_scheduled", frozenset({"disputed"})),
+])
+def test_invalid_transitions_are_refused(invoices, to_status, from_statuses):
+    with pytest.raises(invoice_state.InvalidTransition):
+        invoice_state.transition(1, to_status, "key", from_statuses=from_statuses)
+    assert [status for status, _ in statuses(invoices)] == ["pending"] * 2
+
+
+def test_pending_invoice_with_a_payment_date_is_not_transitioned(invoices):
+    with invoices.cursor(commit=True) as cursor:
+        cursor.execute("UPDATE invoices SET payment_date = '2026-02-15' WHERE invoice_number = 'F-0'")
+    result = invoice_state.dispute(1, "key-1")
+    assert result.count == 1
+    assert statuses(invoices) == [("pending", "2026-02-15"), ("disputed", None)]
+
+
+def test_scheduled_invoices_can_still_be_paid(invoices):
+    invoice_state.schedule_payment(1, "2026-03-01", "key-1")
+    result = invoice_state.transition(1, invoice_state.PAID, "key-2")
+    assert result.count == 2
+    assert statuses(invoices) == [("paid", "2026-03-01")] * 2
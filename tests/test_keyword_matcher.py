@@ -0,0 +1,50 @@
+import pytest
+
+from actions.keyword_matcher import DEFAULT_KEYWORDS_PATH, KeywordMatcher, load_keyword_groups
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return KeywordMatcher(load_keyword_groups(DEFAULT_KEYWORDS_PATH))
+
+
+@pytest.mark.parametrize("text, group, expected", [
+    ("no soy dennis", "identity", {"deny"}),
+    ("sí, soy dennis", "identity", {"confirm"}),
+    ("Sí", "identity", {"confirm"}),
+    ("no puedo pagar", "payment_response", {"cannot_pay"}),
+    ("puedo pagar", "payment_response", {"can_pay"}),
+    ("no tengo, ¿cuándo vence?", "payment_response", {"cannot_pay", "ask_date"}),
+    ("ya pagué, no es mi deuda", "reason", {"payment_dispute"}),
+    ("estoy cesante", "reason", {"financial_difficulty"}),
+])
+def test_leftmost_longest_categories(matcher, text, group, expected):
+    assert set(matcher.scan(text).categories(group)) == expected
+
+
+@pytest.mark.parametrize("text, group", [
+    ("bueno", "identity"),  # "no" inside a word
+    ("una visita", "identity"),  # "si" inside a word
+    ("", "payment_response"),
+])
+def test_whole_words_only(matcher, text, group):
+    assert not matcher.scan(text).categories(group)
+
+
+def test_groups_resolve_independently(matcher):
+    result = matcher.scan("no puedo pagar, no soy dennis")
+    assert set(result.categories("payment_response")) == {"cannot_pay"}
+    assert set(result.categories("identity")) == {"deny"}
+
+
+def test_overlapping_phrases_keep_the_leftmost():
+    matcher = KeywordMatcher({"g": {"a": ["x y"], "b": ["y z"], "c": ["x"]}})
+    hits = matcher.scan("x y z").hits
+    assert [(hit.category, hit.start, hit.end) for hit in hits] == [("a", 0, 2)]
+    assert len(matcher.scan_tokens(["x", "y", "z"])) == 3
+
+
+def test_scan_many_matches_scan(matcher):
+    texts = ["no puedo pagar", "sí", "no puedo pagar", "mañana"]
+    assert [set(r.categories("payment_response")) for r in matcher.scan_many(texts)] == \
+        [set(matcher.scan(t).categories("payment_response")) for t in texts]
@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import socket
+
+import pytest
+
+from load_test import (SCENARIOS, WEBHOOK_PATH, Results, build_report, parse_mix, percentile, run_load,
+                       start_stub_server, validate_scenarios)
+
+
+@pytest.mark.parametrize("pct, expected", [(50, 5), (95, 10), (99, 10), (1, 1)])
+def test_percentile_is_nearest_rank(pct, expected):
+    assert percentile(list(range(1, 11)), pct) == expected
+
+
+def test_percentile_of_nothing_is_zero():
+    assert percentile([], 95) == 0.0
+
+
+def test_parse_mix():
+    assert parse_mix("pay_tomorrow=4, dispute") == {"pay_tomorrow": 4.0, "dispute": 1.0}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix("pay_later=1")
+
+
+def test_scenarios_reference_existing_flows():
+    validate_scenarios()
+
+
+def test_report_rates_and_latencies():
+    results = Results(latencies=[0.1, 0.2, 0.3, 0.4], errors=1, turns=4, conversations={"dispute": 2},
+                      failed_conversations=1)
+    report = build_report(results, elapsed=2.0)
+    assert report["conversations"] == 2 and report["error_rate"] == 0.25
+    assert report["throughput_turns_per_s"] == 2.0
+    assert report["latency_ms"]["p50"] == pytest.approx(200) and report["latency_ms"]["max"] == pytest.approx(400)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_load_against_the_stub_bot():
+    port = free_port()
+
+    async def scenario():
+        runner = await start_stub_server(port, latency=0.0, error_rate=0.0)
+        try:
+            return await run_load(f"http://127.0.0.1:{port}{WEBHOOK_PATH}", conversations=6, concurrency=3,
+                                  rate=None, mix={"wrong_person": 1}, think_time=0.0, timeout=5.0, seed=1)
+        finally:
+            await runner.cleanup()
+
+    results, _ = asyncio.run(scenario())
+    assert results.conversations == {"wrong_person": 6} and results.errors == 0
+    assert results.turns == 6 * len(SCENARIOS["wrong_person"].messages)
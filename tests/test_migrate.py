@@ -0,0 +1,98 @@
+import pytest
+
+from migrate import load_migrations, migrate_down, migrate_up, split_statements
+
+
+class FakeConnection:
+    """Records executed statements; schema_migrations lives in ``versions``"""
+
+    def __init__(self, versions=()):
+        self.versions = set(versions)
+        self.statements = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=()):
+        if sql.startswith("INSERT INTO schema_migrations"):
+            self.connection.versions.add(params[0])
+        elif sql.startswith("DELETE FROM schema_migrations"):
+            self.connection.versions.discard(params[0])
+        elif "schema_migrations" not in sql:
+            self.connection.statements.append(sql)
+
+    def fetchall(self):
+        return [(version,) for version in sorted(self.connection.versions)]
+
+    def close(self):
+        pass
+
+
+def write(directory, files):
+    for name, sql in files.items():
+        (directory / name).write_text(sql, encoding="utf-8")
+
+
+def test_split_statements_skips_comment_lines():
+    sql = "-- header\nCREATE TABLE a (id INT);\n\n  -- note; with a semicolon\nDROP TABLE b;\n"
+    assert split_statements(sql) == ["CREATE TABLE a (id INT)", "DROP TABLE b"]
+
+
+def test_shipped_migrations_are_complete_and_contiguous():
+    migrations = load_migrations()
+    assert [m.version for m in migrations] == list(range(1, len(migrations) + 1))
+    for migration in migrations:
+        with open(migration.up_path, encoding="utf-8") as f:
+            assert split_statements(f.read())
+
+
+@pytest.mark.parametrize("files, error", [
+    ({"0001_a.up.sql": "SELECT 1;"}, "needs both"),
+    ({"0001_a.up.sql": "", "0001_a.down.sql": "", "0001_b.down.sql": ""}, "Conflicting names"),
+])
+def test_invalid_migration_sets_are_refused(tmp_path, files, error):
+    write(tmp_path, files)
+    with pytest.raises(ValueError, match=error):
+        load_migrations(str(tmp_path))
+
+
+@pytest.fixture
+def migrations(tmp_path):
+    write(tmp_path, {f"000{v}_m{v}.{d}.sql": f"-- {d}\n{d.upper()} {v};" for v in (1, 2, 3) for d in ("up", "down")})
+    write(tmp_path, {"README.txt": "not a migration"})
+    return load_migrations(str(tmp_path))
+
+
+def test_migrate_up_applies_pending_versions_in_order(migrations, capsys):
+    connection = FakeConnection(versions={1})
+    applied = migrate_up(connection, migrations=migrations)
+    assert [m.version for m in applied] == [2, 3]
+    assert connection.statements == ["UP 2", "UP 3"]
+    assert connection.versions == {1, 2, 3} and connection.commits == 2
+
+
+def test_migrate_up_stops_at_target(migrations, capsys):
+    connection = FakeConnection()
+    migrate_up(connection, target=2, migrations=migrations)
+    assert connection.versions == {1, 2}
+
+
+@pytest.mark.parametrize("kwargs, reverted", [
+    ({}, [3]),
+    ({"steps": 2}, [3, 2]),
+    ({"target": 1}, [3, 2]),
+])
+def test_migrate_down(migrations, capsys, kwargs, reverted):
+    connection = FakeConnection(versions={1, 2, 3})
+    assert [m.version for m in migrate_down(connection, migrations=migrations, **kwargs)] == reverted
+    assert connection.statements == [f"DOWN {v}" for v in reverted]
+    assert connection.versions == {1, 2, 3} - set(reverted)
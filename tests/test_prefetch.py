@@ -0,0 +1,17 @@
+import asyncio
+import contextvars
+
+from actions.prefetch import Prefetcher
+
+request = contextvars.ContextVar("request", default=None)
+
+
+def test_prefetch_runs_in_the_callers_context():
+    prefetcher = Prefetcher("test")
+
+    async def scenario():
+        request.set("turn-1")
+        prefetcher.start("sender", "key", request.get)
+        return await prefetcher.take("sender", "key")
+
+    assert asyncio.run(scenario()) == "turn-1"
@@ -0,0 +1,85 @@
+import os
+import pstats
+import time
+
+import pytest
+
+from actions.profiling import CPROFILE, Profiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def profiled_run(profiler, action, seconds=0.05):
+    """What the instrumented wrapper does around a run"""
+    capture = profiler.begin(action)
+    if capture is None:
+        return False
+    try:
+        busy(seconds)
+    finally:
+        profiler.finish(capture)
+    return True
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    return Profiler(output_dir=str(tmp_path), interval=0.001)
+
+
+def test_disabled_by_default(profiler):
+    assert not profiler.enabled
+    assert profiler.status()["actions"] == []
+
+
+@pytest.mark.parametrize("kwargs", [{"mode": "trace"}, {"rate": 1.5}])
+def test_invalid_configuration_is_refused(profiler, kwargs):
+    with pytest.raises(ValueError):
+        profiler.configure("*", **kwargs)
+    assert not profiler.enabled
+
+
+def test_only_selected_actions_are_profiled(profiler):
+    profiler.configure("action_a")
+    assert profiler.enabled
+    assert not profiled_run(profiler, "action_b", 0)
+    profiler.configure("")
+    assert not profiler.enabled
+
+
+def test_profiling_stops_after_the_duration(profiler):
+    profiler.configure("*", duration=0.01)
+    time.sleep(0.02)
+    assert not profiled_run(profiler, "action_a", 0)
+    assert not profiler.enabled
+
+
+def test_sample_mode_writes_folded_stacks(profiler, tmp_path):
+    profiler.configure("*")
+    assert profiled_run(profiler, "action_a")
+    aggregate = tmp_path / f"action_a.{os.getpid()}.folded"
+    stacks = aggregate.read_text(encoding="utf-8").splitlines()
+    assert any("busy" in line for line in stacks)
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".folded")]) == 2
+    assert profiler.status()["profiled_runs"] == 1
+
+
+def test_cprofile_mode_aggregates_runs(profiler, tmp_path):
+    profiler.configure("*", mode=CPROFILE)
+    assert profiled_run(profiler, "action_a", 0.01)
+    assert profiled_run(profiler, "action_a", 0.01)
+    stats = pstats.Stats(str(tmp_path / f"action_a.{os.getpid()}.prof"))
+    calls = {func[2]: stat[0] for func, stat in stats.stats.items()}
+    assert calls["busy"] == 2
+
+
+def test_max_files_caps_per_run_files_but_not_the_aggregate(tmp_path):
+    profiler = Profiler(output_dir=str(tmp_path), interval=0.001, max_files=1)
+    profiler.configure("*", mode=CPROFILE)
+    for _ in range(3):
+        profiled_run(profiler, "action_a", 0)
+    files = os.listdir(tmp_path)
+    assert len(files) == 2 and f"action_a.{os.getpid()}.prof" in files
@@ -0,0 +1,62 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions.rendering import Template, format_currency, format_date, format_value, load_templates, utter
+
+
+@pytest.mark.parametrize("amount, expected", [
+    (Decimal("1234567"), "$1.234.567"),
+    (Decimal("999.5"), "$1.000"),
+    (Decimal("-500"), "-$500"),
+    (55000, "$55.000"),
+    (None, "$0"),
+])
+def test_format_currency(amount, expected):
+    assert format_currency(amount) == expected
+
+
+def test_format_date():
+    day = date(2025, 8, 8)
+    assert format_date(day) == "8 de agosto"
+    assert format_date(day, weekday=True) == "viernes 8 de agosto"
+    assert format_date(day, year=True) == "8 de agosto de 2025"
+
+
+def test_values_are_formatted_by_type():
+    assert format_value(datetime(2025, 8, 8, 10, 30)) == "8 de agosto de 2025"
+    assert format_value(Decimal("1500")) == "$1.500"
+    assert format_value(3) == "3"
+
+
+def test_template_fills_values_then_slots_and_keeps_unknown_placeholders():
+    template = Template("Hola {name}, debes {total} desde {due} {unknown}")
+    text = template.render({"total": Decimal("1000"), "due": date(2025, 1, 2)}, {"name": "Ana", "total": "x"})
+    assert text == "Hola Ana, debes $1.000 desde 2 de enero de 2025 {unknown}"
+
+
+def test_only_plain_text_responses_are_loaded(tmp_path):
+    path = tmp_path / "domain.yml"
+    path.write_text("responses:\n"
+                    "  utter_plain:\n  - text: Hola {name}\n  - text: Buenas {name}\n"
+                    "  utter_buttons:\n  - text: Elige\n    buttons:\n    - title: Sí\n      payload: /affirm\n"
+                    "  utter_image:\n  - image: https://example.com/a.png\n", encoding="utf-8")
+    templates = load_templates(str(path))
+    assert list(templates) == ["utter_plain"] and templates["utter_plain"].text == "Hola {name}"
+
+
+class FakeTracker:
+    slots = {"client_name": "Ana"}
+
+
+def test_utter_sends_text_or_falls_back_to_the_response_name(monkeypatch):
+    from actions import rendering
+
+    monkeypatch.setattr(rendering, "get_templates", lambda: {"utter_hi": Template("Hola {client_name}")})
+    dispatcher = CollectingDispatcher()
+    utter(dispatcher, FakeTracker(), "utter_hi")
+    utter(dispatcher, FakeTracker(), "utter_buttons", total=Decimal("10"))
+    assert dispatcher.messages[0]["text"] == "Hola Ana"
+    assert dispatcher.messages[1]["response"] == "utter_buttons" and dispatcher.messages[1]["total"] == "$10"
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from actions.offline import make_tracker
+from actions.replay import _enabled, _sampled, turn_payload
+
+
+def test_turn_recording_is_opt_in(monkeypatch):
+    monkeypatch.delenv("INTERACTION_LOG_TURNS", raising=False)
+    assert not _enabled()
+    monkeypatch.setenv("INTERACTION_LOG_TURNS", "true")
+    assert _enabled()
+
+
+def test_sampling_keeps_whole_conversations(monkeypatch):
+    monkeypatch.setenv("INTERACTION_LOG_TURNS_SAMPLE", "0.5")
+    sampled = [_sampled(f"session-{i}") for i in range(1000)]
+    assert 350 < sum(sampled) < 650
+    assert sampled == [_sampled(f"session-{i}") for i in range(1000)]
+    monkeypatch.setenv("INTERACTION_LOG_TURNS_SAMPLE", "0")
+    assert not any(_sampled(f"session-{i}") for i in range(100))
+
+
+def test_turn_payload_drops_pii_slots(monkeypatch):
+    monkeypatch.delenv("INTERACTION_LOG_TURNS_REDACT", raising=False)
+    text = "hola, soy Dennis Ritchie"
+    entities = [{"entity": "client_name", "value": "Dennis Ritchie", "start": 10, "end": 24}]
+    tracker = make_tracker(text, {"client_name": "Dennis Ritchie", "pending_invoice_count": 2},
+                           intent="greet", entities=entities)
+    events = [{"event": "slot", "name": "client_name", "value": "Dennis Ritchie"},
+              {"event": "slot", "name": "pending_invoice_count", "value": 2}]
+    messages = [{"text": "Hola Dennis Ritchie, tiene 2 facturas pendientes"}]
+
+    payload = turn_payload("action_x", tracker, events, messages, 0.01)
+
+    assert "Dennis" not in json.dumps(payload)
+    assert payload["text"] == "hola, soy [client_name]"
+    assert payload["entities"] == [{"entity": "client_name"}]
+    assert "client_name" not in payload["slots"]
+    assert payload["slots"]["pending_invoice_count"] == 2
+    assert payload["events"][0]["value"] is None
+    assert payload["events"][1]["value"] == 2
+    assert payload["messages"][0]["text"] == "Hola [client_name], tiene 2 facturas pendientes"
+
+
+@pytest.mark.parametrize("redact", ["", "reason_type"])
+def test_turn_payload_keeps_slots_not_listed(monkeypatch, redact):
+    monkeypatch.setenv("INTERACTION_LOG_TURNS_REDACT", redact)
+    tracker = make_tracker("soy Ana", {"client_name": "Ana"}, entities=[
+        {"entity": "client_name", "value": "Ana", "start": 4, "end": 7}])
+    payload = turn_payload("action_x", tracker, [], [], 0.01)
+    assert payload["slots"]["client_name"] == "Ana"
+    assert payload["text"] == "soy Ana"
+    assert payload["entities"][0]["value"] == "Ana"
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import pytest
+
+from actions.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, DeadlineExceeded, guarded
+from actions.storage import WriteTimeout, write_deadline
+
+
+def seed_invoices(storage, statuses=("pending", "pending")):
+    with storage.cursor(commit=True) as cursor:
+        cursor.execute("INSERT INTO customers (id, name, email, phone) VALUES (1, 'Ana', 'a@x', '1')")
+        for i, status in enumerate(statuses):
+            cursor.execute("INSERT INTO invoices (invoice_number, customer_id, amount, issue_date, due_date, status) "
+                           "VALUES (%s, 1, 100, '2026-01-01', '2026-02-01', %s)", (f"F-{i}", status))
+
+
+def statuses(storage):
+    with storage.cursor() as cursor:
+        cursor.execute("SELECT status FROM invoices ORDER BY id")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once():
+    breaker = CircuitBreaker("test", failure_threshold=2, slow_call=0, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # one probe at a time
+    breaker.record_success(0.01)
+    assert breaker.state == CLOSED
+
+
+def test_breaker_counts_slow_calls_as_failures():
+    breaker = CircuitBreaker("test", failure_threshold=1, slow_call=0.1, reset_timeout=10)
+    breaker.record_success(0.5)
+    assert breaker.state == OPEN
+
+
+def test_write_past_its_deadline_is_rolled_back(storage):
+    seed_invoices(storage)
+    with write_deadline(time.monotonic() - 1):
+        with pytest.raises(WriteTimeout):
+            storage.transition_invoices(1, ["pending"], "disputed", "key-1")
+    assert statuses(storage) == ["pending", "pending"]
+
+    with write_deadline(time.monotonic() + 10):
+        applied, ids = storage.transition_invoices(1, ["pending"], "disputed", "key-2")
+    assert applied and len(ids) == 2
+    assert statuses(storage) == ["disputed", "disputed"]
+
+
+def test_guarded_write_timeout_counts_against_the_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, slow_call=0, reset_timeout=10)
+
+    async def write():
+        raise WriteTimeout("max_statement_time exceeded")
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(guarded(write, breaker, wait=False))
+    assert breaker.state == OPEN
@@ -0,0 +1,81 @@
+import gzip
+import json
+from datetime import date, datetime
+
+import pytest
+
+from retention import archive_path, parse_type_retention, retention_windows, run_retention
+
+TODAY = date(2026, 6, 30)
+
+
+def log(storage, *rows):
+    storage.insert_interactions([(session, kind, None, timestamp) for session, kind, timestamp in rows])
+
+
+def remaining(storage):
+    with storage.cursor() as cursor:
+        cursor.execute("SELECT interaction_type, COUNT(*) FROM interactions GROUP BY 1 ORDER BY 1")
+        return dict(cursor.fetchall())
+
+
+def rollups(storage):
+    with storage.cursor() as cursor:
+        cursor.execute("SELECT day, interaction_type, events, sessions FROM interaction_daily ORDER BY 1, 2")
+        return [(str(day), kind, events, sessions) for day, kind, events, sessions in cursor.fetchall()]
+
+
+def test_parse_type_retention():
+    assert parse_type_retention(" action_run=14, campaign_triggered=365 ") == {"action_run": 14,
+                                                                               "campaign_triggered": 365}
+    assert parse_type_retention("") == {}
+    with pytest.raises(ValueError):
+        parse_type_retention("action_run=two")
+
+
+def test_overridden_types_are_excluded_from_the_default_window():
+    windows = retention_windows(TODAY, 90, {"action_run": 14})
+    assert windows[0] == (date(2026, 6, 16), ("action_run",), ())
+    assert windows[1] == (date(2026, 4, 1), None, ("action_run",))
+
+
+@pytest.fixture
+def history(storage):
+    log(storage,
+        ("s1", "greet", datetime(2026, 3, 1, 9)),
+        ("s1", "greet", datetime(2026, 3, 1, 10)),
+        ("s2", "greet", datetime(2026, 3, 1, 11)),
+        ("s1", "action_run", datetime(2026, 6, 1, 9)),
+        ("s3", "greet", datetime(2026, 6, 1, 9)),
+        ("s3", "action_run", datetime(2026, 6, 29, 9)))
+    return storage
+
+
+def test_old_rows_are_rolled_up_archived_and_deleted(history, tmp_path):
+    stats = run_retention(history, TODAY, 90, {"action_run": 14}, rollup_days=0, archive_dir=str(tmp_path))
+
+    assert stats.groups == 2 and stats.rows == 4 and stats.deleted == 4
+    assert rollups(history) == [("2026-03-01", "greet", 3, 2), ("2026-06-01", "action_run", 1, 1)]
+    assert remaining(history) == {"action_run": 1, "greet": 1}
+    with gzip.open(archive_path(str(tmp_path), date(2026, 3, 1), "greet"), "rt", encoding="utf-8") as f:
+        assert [json.loads(line)["session_id"] for line in f] == ["s1", "s1", "s2"]
+
+
+def test_rerun_keeps_rollups_and_archives(history, tmp_path):
+    run_retention(history, TODAY, 90, {}, rollup_days=0, archive_dir=str(tmp_path))
+    log(history, ("s9", "greet", datetime(2026, 3, 1, 12)))
+    stats = run_retention(history, TODAY, 90, {}, rollup_days=0, archive_dir=str(tmp_path))
+
+    assert stats.rolled_up == 0 and stats.archived_files == 0 and stats.deleted == 1
+    assert rollups(history) == [("2026-03-01", "greet", 3, 2)]
+
+
+def test_dry_run_changes_nothing(history, tmp_path):
+    stats = run_retention(history, TODAY, 90, {}, rollup_days=0, archive_dir=str(tmp_path), dry_run=True)
+    assert stats.rows == 3 and stats.deleted == 0
+    assert remaining(history) == {"action_run": 2, "greet": 4} and rollups(history) == []
+
+
+def test_old_rollups_are_deleted(history):
+    run_retention(history, TODAY, 90, {"action_run": 14}, rollup_days=60, archive_dir=None)
+    assert rollups(history) == [("2026-06-01", "action_run", 1, 1)]
@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+
+from actions.storage import SchemaError, SQLiteStorage
+
+
+def test_check_schema_accepts_a_full_schema(storage):
+    storage.check_schema()
+
+
+def test_check_schema_rejects_an_interactions_table_without_customer_id(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE interactions (id INTEGER PRIMARY KEY, session_id TEXT, interaction_type TEXT, "
+                 "data TEXT, timestamp DATETIME)")
+    conn.commit()
+    conn.close()
+    storage = SQLiteStorage(path)
+    try:
+        with pytest.raises(SchemaError):
+            storage.check_schema()
+    finally:
+        storage.pool.dispose()
+
+
+def test_sqlite_enforces_foreign_keys(storage):
+    with storage.cursor() as cursor:
+        cursor.execute("PRAGMA foreign_keys")
+        assert cursor.fetchone()[0] == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.upsert_invoices([("F-1", 999, "10.00", "2026-01-01", "2026-02-01", "pending")])
+
+
+def test_import_rejects_invoices_of_unknown_customers(storage, tmp_path):
+    import import_data
+
+    storage.upsert_customers([(1, "Ana", "ana@example.com", "+56911111111")])
+    path = tmp_path / "invoices.jsonl"
+    path.write_text(
+        '{"invoice_number": "F-1", "customer_id": 1, "amount": "10", "issue_date": "2026-01-01", '
+        '"due_date": "2026-02-01", "status": "pending"}\n'
+        '{"invoice_number": "F-2", "customer_id": 999, "amount": "10", "issue_date": "2026-01-01", '
+        '"due_date": "2026-02-01", "status": "pending"}\n'
+    )
+    importer = import_data.run_import(storage, "invoices", str(path), "jsonl", chunk_size=10,
+                                      checkpoint_path=str(tmp_path / "checkpoint.json"))
+    assert (importer.loaded, importer.rejected) == (1, 1)
+
+
+@pytest.mark.parametrize("stored, imported, expected", [
+    ("pending", "paid", "paid"),
+    ("payment_scheduled", "paid", "paid"),
+    ("disputed", "paid", "paid"),
+    ("pending", "disputed", "disputed"),
+    ("payment_scheduled", "pending", "payment_scheduled"),
+    ("disputed", "pending", "disputed"),
+])
+def test_reimport_status(storage, stored, imported, expected):
+    storage.upsert_customers([(1, "Ana", "ana@example.com", "+56911111111")])
+    storage.upsert_invoices([("F-1", 1, "100.00", "2026-01-01", "2026-02-01", stored)])
+    storage.upsert_invoices([("F-1", 1, "120.00", "2026-01-01", "2026-02-01", imported)])
+    with storage.cursor() as cursor:
+        cursor.execute("SELECT status, amount FROM invoices WHERE invoice_number = 'F-1'")
+        status, amount = cursor.fetchone()
+    assert status == expected and float(amount) == 120.0
+
+
+def test_reimported_paid_invoice_leaves_the_campaign(storage):
+    storage.upsert_customers([(1, "Ana", "ana@example.com", "+56911111111")])
+    storage.upsert_invoices([("F-1", 1, "100.00", "2026-01-01", "2026-02-01", "pending")])
+    assert [row[0] for row in storage.pending_customers()] == [1]
+    storage.upsert_invoices([("F-1", 1, "100.00", "2026-01-01", "2026-02-01", "paid")])
+    assert storage.pending_customers() == []
+
+
+def test_import_target_is_not_seeded_with_demo_data(tmp_path, monkeypatch):
+    from actions.storage import create_storage
+
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "import.sqlite3"))
+    monkeypatch.delenv("SQLITE_REPLICAS", raising=False)
+    storage = create_storage("sqlite", seed_demo=False)
+    try:
+        assert storage.is_empty()
+    finally:
+        storage.pool.dispose()
@@ -0,0 +1,66 @@
+import pytest
+
+import actions.storage
+from actions import cache, warmup
+from actions.warmup import Readiness, warm_up
+
+
+def flaky(failures):
+    calls = []
+
+    def step():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise RuntimeError("not yet")
+    step.calls = calls
+    return step
+
+
+def test_failed_steps_are_retried_until_they_succeed(monkeypatch):
+    db = flaky(failures=2)
+    matchers = flaky(failures=0)
+    monkeypatch.setattr(warmup, "STEPS", [("db_pool", db), ("matchers", matchers)])
+    readiness = Readiness()
+
+    assert warm_up(readiness, timeout=5, retry_interval=0)
+    assert len(db.calls) == 3 and len(matchers.calls) == 1
+    assert readiness.ready and readiness.errors == {}
+    assert set(readiness.status()["steps_ms"]) == {"db_pool", "matchers"}
+
+
+def test_a_later_call_finishes_only_the_pending_steps(monkeypatch):
+    db = flaky(failures=1)
+    matchers = flaky(failures=0)
+    monkeypatch.setattr(warmup, "STEPS", [("db_pool", db), ("matchers", matchers)])
+    readiness = Readiness()
+
+    assert not warm_up(readiness, timeout=0, retry_interval=1)
+    assert not readiness.ready and readiness.errors == {"db_pool": "not yet"}
+
+    assert warm_up(readiness, timeout=0, retry_interval=1)
+    assert len(db.calls) == 2 and len(matchers.calls) == 1
+    assert readiness.ready and readiness.startup_time is not None
+
+
+@pytest.fixture
+def clean_caches():
+    caches = (cache.customer_id_cache, cache.invoice_summary_cache, cache.invoice_summary_fallback)
+    for c in caches:
+        c.clear()
+    yield
+    for c in caches:
+        c.clear()
+
+
+def test_customers_step_seeds_the_caches(storage, monkeypatch, clean_caches):
+    monkeypatch.setattr(actions.storage, "get_storage", lambda: storage)
+    monkeypatch.setenv("WARMUP_CUSTOMERS", "10")
+    storage.upsert_customers([(1, "Ana", "ana@example.com", "+56911111111")])
+    storage.upsert_invoices([("F-1", 1, "100.00", "2026-01-01", "2026-02-01", "pending")])
+
+    warmup.warm_customers()
+
+    assert cache.customer_id_cache.get("Ana") == 1
+    count, total = cache.invoice_summary_cache.get(1)
+    assert count == 1 and float(total) == 100.0
+    assert cache.invoice_summary_fallback.get("Ana") == (1, (count, total))